@@ -13,7 +13,7 @@ logger = logging.getLogger(__name__)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("telegram").setLevel(logging.WARNING)
 
-from config import TOKEN, sheets_configured
+from config import TOKEN, sheets_configured, log_config, ensure_dirs
 
 logger.info("=== INICIANDO BOT DE CAFE ===")
 
@@ -25,6 +25,9 @@ from handlers.adelantos import register_adelantos_handlers
 from handlers.capitalizacion import register_capitalizacion_handlers
 from handlers.compra_mixta import register_compra_mixta_handlers
 from handlers.asistente import register_asistente_handlers
+from utils.trazas import instrumentar_handlers
+from utils.borradores import crear_persistencia, programar_barrido
+from utils.conversaciones import programar_rearme
 
 
 def eliminar_webhook():
@@ -53,12 +56,14 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
 
 def main():
     """Start the bot."""
+    ensure_dirs()
+    log_config()
     logger.info(f"Token configurado: {'Sí' if TOKEN else 'No'}")
 
     eliminar_webhook()
 
     try:
-        application = Application.builder().token(TOKEN).build()
+        application = Application.builder().token(TOKEN).persistence(crear_persistencia()).build()
     except Exception as e:
         logger.error(f"ERROR CRÍTICO al crear aplicación: {e}")
         logger.error(traceback.format_exc())
@@ -79,9 +84,17 @@ def main():
     # AI assistant — registered last in group 0 so other ConversationHandlers take priority
     register_asistente_handlers(application)
 
+    # Per-update latency traces: one span per handler step
+    instrumentar_handlers(application)
+
     # Global error handler
     application.add_error_handler(error_handler)
 
+    # Evict abandoned conversation drafts and re-arm timeouts of restored conversations
+    if application.job_queue is not None:
+        programar_barrido(application.job_queue)
+        programar_rearme(application.job_queue)
+
     logger.info("Todos los handlers registrados. Bot iniciando en modo POLLING...")
     application.run_polling(drop_pending_updates=True)
 
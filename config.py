@@ -9,6 +9,15 @@ load_dotenv()
 # Obtener el token del bot desde las variables de entorno
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+# Modo de recepción de updates: "polling" (por defecto) o "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# URL pública base de la app (ej. https://mi-app.herokuapp.com) y secreto del webhook
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
+# Número máximo de updates procesados a la vez (los de un mismo chat siempre en orden)
+BOT_CONCURRENCIA = int(os.getenv("BOT_CONCURRENCIA", "8"))
+
 # Configuración de archivos de datos (se mantiene para compatibilidad)
 DATA_DIR = "data"
 COMPRAS_FILE = os.path.join(DATA_DIR, "compras.csv")
@@ -16,9 +25,22 @@ PROCESO_FILE = os.path.join(DATA_DIR, "proceso.csv")
 GASTOS_FILE = os.path.join(DATA_DIR, "gastos.csv")
 VENTAS_FILE = os.path.join(DATA_DIR, "ventas.csv")
 
+# Snapshot diario de precios (JobQueue): hora de cierre en Lima (HH:MM), estado persistido
+# y máximo de días que se recuperan al arrancar
+HISTORICO_HORA_CIERRE = os.getenv("HISTORICO_HORA_CIERRE", "14:00")
+HISTORICO_ESTADO_FILE = os.path.join(DATA_DIR, "historico_estado.json")
+HISTORICO_BACKFILL_DIAS = int(os.getenv("HISTORICO_BACKFILL_DIAS", "30"))
+
 # Configuración de Google Sheets
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 GOOGLE_CREDENTIALS = os.getenv("GOOGLE_CREDENTIALS")
+# Segundos que se reutiliza una lectura completa de hoja (0 desactiva la caché de lecturas)
+SHEETS_CACHE_TTL = int(os.getenv("SHEETS_CACHE_TTL", "60"))
+
+# Precarga al arrancar: clientes de Google, IDs de hojas y hojas más consultadas
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "True").lower() in ("true", "1", "t")
+WARMUP_SHEETS = [s.strip() for s in os.getenv("WARMUP_SHEETS", "adelantos,almacen,proveedores").split(",") if s.strip()]
+WARMUP_TIMEOUT = int(os.getenv("WARMUP_TIMEOUT", "20"))
 
 # Configuración de Google Drive para almacenamiento de evidencias
 DRIVE_ENABLED = os.getenv("DRIVE_ENABLED", "False").lower() in ("true", "1", "t")
@@ -29,49 +51,82 @@ DRIVE_EVIDENCIAS_ADELANTOS_ID = os.getenv("DRIVE_EVIDENCIAS_ADELANTOS_ID", "")
 DRIVE_EVIDENCIAS_GASTOS_ID = os.getenv("DRIVE_EVIDENCIAS_GASTOS_ID", "")
 DRIVE_EVIDENCIAS_CAPITALIZACION_ID = os.getenv("DRIVE_EVIDENCIAS_CAPITALIZACION_ID", "")
 
-# Asegurar que el directorio de datos existe (se mantiene para compatibilidad)
-os.makedirs(DATA_DIR, exist_ok=True)
+# Conversaciones en curso: estados (PicklePersistence) y borradores ("json" en disco o "memoria")
+CONVERSACIONES_DIR = os.getenv("CONVERSACIONES_DIR", os.path.join(DATA_DIR, "conversaciones"))
+BORRADORES_BACKEND = os.getenv("BORRADORES_BACKEND", "json").lower()
+# Segundos sin actividad tras los que una conversación se cierra sola
+CONVERSACION_TIMEOUT = int(os.getenv("CONVERSACION_TIMEOUT", "900"))
+# Segundos sin actividad tras los que un borrador se considera abandonado, y cada cuánto se barren
+BORRADORES_TTL = int(os.getenv("BORRADORES_TTL", str(30 * 60)))
+BORRADORES_BARRIDO = int(os.getenv("BORRADORES_BARRIDO", "300"))
+
+# Token requerido por /metrics (Authorization: Bearer <token> o ?token=); sin él la ruta no se sirve
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Trazas de latencia por update: "jsonl" (archivo local), "otel" (OpenTelemetry) o "ninguno"
+TRAZAS_EXPORTADOR = os.getenv("TRAZAS_EXPORTADOR", "jsonl").lower()
+TRAZAS_ARCHIVO = os.getenv("TRAZAS_ARCHIVO", os.path.join(DATA_DIR, "trazas.jsonl"))
+# Solo se exportan los updates que tardan al menos estos milisegundos
+TRAZAS_MIN_MS = float(os.getenv("TRAZAS_MIN_MS", "0"))
+# Al superar este tamaño el archivo se rota a .1
+TRAZAS_MAX_BYTES = int(os.getenv("TRAZAS_MAX_BYTES", str(10 * 1024 * 1024)))
 
 # Configuración de carpeta para uploads de documentos
 UPLOADS_FOLDER = os.path.join(pathlib.Path(__file__).parent.absolute(), "uploads")
-os.makedirs(UPLOADS_FOLDER, exist_ok=True)
+
+# Configuración del pipeline de subida de evidencias
+EVIDENCIAS_WORKERS = int(os.getenv("EVIDENCIAS_WORKERS", "2"))
+EVIDENCIAS_COMPRIMIR = os.getenv("EVIDENCIAS_COMPRIMIR", "True").lower() in ("true", "1", "t")
+EVIDENCIAS_MAX_LADO = int(os.getenv("EVIDENCIAS_MAX_LADO", "1600"))
+EVIDENCIAS_CALIDAD_JPEG = int(os.getenv("EVIDENCIAS_CALIDAD_JPEG", "80"))
+EVIDENCIAS_MAX_INTENTOS = int(os.getenv("EVIDENCIAS_MAX_INTENTOS", "5"))
 
 # Configuración de IA (Groq primary, Gemini backup — both free)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Configurar logging para este módulo
+logger = logging.getLogger(__name__)
+
 # Verificar configuración de Google Sheets
 def check_sheets_config():
     """Verifica que la configuración de Google Sheets esté completa"""
     if not SPREADSHEET_ID:
-        print("ADVERTENCIA: No se ha configurado SPREADSHEET_ID en las variables de entorno")
+        logger.warning("ADVERTENCIA: No se ha configurado SPREADSHEET_ID en las variables de entorno")
         return False
     
     if not GOOGLE_CREDENTIALS:
-        print("ADVERTENCIA: No se ha configurado GOOGLE_CREDENTIALS en las variables de entorno")
+        logger.warning("ADVERTENCIA: No se ha configurado GOOGLE_CREDENTIALS en las variables de entorno")
         return False
     
     return True
 
-# Inicializar Google Sheets cuando se importa este módulo
-sheets_configured = check_sheets_config()
+# Si Google Sheets está configurado (las advertencias se registran en log_config)
+sheets_configured = bool(SPREADSHEET_ID and GOOGLE_CREDENTIALS)
 
-# Configurar logging para este módulo
-logger = logging.getLogger(__name__)
+# Directorios locales que usa el bot; se crean desde el punto de entrada, no al importar
+def ensure_dirs():
+    """Crea los directorios de datos, conversaciones y uploads si no existen"""
+    for directorio in (DATA_DIR, CONVERSACIONES_DIR, UPLOADS_FOLDER):
+        os.makedirs(directorio, exist_ok=True)
 
-# Registro de configuración para diagnóstico
-logger.info("=== CONFIGURACIÓN CARGADA ===")
-logger.info(f"DRIVE_ENABLED: {DRIVE_ENABLED}")
-logger.info(f"DRIVE_EVIDENCIAS_ROOT_ID: {DRIVE_EVIDENCIAS_ROOT_ID[:10] + '...' if DRIVE_EVIDENCIAS_ROOT_ID else 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_COMPRAS_ID: {DRIVE_EVIDENCIAS_COMPRAS_ID[:10] + '...' if DRIVE_EVIDENCIAS_COMPRAS_ID else 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_VENTAS_ID: {DRIVE_EVIDENCIAS_VENTAS_ID[:10] + '...' if DRIVE_EVIDENCIAS_VENTAS_ID else 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_ADELANTOS_ID: {DRIVE_EVIDENCIAS_ADELANTOS_ID[:10] + '...' if DRIVE_EVIDENCIAS_ADELANTOS_ID else 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_GASTOS_ID: {DRIVE_EVIDENCIAS_GASTOS_ID[:10] + '...' if DRIVE_EVIDENCIAS_GASTOS_ID else 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_CAPITALIZACION_ID: {DRIVE_EVIDENCIAS_CAPITALIZACION_ID[:10] + '...' if DRIVE_EVIDENCIAS_CAPITALIZACION_ID else 'No configurado'}")
-logger.info(f"SPREADSHEET_ID: {SPREADSHEET_ID[:10] + '...' if SPREADSHEET_ID else 'No configurado'}")
-logger.info(f"GOOGLE_CREDENTIALS: {'Configurado' if GOOGLE_CREDENTIALS else 'No configurado'}")
-logger.info(f"UPLOADS_FOLDER: {UPLOADS_FOLDER}")
-logger.info("=== FIN DE CONFIGURACIÓN ===")
+# Registro de configuración para diagnóstico (se llama desde el punto de entrada,
+# no al importar el módulo)
+def log_config():
+    """Registra en el log la configuración cargada"""
+    logger.info("=== CONFIGURACIÓN CARGADA ===")
+    logger.info(f"DRIVE_ENABLED: {DRIVE_ENABLED}")
+    logger.info(f"DRIVE_EVIDENCIAS_ROOT_ID: {DRIVE_EVIDENCIAS_ROOT_ID[:10] + '...' if DRIVE_EVIDENCIAS_ROOT_ID else 'No configurado'}")
+    logger.info(f"DRIVE_EVIDENCIAS_COMPRAS_ID: {DRIVE_EVIDENCIAS_COMPRAS_ID[:10] + '...' if DRIVE_EVIDENCIAS_COMPRAS_ID else 'No configurado'}")
+    logger.info(f"DRIVE_EVIDENCIAS_VENTAS_ID: {DRIVE_EVIDENCIAS_VENTAS_ID[:10] + '...' if DRIVE_EVIDENCIAS_VENTAS_ID else 'No configurado'}")
+    logger.info(f"DRIVE_EVIDENCIAS_ADELANTOS_ID: {DRIVE_EVIDENCIAS_ADELANTOS_ID[:10] + '...' if DRIVE_EVIDENCIAS_ADELANTOS_ID else 'No configurado'}")
+    logger.info(f"DRIVE_EVIDENCIAS_GASTOS_ID: {DRIVE_EVIDENCIAS_GASTOS_ID[:10] + '...' if DRIVE_EVIDENCIAS_GASTOS_ID else 'No configurado'}")
+    logger.info(f"DRIVE_EVIDENCIAS_CAPITALIZACION_ID: {DRIVE_EVIDENCIAS_CAPITALIZACION_ID[:10] + '...' if DRIVE_EVIDENCIAS_CAPITALIZACION_ID else 'No configurado'}")
+    logger.info(f"SPREADSHEET_ID: {SPREADSHEET_ID[:10] + '...' if SPREADSHEET_ID else 'No configurado'}")
+    logger.info(f"GOOGLE_CREDENTIALS: {'Configurado' if GOOGLE_CREDENTIALS else 'No configurado'}")
+    logger.info(f"UPLOADS_FOLDER: {UPLOADS_FOLDER}")
+    check_sheets_config()
+    logger.info("=== FIN DE CONFIGURACIÓN ===")
 
 # Función para actualizar las variables de entorno en ejecución
 # (útil cuando se configuran automáticamente las carpetas de Drive)
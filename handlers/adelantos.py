@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -10,12 +11,14 @@ from telegram.ext import (
 )
 import traceback
 
+from config import CONVERSACION_TIMEOUT
 # Importar módulos para Google Sheets
 from utils.db import append_data, get_all_data
 from utils.helpers import get_now_peru, format_date_for_sheets
 from utils.sheets import update_cell
 # Importar nuevo módulo de formateo numérico
 from utils.formatters import formatear_numero, formatear_precio, procesar_entrada_numerica
+from utils.conversaciones import ConversacionPersistente
 
 # Estados para la conversación
 PROVEEDOR, MONTO, NOTAS, CONFIRMAR = range(4)
@@ -42,7 +45,7 @@ async def proveedor_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # Verificar si ya tiene adelantos vigentes
     try:
-        adelantos = get_all_data("adelantos")
+        adelantos = await asyncio.to_thread(get_all_data, "adelantos")
         
         # Filtrar adelantos del proveedor con saldo
         adelantos_proveedor = []
@@ -64,7 +67,7 @@ async def proveedor_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 "Este nuevo adelanto se sumará al saldo existente."
             )
     except Exception as e:
-        logger.error(f"Error al verificar adelantos del proveedor: {e}")
+        logger.error("Error al verificar adelantos del proveedor: %s", e)
     
     await update.message.reply_text(
         "💸 ¿Cuál es el monto del adelanto? (en S/)\n"
@@ -140,7 +143,7 @@ async def confirmar_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         try:
             # Guardar el adelanto usando la función append_data
-            append_data("adelantos", data, ADELANTOS_HEADERS)
+            await asyncio.to_thread(append_data, "adelantos", data, ADELANTOS_HEADERS)
             
             await update.message.reply_text(
                 f"✅ Adelanto registrado correctamente\n\n"
@@ -150,7 +153,7 @@ async def confirmar_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 f"Usa /compra_adelanto para registrar una compra con este adelanto."
             )
         except Exception as e:
-            logger.error(f"Error guardando adelanto: {e}")
+            logger.error("Error guardando adelanto: %s", e)
             logger.error(traceback.format_exc())
             await update.message.reply_text(
                 "❌ Error al registrar el adelanto. Por favor, intenta nuevamente."
@@ -178,7 +181,7 @@ async def lista_adelantos_command(update: Update, context: ContextTypes.DEFAULT_
     
     try:
         # Obtener adelantos desde Google Sheets
-        adelantos = get_all_data("adelantos")
+        adelantos = await asyncio.to_thread(get_all_data, "adelantos")
         
         # Verificar si hay adelantos
         if not adelantos:
@@ -213,7 +216,7 @@ async def lista_adelantos_command(update: Update, context: ContextTypes.DEFAULT_
             monto = float(adelanto.get('monto', 0))
             saldo = float(adelanto.get('saldo_restante', 0))
             fecha = adelanto.get('fecha', '')
-            row_index = adelanto.get('_row_index')
+            adelanto_id = adelanto.get('id', '')
             
             if proveedor not in proveedores:
                 proveedores[proveedor] = {
@@ -226,7 +229,7 @@ async def lista_adelantos_command(update: Update, context: ContextTypes.DEFAULT_
                 'fecha': fecha,
                 'monto': monto,
                 'saldo': saldo,
-                'row_index': row_index
+                'id': adelanto_id
             })
             proveedores[proveedor]['total_monto'] += monto
             proveedores[proveedor]['total_saldo'] += saldo
@@ -265,7 +268,7 @@ async def lista_adelantos_command(update: Update, context: ContextTypes.DEFAULT_
             await update.message.reply_text(mensaje, reply_markup=reply_markup)
         
     except Exception as e:
-        logger.error(f"Error obteniendo adelantos: {e}")
+        logger.error("Error obteniendo adelantos: %s", e)
         logger.error(traceback.format_exc())
         try:
             if is_callback:
@@ -273,7 +276,7 @@ async def lista_adelantos_command(update: Update, context: ContextTypes.DEFAULT_
             else:
                 await update.message.reply_text(f"Error al obtener los adelantos: {str(e)}")
         except Exception as e2:
-            logger.error(f"Error secundario al manejar el error original: {e2}")
+            logger.error("Error secundario al manejar el error original: %s", e2)
 
 async def proveedor_adelantos_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mostrar los adelantos de un proveedor específico"""
@@ -291,7 +294,7 @@ async def proveedor_adelantos_callback(update: Update, context: ContextTypes.DEF
             await lista_adelantos_command(update, context)
             return
         except Exception as e:
-            logger.error(f"Error al mostrar todos los adelantos: {e}")
+            logger.error("Error al mostrar todos los adelantos: %s", e)
             await query.edit_message_text("Error al mostrar todos los adelantos. Intenta con /adelantos")
             return
     
@@ -310,7 +313,7 @@ async def proveedor_adelantos_callback(update: Update, context: ContextTypes.DEF
     
     try:
         # Obtener adelantos del proveedor
-        adelantos = get_all_data("adelantos")
+        adelantos = await asyncio.to_thread(get_all_data, "adelantos")
         
         # Filtrar adelantos del proveedor con saldo positivo
         adelantos_proveedor = []
@@ -349,7 +352,7 @@ async def proveedor_adelantos_callback(update: Update, context: ContextTypes.DEF
         )
         
     except Exception as e:
-        logger.error(f"Error al mostrar adelantos del proveedor: {e}")
+        logger.error("Error al mostrar adelantos del proveedor: %s", e)
         logger.error(traceback.format_exc())
         await query.edit_message_text(
             f"Error al obtener los adelantos: {str(e)}",
@@ -363,7 +366,7 @@ def register_adelantos_handlers(application):
     logger.info("Registrando handlers de adelantos")
     
     # Registro de adelantos
-    adelanto_conv_handler = ConversationHandler(
+    adelanto_conv_handler = ConversacionPersistente(
         entry_points=[CommandHandler("adelanto", adelanto_command)],
         states={
             PROVEEDOR: [MessageHandler(filters.TEXT & ~filters.COMMAND, proveedor_step)],
@@ -372,6 +375,11 @@ def register_adelantos_handlers(application):
             CONFIRMAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, confirmar_step)],
         },
         fallbacks=[CommandHandler("cancelar", cancelar_adelanto)],
+        name="adelantos",
+        persistent=True,
+        conversation_timeout=CONVERSACION_TIMEOUT,
+        claves_user_data=("proveedor", "monto", "saldo_restante", "notas"),
+        comando="/adelanto",
     )
     
     # Listar adelantos
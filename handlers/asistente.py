@@ -3,6 +3,7 @@ AI assistant handler.
 Listens to free-text messages and uses Groq/Gemini to understand the user's intent,
 then guides them through confirmation before saving the record.
 """
+import asyncio
 import logging
 from telegram import Update, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -14,12 +15,12 @@ from telegram.ext import (
     filters,
 )
 
-from config import GROQ_API_KEY, GEMINI_API_KEY
-from utils.ai import parse_message
+from config import GROQ_API_KEY, GEMINI_API_KEY, CONVERSACION_TIMEOUT
 from utils.sheets import append_data as sheets_append, buscar_proveedor
 from utils.helpers import get_now_peru, format_date_for_sheets
 from utils.sheets import generate_unique_id
 from utils.formatters import formatear_precio
+from utils.conversaciones import ConversacionPersistente
 
 logger = logging.getLogger(__name__)
 
@@ -211,7 +212,8 @@ async def ai_entry(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await update.message.reply_text("🤖 Analizando tu mensaje...")
 
     logger.info(f"[ASISTENTE] Llamando a parse_message...")
-    result = parse_message(user_message, GROQ_API_KEY, GEMINI_API_KEY)
+    from utils.ai import parse_message  # cargado al primer mensaje libre
+    result = await asyncio.to_thread(parse_message, user_message, GROQ_API_KEY, GEMINI_API_KEY)
     logger.info(f"[ASISTENTE] Resultado IA: {result}")
     accion = result.get("accion", "desconocido")
 
@@ -289,7 +291,7 @@ async def _mostrar_confirmacion(update: Update, context: ContextTypes.DEFAULT_TY
     if not nombre_proveedor and accion == "gasto":
         nombre_proveedor = datos.get("concepto")
     if nombre_proveedor and accion in ("compra", "adelanto", "gasto"):
-        proveedor = buscar_proveedor(nombre_proveedor)
+        proveedor = await asyncio.to_thread(buscar_proveedor, nombre_proveedor)
         if proveedor:
             logger.info(f"[ASISTENTE] Proveedor encontrado: {proveedor}")
             if not proveedor.get("numero_cuenta"):
@@ -372,11 +374,11 @@ async def confirmar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
     try:
         if accion == "compra":
-            ok = _save_compra(datos, username)
+            ok = await asyncio.to_thread(_save_compra, datos, username)
         elif accion == "gasto":
-            ok = _save_gasto(datos, username)
+            ok = await asyncio.to_thread(_save_gasto, datos, username)
         elif accion == "adelanto":
-            ok = _save_adelanto(datos, username)
+            ok = await asyncio.to_thread(_save_adelanto, datos, username)
         else:
             ok = False
 
@@ -409,7 +411,7 @@ async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 def register_asistente_handlers(application):
     """Register the AI assistant handler (low priority — runs after all other handlers)."""
-    conv_handler = ConversationHandler(
+    conv_handler = ConversacionPersistente(
         entry_points=[MessageHandler(filters.TEXT & ~filters.COMMAND, ai_entry)],
         states={
             CONFIRMAR_PROVEEDOR: [CallbackQueryHandler(confirmar_proveedor, pattern=r"^prov_(ok|cancel)$")],
@@ -418,6 +420,10 @@ def register_asistente_handlers(application):
         },
         fallbacks=[CommandHandler("cancelar", cancelar)],
         per_message=False,
+        name="asistente",
+        persistent=True,
+        conversation_timeout=CONVERSACION_TIMEOUT,
+        claves_user_data=("ai_accion", "ai_datos", "ai_faltante", "ai_proveedor_info"),
     )
     application.add_handler(conv_handler)
     logger.info("✅ Asistente IA registrado en grupo 0 (último, no interferirá con otros handlers)")
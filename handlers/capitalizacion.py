@@ -1,8 +1,12 @@
+import asyncio
 import logging
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import CommandHandler, ConversationHandler, MessageHandler, filters, ContextTypes
+from config import CONVERSACION_TIMEOUT
 from utils.helpers import get_now_peru, format_date_for_sheets, safe_float
 from utils.sheets import append_data as append_sheets, generate_unique_id
+from utils.borradores import AlmacenBorradores
+from utils.conversaciones import ConversacionPersistente
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -10,8 +14,8 @@ logger = logging.getLogger(__name__)
 # Estados para la conversación
 MONTO, ORIGEN, DESTINO, CONCEPTO, NOTAS, CONFIRMAR = range(6)
 
-# Datos temporales
-datos_capitalizacion = {}
+# Borradores de la conversación (por usuario, con TTL y guardados en disco)
+datos_capitalizacion = AlmacenBorradores("capitalizacion")
 
 # Opciones predefinidas
 ORIGENES = ["Fondos personales", "Préstamo", "Inversión externa", "Ganancias reinvertidas", "Otro"]
@@ -241,7 +245,7 @@ async def confirmar_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         }
         
         # Registrar en Google Sheets
-        append_sheets("capitalizacion", data_dict)
+        await asyncio.to_thread(append_sheets, "capitalizacion", data_dict)
         
         # Mensaje de confirmación
         await update.message.reply_text(
@@ -288,7 +292,7 @@ async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 def register_capitalizacion_handlers(application):
     """Registra los handlers para el módulo de capitalización"""
     # Crear manejador de conversación
-    conv_handler = ConversationHandler(
+    conv_handler = ConversacionPersistente(
         entry_points=[CommandHandler("capitalizacion", capitalizacion_command)],
         states={
             MONTO: [MessageHandler(filters.TEXT & ~filters.COMMAND, monto_step)],
@@ -298,6 +302,11 @@ def register_capitalizacion_handlers(application):
             CONFIRMAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, confirmar_step)],
         },
         fallbacks=[CommandHandler("cancelar", cancelar)],
+        name="capitalizacion",
+        persistent=True,
+        conversation_timeout=CONVERSACION_TIMEOUT,
+        borradores=datos_capitalizacion,
+        comando="/capitalizacion",
     )
     
     # Agregar el manejador al dispatcher
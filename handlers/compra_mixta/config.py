@@ -3,10 +3,10 @@ Constantes y configuraciones para el módulo de compra mixta.
 """
 import logging
 
+from utils.borradores import AlmacenBorradores
+
 # Configurar logging
 logger = logging.getLogger(__name__)
-# Asegurar que los logs sean visibles
-logger.setLevel(logging.DEBUG)
 
 # Estados para la conversación
 TIPO_CAFE, PROVEEDOR, CANTIDAD, PRECIO, METODO_PAGO, MONTO_EFECTIVO, MONTO_TRANSFERENCIA, MONTO_ADELANTO, MONTO_POR_PAGAR, SELECCIONAR_ADELANTO, CONFIRMAR = range(11)
@@ -31,11 +31,23 @@ COMPRAS_MIXTAS_HEADERS = [
     "adelanto_id", "registrado_por", "notas"
 ]
 
-# Datos temporales compartidos entre módulos
-datos_compra_mixta = {}
+# Campos de cada adelanto que se guardan en el borrador (selección y saldo); la fila
+# se ubica por el ID al escribir, nunca por la posición leída
+CAMPOS_ADELANTO_BORRADOR = ("id", "fecha", "saldo_restante")
+
+# Borradores compartidos entre módulos (por usuario, con TTL y guardados en disco)
+datos_compra_mixta = AlmacenBorradores("compra_mixta")
+
+def debug_log(message, *args):
+    """
+    Log de depuración del flujo de compra mixta, con formato %-style: el mensaje
+    solo se formatea si el nivel DEBUG está activo.
+    """
+    logger.debug("### DEBUG ### " + message, *args)
 
-def debug_log(message):
-    """Función especial para logs de depuración más visibles"""
-    logger.debug(f"### DEBUG ### {message}")
-    # Agregar también como INFO para asegurar que se vea
-    logger.info(f"### DEBUG ### {message}")
+def debug_activo():
+    """
+    Indica si debug_log emitirá algo; se consulta una vez antes de los bucles
+    por fila para no llamar a debug_log en cada iteración con DEBUG apagado.
+    """
+    return logger.isEnabledFor(logging.DEBUG)
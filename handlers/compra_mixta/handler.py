@@ -8,10 +8,12 @@ from telegram.ext import (
     MessageHandler, filters, CallbackQueryHandler
 )
 
+from config import CONVERSACION_TIMEOUT
+from utils.conversaciones import ConversacionPersistente
 from handlers.compra_mixta.config import (
     TIPO_CAFE, PROVEEDOR, CANTIDAD, PRECIO, METODO_PAGO, 
     MONTO_EFECTIVO, MONTO_TRANSFERENCIA, MONTO_ADELANTO, 
-    MONTO_POR_PAGAR, SELECCIONAR_ADELANTO, CONFIRMAR
+    MONTO_POR_PAGAR, SELECCIONAR_ADELANTO, CONFIRMAR, datos_compra_mixta
 )
 from handlers.compra_mixta.steps_inicio import (
     compra_mixta_command, tipo_cafe_step, proveedor_step
@@ -37,7 +39,7 @@ def register_compra_mixta_handlers(application):
         logger.info("Registrando handlers para compra mixta")
         
         # Crear manejador de conversación
-        compra_mixta_conv_handler = ConversationHandler(
+        compra_mixta_conv_handler = ConversacionPersistente(
             entry_points=[CommandHandler("compra_mixta", compra_mixta_command)],
             states={
                 TIPO_CAFE: [MessageHandler(filters.TEXT & ~filters.COMMAND, tipo_cafe_step)],
@@ -53,7 +55,11 @@ def register_compra_mixta_handlers(application):
             },
             fallbacks=[CommandHandler("cancelar", cancelar)],
             per_message=False,
-            conversation_timeout=900  # 15 minutos - para evitar conversaciones colgadas
+            name="compra_mixta",
+            persistent=True,
+            conversation_timeout=CONVERSACION_TIMEOUT,  # para evitar conversaciones colgadas
+            borradores=datos_compra_mixta,
+            comando="/compra_mixta",
         )
         
         # Agregar el manejador a la aplicación
@@ -62,6 +68,6 @@ def register_compra_mixta_handlers(application):
         
         return True
     except Exception as e:
-        logger.error(f"Error al registrar handlers de compra_mixta: {e}")
+        logger.error("Error al registrar handlers de compra_mixta: %s", e)
         logger.error(traceback.format_exc())
         return False
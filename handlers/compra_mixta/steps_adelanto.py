@@ -40,10 +40,13 @@ async def seleccionar_adelanto(update: Update, context: ContextTypes.DEFAULT_TYP
                 if saldo_str:
                     saldo = float(str(saldo_str).replace(',', '.'))
             except (ValueError, TypeError):
-                debug_log(f"Error al convertir saldo_restante: '{saldo_str}'")
+                debug_log("Error al convertir saldo_restante: '%s'", saldo_str)
                 saldo = 0
             
-            adelanto_id = adelanto.get('_row_index', '')
+            # Identificar el adelanto por su ID (no por su posición en la hoja)
+            adelanto_id = adelanto.get('id', '')
+            if not adelanto_id:
+                continue
             
             keyboard.append([
                 InlineKeyboardButton(
@@ -73,7 +76,7 @@ async def seleccionar_adelanto(update: Update, context: ContextTypes.DEFAULT_TYP
         
         return SELECCIONAR_ADELANTO
     except Exception as e:
-        logger.error(f"Error en seleccionar_adelanto: {e}")
+        logger.error("Error en seleccionar_adelanto: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -108,7 +111,7 @@ async def seleccionar_adelanto_callback(update: Update, context: ContextTypes.DE
         adelanto_seleccionado = None
         
         for adelanto in adelantos:
-            if str(adelanto.get('_row_index', '')) == str(adelanto_id):
+            if str(adelanto.get('id', '')) == str(adelanto_id):
                 adelanto_seleccionado = adelanto
                 break
         
@@ -122,7 +125,7 @@ async def seleccionar_adelanto_callback(update: Update, context: ContextTypes.DE
                 if saldo_str:
                     saldo = float(str(saldo_str).replace(',', '.'))
             except (ValueError, TypeError):
-                debug_log(f"Error al convertir saldo_restante: '{saldo_str}'")
+                debug_log("Error al convertir saldo_restante: '%s'", saldo_str)
                 saldo = 0
             
             # Verificar si hay suficiente saldo
@@ -158,7 +161,7 @@ async def seleccionar_adelanto_callback(update: Update, context: ContextTypes.DE
             await query.edit_message_text("❌ Error al seleccionar el adelanto. Por favor, intenta nuevamente.")
             return ConversationHandler.END
     except Exception as e:
-        logger.error(f"Error en seleccionar_adelanto_callback: {e}")
+        logger.error("Error en seleccionar_adelanto_callback: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -39,13 +39,13 @@ async def cantidad_step(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
             )
             return PRECIO
         except ValueError as e:
-            logger.warning(f"Valor inválido para cantidad: {cantidad_text} - {e}")
+            logger.warning("Valor inválido para cantidad: %s - %s", cantidad_text, e)
             await update.message.reply_text(
                 "❌ Por favor, ingresa un número válido para la cantidad."
             )
             return CANTIDAD
     except Exception as e:
-        logger.error(f"Error en cantidad_step: {e}")
+        logger.error("Error en cantidad_step: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -79,11 +79,11 @@ async def precio_step(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
             
             # Solo mostrar opciones con adelanto si el proveedor tiene adelantos disponibles
             if datos_compra_mixta[user_id].get("tiene_adelantos", False):
-                debug_log(f"Mostrando todos los métodos de pago incluyendo adelantos para usuario {user_id}")
+                debug_log("Mostrando todos los métodos de pago incluyendo adelantos para usuario %s", user_id)
                 metodos = METODOS_PAGO
             else:
                 # Filtrar métodos que incluyen adelanto
-                debug_log(f"Filtrando métodos de pago sin adelantos para usuario {user_id}")
+                debug_log("Filtrando métodos de pago sin adelantos para usuario %s", user_id)
                 metodos = [m for m in METODOS_PAGO if "ADELANTO" not in m]
             
             for metodo in metodos:
@@ -99,13 +99,13 @@ async def precio_step(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
             )
             return METODO_PAGO
         except ValueError as e:
-            logger.warning(f"Valor inválido para precio: {precio_text} - {e}")
+            logger.warning("Valor inválido para precio: %s - %s", precio_text, e)
             await update.message.reply_text(
                 "❌ Por favor, ingresa un número válido para el precio."
             )
             return PRECIO
     except Exception as e:
-        logger.error(f"Error en precio_step: {e}")
+        logger.error("Error en precio_step: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -141,7 +141,7 @@ async def metodo_pago_step(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         
         # Guardar el método de pago
         datos_compra_mixta[user_id]["metodo_pago"] = metodo_pago
-        debug_log(f"Usuario {user_id} seleccionó método de pago: {metodo_pago}")
+        debug_log("Usuario %s seleccionó método de pago: %s", user_id, metodo_pago)
         
         # Determinar el siguiente paso según el método de pago
         if metodo_pago == "EFECTIVO":
@@ -214,7 +214,7 @@ async def metodo_pago_step(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             return MONTO_ADELANTO
             
     except Exception as e:
-        logger.error(f"Error en metodo_pago_step: {e}")
+        logger.error("Error en metodo_pago_step: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -1,6 +1,7 @@
 """
 Manejadores para las etapas iniciales de la conversación: selección de tipo de café y proveedor
 """
+import asyncio
 import logging
 import traceback
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
@@ -8,9 +9,10 @@ from telegram.ext import ContextTypes, ConversationHandler
 
 from utils.formatters import formatear_precio
 from utils.sheets import get_all_data
+from utils.sheets.locator import asegurar_id
 from handlers.compra_mixta.config import (
     TIPO_CAFE, PROVEEDOR, CANTIDAD, 
-    TIPOS_CAFE, datos_compra_mixta, debug_log
+    TIPOS_CAFE, CAMPOS_ADELANTO_BORRADOR, datos_compra_mixta, debug_log, debug_activo
 )
 from handlers.compra_mixta.utils import obtener_proveedores_con_adelantos
 
@@ -21,7 +23,7 @@ async def compra_mixta_command(update: Update, context: ContextTypes.DEFAULT_TYP
     try:
         user_id = update.effective_user.id
         username = update.effective_user.username or update.effective_user.first_name
-        logger.info(f"=== COMANDO /compra_mixta INICIADO por {username} (ID: {user_id}) ===")
+        logger.info("=== COMANDO /compra_mixta INICIADO por %s (ID: %s) ===", username, user_id)
         
         # Inicializar datos para este usuario
         datos_compra_mixta[user_id] = {
@@ -36,11 +38,11 @@ async def compra_mixta_command(update: Update, context: ContextTypes.DEFAULT_TYP
         # Pre-cargar la lista de proveedores con adelantos para tenerla ya disponible
         # y evitar problemas de timing
         try:
-            proveedores_adelantos = obtener_proveedores_con_adelantos()
+            proveedores_adelantos = await asyncio.to_thread(obtener_proveedores_con_adelantos)
             datos_compra_mixta[user_id]["proveedores_con_adelanto"] = proveedores_adelantos
-            debug_log(f"Pre-cargados {len(proveedores_adelantos)} proveedores con adelanto para el usuario {user_id}")
+            debug_log("Pre-cargados %s proveedores con adelanto para el usuario %s", len(proveedores_adelantos), user_id)
         except Exception as e:
-            debug_log(f"Error al pre-cargar proveedores: {e}")
+            debug_log("Error al pre-cargar proveedores: %s", e)
             # Si hay error, continuar con una lista vacía
             datos_compra_mixta[user_id]["proveedores_con_adelanto"] = set()
         
@@ -62,7 +64,7 @@ async def compra_mixta_command(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return TIPO_CAFE
     except Exception as e:
-        logger.error(f"Error en compra_mixta_command: {e}")
+        logger.error("Error en compra_mixta_command: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -90,24 +92,24 @@ async def tipo_cafe_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return TIPO_CAFE
         
         # Guardar el tipo de café
-        logger.info(f"Usuario {user_id} seleccionó tipo de café: {selected_tipo}")
+        logger.info("Usuario %s seleccionó tipo de café: %s", user_id, selected_tipo)
         datos_compra_mixta[user_id]["tipo_cafe"] = selected_tipo
         
         # Obtener lista de proveedores con adelantos disponibles
         # Primero verificar si ya tenemos la lista pre-cargada
         proveedores_con_adelanto = datos_compra_mixta[user_id].get("proveedores_con_adelanto", None)
         if proveedores_con_adelanto is None:
-            debug_log(f"Lista de proveedores no pre-cargada para usuario {user_id}, obteniendo ahora...")
+            debug_log("Lista de proveedores no pre-cargada para usuario %s, obteniendo ahora...", user_id)
             try:
-                proveedores_con_adelanto = obtener_proveedores_con_adelantos()
+                proveedores_con_adelanto = await asyncio.to_thread(obtener_proveedores_con_adelantos)
                 datos_compra_mixta[user_id]["proveedores_con_adelanto"] = proveedores_con_adelanto
             except Exception as e:
-                debug_log(f"Error al obtener proveedores: {e}")
+                debug_log("Error al obtener proveedores: %s", e)
                 # Si hay error, usar una lista vacía
                 proveedores_con_adelanto = set()
                 datos_compra_mixta[user_id]["proveedores_con_adelanto"] = proveedores_con_adelanto
         
-        debug_log(f"Mostrando lista de {len(proveedores_con_adelanto)} proveedores al usuario {user_id}")
+        debug_log("Mostrando lista de %s proveedores al usuario %s", len(proveedores_con_adelanto), user_id)
         
         if proveedores_con_adelanto:
             # Crear teclado con los proveedores que tienen adelantos
@@ -117,7 +119,7 @@ async def tipo_cafe_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
             
             # Log de los proveedores encontrados
-            debug_log(f"Creado teclado con proveedores: {[k[0] for k in keyboard]}")
+            debug_log("Creado teclado con proveedores: %s", [k[0] for k in keyboard])
             
             await update.message.reply_text(
                 f"☕ Tipo de café: {selected_tipo}\n\n"
@@ -137,7 +139,7 @@ async def tipo_cafe_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             )
             return PROVEEDOR
     except Exception as e:
-        logger.error(f"Error en tipo_cafe_step: {e}")
+        logger.error("Error en tipo_cafe_step: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -154,7 +156,7 @@ async def proveedor_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         # Verificar si el usuario seleccionó "Otro proveedor"
         if proveedor_texto == "Otro proveedor":
-            debug_log(f"Usuario {user_id} seleccionó 'Otro proveedor'")
+            debug_log("Usuario %s seleccionó 'Otro proveedor'", user_id)
             await update.message.reply_text(
                 "Escribe el nombre del proveedor:",
                 reply_markup=ReplyKeyboardRemove()
@@ -168,16 +170,17 @@ async def proveedor_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             )
             return PROVEEDOR
         
-        logger.info(f"Usuario {user_id} ingresó proveedor: {proveedor_texto}")
+        logger.info("Usuario %s ingresó proveedor: %s", user_id, proveedor_texto)
         datos_compra_mixta[user_id]["proveedor"] = proveedor_texto
         
         # Verificar si este proveedor tiene adelantos disponibles y guardarlo para más tarde
         try:
-            adelantos = get_all_data("adelantos")
-            debug_log(f"Verificando adelantos para {proveedor_texto} - Encontrados {len(adelantos)} adelantos en total")
+            adelantos = await asyncio.to_thread(get_all_data, "adelantos")
+            debug_log("Verificando adelantos para %s - Encontrados %s adelantos en total", proveedor_texto, len(adelantos))
             
             # Filtrar adelantos del proveedor con saldo
             adelantos_proveedor = []
+            depurar = debug_activo()
             for adelanto in adelantos:
                 if adelanto.get('proveedor') == proveedor_texto:
                     try:
@@ -188,17 +191,26 @@ async def proveedor_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                             if saldo_str:
                                 saldo = float(str(saldo_str).replace(',', '.'))
                         except (ValueError, TypeError):
-                            debug_log(f"Error al convertir saldo_restante: '{saldo_str}'")
+                            if depurar:
+                                debug_log("Error al convertir saldo_restante: '%s'", saldo_str)
                             saldo = 0
                         
-                        debug_log(f"Adelanto encontrado para {proveedor_texto} con saldo {saldo}")
+                        if depurar:
+                            debug_log("Adelanto encontrado para %s con saldo %s", proveedor_texto, saldo)
                         if saldo > 0:
                             adelantos_proveedor.append(adelanto)
-                            debug_log(f"Añadido adelanto con saldo {saldo} para {proveedor_texto}")
+                            if depurar:
+                                debug_log("Añadido adelanto con saldo %s para %s", saldo, proveedor_texto)
                     except Exception as e:
-                        debug_log(f"Error procesando saldo: {e}")
+                        if depurar:
+                            debug_log("Error procesando saldo: %s", e)
                         continue
             
+            # Identificar cada adelanto por su ID mientras se tiene la fila completa
+            for adelanto in adelantos_proveedor:
+                await asyncio.to_thread(asegurar_id, 'adelantos', adelanto)
+            adelantos_proveedor = [adelanto for adelanto in adelantos_proveedor if adelanto.get('id')]
+            
             # Calcular saldo total y guardar adelantos
             if adelantos_proveedor:
                 # Calcular el saldo total con validación explícita
@@ -210,13 +222,17 @@ async def proveedor_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                             saldo = float(str(saldo_str).replace(',', '.'))
                             saldo_total += saldo
                     except (ValueError, TypeError):
-                        debug_log(f"Error al sumar saldo_restante: '{saldo_str}'")
+                        debug_log("Error al sumar saldo_restante: '%s'", saldo_str)
                 
                 datos_compra_mixta[user_id]["tiene_adelantos"] = True
-                datos_compra_mixta[user_id]["adelantos_disponibles"] = adelantos_proveedor
+                # Guardar solo los campos que usan los pasos siguientes, no las filas completas
+                datos_compra_mixta[user_id]["adelantos_disponibles"] = [
+                    {campo: adelanto[campo] for campo in CAMPOS_ADELANTO_BORRADOR if campo in adelanto}
+                    for adelanto in adelantos_proveedor
+                ]
                 datos_compra_mixta[user_id]["saldo_adelantos"] = saldo_total
                 
-                debug_log(f"El proveedor {proveedor_texto} tiene {len(adelantos_proveedor)} adelantos con saldo total {saldo_total}")
+                debug_log("El proveedor %s tiene %s adelantos con saldo total %s", proveedor_texto, len(adelantos_proveedor), saldo_total)
                 
                 await update.message.reply_text(
                     f"ℹ️ El proveedor {proveedor_texto} tiene adelantos vigentes "
@@ -224,7 +240,7 @@ async def proveedor_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 )
             else:
                 datos_compra_mixta[user_id]["tiene_adelantos"] = False
-                debug_log(f"El proveedor {proveedor_texto} no tiene adelantos con saldo")
+                debug_log("El proveedor %s no tiene adelantos con saldo", proveedor_texto)
                 
                 # Si el usuario seleccionó un proveedor de la lista pero no tiene adelantos
                 # (Esto podría pasar si los saldos cambiaron entre la carga de la lista y la selección)
@@ -234,7 +250,7 @@ async def proveedor_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                         f"⚠️ El proveedor {proveedor_texto} ya no tiene adelantos disponibles."
                     )
         except Exception as e:
-            debug_log(f"Error al verificar adelantos del proveedor: {e}")
+            debug_log("Error al verificar adelantos del proveedor: %s", e)
             debug_log(traceback.format_exc())
             datos_compra_mixta[user_id]["tiene_adelantos"] = False
         
@@ -244,7 +260,7 @@ async def proveedor_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return CANTIDAD
     except Exception as e:
-        logger.error(f"Error en proveedor_step: {e}")
+        logger.error("Error en proveedor_step: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -76,13 +76,13 @@ async def monto_efectivo_step(update: Update, context: ContextTypes.DEFAULT_TYPE
                 
                 return await seleccionar_adelanto(update, context)
         except ValueError as e:
-            logger.warning(f"Valor inválido para monto_efectivo: {monto_text} - {e}")
+            logger.warning("Valor inválido para monto_efectivo: %s - %s", monto_text, e)
             await update.message.reply_text(
                 "❌ Por favor, ingresa un número válido para el monto en efectivo."
             )
             return MONTO_EFECTIVO
     except Exception as e:
-        logger.error(f"Error en monto_efectivo_step: {e}")
+        logger.error("Error en monto_efectivo_step: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -139,13 +139,13 @@ async def monto_transferencia_step(update: Update, context: ContextTypes.DEFAULT
                 
                 return await seleccionar_adelanto(update, context)
         except ValueError as e:
-            logger.warning(f"Valor inválido para monto_transferencia: {monto_text} - {e}")
+            logger.warning("Valor inválido para monto_transferencia: %s - %s", monto_text, e)
             await update.message.reply_text(
                 "❌ Por favor, ingresa un número válido para el monto por transferencia."
             )
             return MONTO_TRANSFERENCIA
     except Exception as e:
-        logger.error(f"Error en monto_transferencia_step: {e}")
+        logger.error("Error en monto_transferencia_step: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -233,13 +233,13 @@ async def monto_adelanto_step(update: Update, context: ContextTypes.DEFAULT_TYPE
                 return await seleccionar_adelanto(update, context)
                 
         except ValueError as e:
-            logger.warning(f"Valor inválido para monto_adelanto: {monto_text} - {e}")
+            logger.warning("Valor inválido para monto_adelanto: %s - %s", monto_text, e)
             await update.message.reply_text(
                 "❌ Por favor, ingresa un número válido para el monto de adelanto."
             )
             return MONTO_ADELANTO
     except Exception as e:
-        logger.error(f"Error en monto_adelanto_step: {e}")
+        logger.error("Error en monto_adelanto_step: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -1,6 +1,7 @@
 """
 Manejadores para mostrar resumen y confirmación de la compra
 """
+import asyncio
 import logging
 import traceback
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
@@ -8,8 +9,9 @@ from telegram.ext import ContextTypes, ConversationHandler
 
 from utils.helpers import get_now_peru, format_date_for_sheets
 from utils.formatters import formatear_numero, formatear_precio
-from utils.sheets import append_data as append_sheets, generate_unique_id, update_cell
+from utils.sheets import append_data as append_sheets, generate_unique_id
 from utils.sheets.almacen import update_almacen
+from utils.sheets.adelantos import descontar_saldo_adelanto
 from handlers.compra_mixta.config import (
     CONFIRMAR, datos_compra_mixta, debug_log
 )
@@ -76,7 +78,7 @@ async def mostrar_resumen(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         return CONFIRMAR
     except Exception as e:
-        logger.error(f"Error en mostrar_resumen: {e}")
+        logger.error("Error en mostrar_resumen: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -117,30 +119,33 @@ async def confirmar_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 
                 if datos.get("monto_adelanto", 0) > 0 and datos.get("adelanto_id", ""):
                     try:
-                        # Calcular el nuevo saldo
-                        nuevo_saldo = datos.get("adelanto_saldo", 0) - datos.get("monto_adelanto", 0)
-                        
-                        # Log para debug
-                        debug_log(f"Actualizando adelanto ID: {datos['adelanto_id']} - Nuevo saldo: {nuevo_saldo}")
-                        
-                        # Formatear el nuevo saldo a dos decimales
-                        nuevo_saldo_formateado = round(nuevo_saldo, 2)
-                        
-                        # Actualizar el saldo en la hoja de adelantos
-                        result_adelanto = update_cell("adelantos", datos["adelanto_id"], "saldo_restante", nuevo_saldo_formateado)
-                        logger.info(f"Actualizado saldo de adelanto {datos['adelanto_id']} a {nuevo_saldo_formateado}")
+                        # El saldo leído al inicio de la conversación se compara con el vigente
+                        # antes de escribir; si otro usuario lo cambió, se descuenta sobre el vigente
+                        debug_log("Descontando %s del adelanto ID: %s", datos['monto_adelanto'], datos['adelanto_id'])
+                        saldo_leido = next(
+                            (a.get('saldo_restante') for a in datos.get("adelantos_disponibles", [])
+                             if str(a.get('id', '')) == str(datos["adelanto_id"])),
+                            None
+                        )
+                        result_adelanto, nuevo_saldo_formateado = await asyncio.to_thread(
+                            descontar_saldo_adelanto, datos["adelanto_id"], datos.get("monto_adelanto", 0), saldo_leido
+                        )
+                        logger.info("Saldo de adelanto %s: %s", datos['adelanto_id'], nuevo_saldo_formateado)
                         
                         if result_adelanto:
                             mensaje_adelanto = f"✅ Saldo de adelanto actualizado correctamente a {formatear_precio(nuevo_saldo_formateado)}\n\n"
                         else:
-                            mensaje_adelanto = "⚠️ No se pudo actualizar el saldo de adelanto\n\n"
+                            mensaje_adelanto = (
+                                "⚠️ No se pudo actualizar el saldo de adelanto "
+                                f"(saldo vigente: {formatear_precio(nuevo_saldo_formateado)})\n\n"
+                            )
                     except Exception as e:
-                        logger.error(f"Error al actualizar saldo de adelanto: {e}")
+                        logger.error("Error al actualizar saldo de adelanto: %s", e)
                         logger.error(traceback.format_exc())
                         mensaje_adelanto = "⚠️ Error al actualizar saldo de adelanto\n\n"
                 
                 # 1. Guardar en la hoja de compras regular primero
-                logger.info(f"Guardando la compra mixta en la hoja de compras regular")
+                logger.info("Guardando la compra mixta en la hoja de compras regular")
                 datos_compra_regular = {
                     "id": compra_id,
                     "fecha": datos["fecha"],
@@ -152,30 +157,32 @@ async def confirmar_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                     "registrado_por": datos["registrado_por"],
                     "notas": f"Compra mixta - Método de pago: {datos['metodo_pago']}"
                 }
-                result_compra = append_sheets("compras", datos_compra_regular)
+                result_compra = await asyncio.to_thread(append_sheets, "compras", datos_compra_regular)
 
                 # Sync stock to apartalo-core (PERGAMINO or CEREZO)
                 if result_compra:
                     try:
                         from utils.apartalo import agregar_stock
-                        agregar_stock(
+                        await asyncio.to_thread(
+                            agregar_stock,
                             datos.get("tipo_cafe", ""),
                             float(datos.get("cantidad", 0)),
                             motivo=f"Compra mixta {compra_id} - {datos.get('proveedor','')}"
                         )
                     except Exception as e:
-                        logger.error(f"[APARTALO] Error sincronizando stock (mixta): {e}")
+                        logger.error("[APARTALO] Error sincronizando stock (mixta): %s", e)
 
                 # 2. Guardar también en la hoja de compras_mixtas para detalles adicionales
-                logger.info(f"Guardando compra mixta en hoja de compras_mixtas: {datos}")
-                result_mixta = append_sheets("compras_mixtas", datos)
+                logger.info("Guardando compra mixta en hoja de compras_mixtas: %s", datos)
+                result_mixta = await asyncio.to_thread(append_sheets, "compras_mixtas", datos)
                 
                 # 3. Registrar en almacén con manejo adecuado del tipo de retorno
-                logger.info(f"Registrando la compra en almacén")
+                logger.info("Registrando la compra en almacén")
                 result_almacen = False
                 try:
                     # Llamar a update_almacen con manejo explícito del tipo de retorno
-                    result = update_almacen(
+                    result = await asyncio.to_thread(
+                        update_almacen,
                         fase=datos["tipo_cafe"],
                         cantidad_cambio=datos["cantidad"],
                         operacion="sumar",
@@ -190,14 +197,14 @@ async def confirmar_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                     else:
                         result_almacen = result  # Ya es un booleano
                     
-                    logger.info(f"Resultado de update_almacen: {result_almacen}")
+                    logger.info("Resultado de update_almacen: %s", result_almacen)
                 except Exception as e:
-                    logger.error(f"Error al actualizar almacén: {e}")
+                    logger.error("Error al actualizar almacén: %s", e)
                     logger.error(traceback.format_exc())
                     result_almacen = False
                 
                 if result_compra:
-                    logger.info(f"Compra mixta guardada exitosamente para usuario {user_id}")
+                    logger.info("Compra mixta guardada exitosamente para usuario %s", user_id)
                     
                     # Mensaje de éxito - sin usar Markdown para evitar errores de parseo
                     mensaje_exito = "✅ ¡COMPRA MIXTA REGISTRADA EXITOSAMENTE!\n\n"
@@ -228,14 +235,14 @@ async def confirmar_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                         reply_markup=ReplyKeyboardRemove()
                     )
                 else:
-                    logger.error(f"Error al guardar compra mixta: La función append_sheets devolvió False")
+                    logger.error("Error al guardar compra mixta: La función append_sheets devolvió False")
                     await update.message.reply_text(
                         "❌ Error al guardar la compra. Por favor, intenta nuevamente.\n\n"
                         "Contacta al administrador si el problema persiste.",
                         reply_markup=ReplyKeyboardRemove()
                     )
             except Exception as e:
-                logger.error(f"Error al procesar compra mixta: {e}")
+                logger.error("Error al procesar compra mixta: %s", e)
                 logger.error(traceback.format_exc())
                 
                 await update.message.reply_text(
@@ -245,7 +252,7 @@ async def confirmar_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                     reply_markup=ReplyKeyboardRemove()
                 )
         else:
-            logger.info(f"Usuario {user_id} canceló la compra mixta")
+            logger.info("Usuario %s canceló la compra mixta", user_id)
             
             await update.message.reply_text(
                 "❌ Compra cancelada.\n\n"
@@ -259,7 +266,7 @@ async def confirmar_step(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         return ConversationHandler.END
     except Exception as e:
-        logger.error(f"Error en confirmar_step: {e}")
+        logger.error("Error en confirmar_step: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
@@ -278,7 +285,7 @@ async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancelar la conversación"""
     try:
         user_id = update.effective_user.id
-        logger.info(f"Usuario {user_id} canceló el proceso de compra mixta con /cancelar")
+        logger.info("Usuario %s canceló el proceso de compra mixta con /cancelar", user_id)
         
         # Limpiar datos temporales
         if user_id in datos_compra_mixta:
@@ -292,7 +299,7 @@ async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         
         return ConversationHandler.END
     except Exception as e:
-        logger.error(f"Error en cancelar: {e}")
+        logger.error("Error en cancelar: %s", e)
         logger.error(traceback.format_exc())
         
         # Responder al usuario incluso si hay error
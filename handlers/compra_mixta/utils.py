@@ -3,7 +3,7 @@ Funciones utilitarias para el módulo de compra mixta.
 """
 import traceback
 from utils.sheets import get_all_data
-from handlers.compra_mixta.config import debug_log
+from handlers.compra_mixta.config import debug_log, debug_activo
 
 def obtener_proveedores_con_adelantos():
     """
@@ -16,14 +16,15 @@ def obtener_proveedores_con_adelantos():
         debug_log("INICIANDO obtener_proveedores_con_adelantos")
         # Obtener todos los adelantos, sin filtrar
         adelantos = get_all_data("adelantos")
-        debug_log(f"Obtenidos {len(adelantos)} registros de adelantos en total")
+        debug_log("Obtenidos %s registros de adelantos en total", len(adelantos))
         
         # Imprimir los primeros registros para depuración
         for i, adelanto in enumerate(adelantos[:3]):
-            debug_log(f"Adelanto #{i}: {adelanto.get('proveedor')} - Saldo: {adelanto.get('saldo_restante')}")
+            debug_log("Adelanto #%s: %s - Saldo: %s", i, adelanto.get('proveedor'), adelanto.get('saldo_restante'))
         
         # Obtener proveedores únicos con saldo > 0
         proveedores_con_adelanto = set()
+        depurar = debug_activo()
         for adelanto in adelantos:
             try:
                 proveedor = adelanto.get('proveedor', '')
@@ -31,7 +32,8 @@ def obtener_proveedores_con_adelantos():
                     continue
                     
                 saldo_str = adelanto.get('saldo_restante', '0')
-                debug_log(f"Procesando adelanto para {proveedor} con saldo_restante={saldo_str}")
+                if depurar:
+                    debug_log("Procesando adelanto para %s con saldo_restante=%s", proveedor, saldo_str)
                 
                 # Validar explícitamente el valor de saldo
                 try:
@@ -39,20 +41,24 @@ def obtener_proveedores_con_adelantos():
                     if saldo_str:
                         saldo = float(str(saldo_str).replace(',', '.'))
                 except (ValueError, TypeError):
-                    debug_log(f"Error al convertir saldo_restante: '{saldo_str}'")
+                    if depurar:
+                        debug_log("Error al convertir saldo_restante: '%s'", saldo_str)
                     saldo = 0
                 
                 if saldo > 0:
                     proveedores_con_adelanto.add(proveedor)
-                    debug_log(f"Añadido proveedor {proveedor} con saldo {saldo}")
+                    if depurar:
+                        debug_log("Añadido proveedor %s con saldo %s", proveedor, saldo)
             except Exception as e:
-                debug_log(f"Error procesando adelanto: {e} - Datos: {adelanto}")
+                if depurar:
+                    debug_log("Error procesando adelanto: %s - Datos: %s", e, adelanto)
                 continue
         
-        debug_log(f"Se encontraron {len(proveedores_con_adelanto)} proveedores con adelantos disponibles: {sorted(list(proveedores_con_adelanto))}")
+        if depurar:
+            debug_log("Se encontraron %s proveedores con adelantos disponibles: %s", len(proveedores_con_adelanto), sorted(list(proveedores_con_adelanto)))
         return proveedores_con_adelanto
     except Exception as e:
-        debug_log(f"ERROR CRÍTICO en obtener_proveedores_con_adelantos: {e}")
+        debug_log("ERROR CRÍTICO en obtener_proveedores_con_adelantos: %s", e)
         debug_log(traceback.format_exc())
         # En caso de error, devolver conjunto vacío para no interrumpir el flujo
         return set()
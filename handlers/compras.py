@@ -1,11 +1,14 @@
+import asyncio
 import logging
 import datetime
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import CommandHandler, ConversationHandler, MessageHandler, filters, ContextTypes
-from config import COMPRAS_FILE
+from config import COMPRAS_FILE, CONVERSACION_TIMEOUT
 from utils.db import append_data
 from utils.sheets import append_data as append_sheets, generate_unique_id
 from utils.helpers import get_now_peru, safe_float, format_date_for_sheets
+from utils.borradores import AlmacenBorradores
+from utils.conversaciones import ConversacionPersistente
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -13,8 +16,8 @@ logger = logging.getLogger(__name__)
 # Estados para la conversación - orden cambiado para pedir tipo_cafe primero
 TIPO_CAFE, PROVEEDOR, CANTIDAD, PRECIO, CONFIRMAR = range(5)
 
-# Datos temporales
-datos_compra = {}
+# Borradores de la conversación (por usuario, con TTL y guardados en disco)
+datos_compra = AlmacenBorradores("compras")
 
 # Headers para la hoja de compras - restructuración: id, fecha, tipo_cafe, proveedor, cantidad, precio, preciototal, registrado_por, notas
 COMPRAS_HEADERS = ["id", "fecha", "tipo_cafe", "proveedor", "cantidad", "precio", "preciototal", "registrado_por", "notas"]
@@ -223,7 +226,7 @@ async def confirmar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             }
             
             # Usar append_sheets directamente
-            result = append_sheets("compras", datos_limpios)
+            result = await asyncio.to_thread(append_sheets, "compras", datos_limpios)
 
             if result:
                 logger.info(f"Compra guardada exitosamente para usuario {user_id}")
@@ -231,7 +234,8 @@ async def confirmar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
                 # Sync stock to apartalo-core (PERGAMINO or CEREZO)
                 try:
                     from utils.apartalo import agregar_stock
-                    agregar_stock(
+                    await asyncio.to_thread(
+                        agregar_stock,
                         datos_limpios.get("tipo_cafe", ""),
                         float(datos_limpios.get("cantidad", 0)),
                         motivo=f"Compra {datos_limpios.get('id','')} - {datos_limpios.get('proveedor','')}"
@@ -295,7 +299,7 @@ async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 def register_compras_handlers(application):
     """Registra los handlers para el módulo de compras"""
     # Crear manejador de conversación
-    conv_handler = ConversationHandler(
+    conv_handler = ConversacionPersistente(
         entry_points=[CommandHandler("compra", compra_command)],
         states={
             TIPO_CAFE: [MessageHandler(filters.TEXT & ~filters.COMMAND, tipo_cafe)],
@@ -305,6 +309,11 @@ def register_compras_handlers(application):
             CONFIRMAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, confirmar)],
         },
         fallbacks=[CommandHandler("cancelar", cancelar)],
+        name="compras",
+        persistent=True,
+        conversation_timeout=CONVERSACION_TIMEOUT,
+        borradores=datos_compra,
+        comando="/compra",
     )
     
     # Agregar el manejador al dispatcher
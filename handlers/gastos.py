@@ -1,9 +1,12 @@
+import asyncio
 import logging
 import datetime
 from telegram import Update
 from telegram.ext import CommandHandler, ConversationHandler, MessageHandler, filters, ContextTypes
-from config import GASTOS_FILE
+from config import GASTOS_FILE, CONVERSACION_TIMEOUT
 from utils.db import append_data
+from utils.borradores import AlmacenBorradores
+from utils.conversaciones import ConversacionPersistente
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -11,8 +14,8 @@ logger = logging.getLogger(__name__)
 # Estados para la conversación
 CONCEPTO, MONTO, CATEGORIA, NOTAS, CONFIRMAR = range(5)
 
-# Datos temporales
-datos_gasto = {}
+# Borradores de la conversación (por usuario, con TTL y guardados en disco)
+datos_gasto = AlmacenBorradores("gastos")
 
 # Headers para la hoja de gastos
 GASTOS_HEADERS = ["fecha", "concepto", "monto", "categoria", "notas"]
@@ -141,7 +144,7 @@ async def confirmar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         
         # Guardar el gasto en Google Sheets
         try:
-            append_data(GASTOS_FILE, gasto, GASTOS_HEADERS)
+            await asyncio.to_thread(append_data, GASTOS_FILE, gasto, GASTOS_HEADERS)
             
             logger.info(f"Gasto guardado exitosamente para usuario {user_id}")
             
@@ -188,7 +191,7 @@ async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 def register_gastos_handlers(application):
     """Registra los handlers para el módulo de gastos"""
     # Crear manejador de conversación
-    conv_handler = ConversationHandler(
+    conv_handler = ConversacionPersistente(
         entry_points=[CommandHandler("gasto", gasto_command)],
         states={
             CONCEPTO: [MessageHandler(filters.TEXT & ~filters.COMMAND, concepto)],
@@ -198,6 +201,11 @@ def register_gastos_handlers(application):
             CONFIRMAR: [MessageHandler(filters.TEXT & ~filters.COMMAND, confirmar)],
         },
         fallbacks=[CommandHandler("cancelar", cancelar)],
+        name="gastos",
+        persistent=True,
+        conversation_timeout=CONVERSACION_TIMEOUT,
+        borradores=datos_gasto,
+        comando="/gasto",
     )
     
     # Agregar el manejador al dispatcher
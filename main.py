@@ -3,12 +3,18 @@ Single entry point that runs both the Telegram bot and the Flask web app
 in the same process — one dyno instead of two.
 
 - Flask runs in a background thread on the PORT provided by Heroku.
-- The Telegram bot runs in the main thread using run_polling().
+- The Telegram bot runs in the main thread, either with run_polling() or, with
+  BOT_MODE=webhook, receiving updates on the same web server (/telegram/webhook).
 """
+import asyncio
 import logging
 import os
+import secrets
+import signal
 import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import requests
 from telegram import Update
@@ -22,7 +28,10 @@ logger = logging.getLogger(__name__)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("telegram").setLevel(logging.WARNING)
 
-from config import TOKEN
+from config import (
+    TOKEN, BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET, BOT_CONCURRENCIA, log_config, ensure_dirs,
+    DRIVE_ENABLED, WARMUP_ENABLED, WARMUP_SHEETS, WARMUP_TIMEOUT,
+)
 from handlers.start import start_command, help_command
 from handlers.compras import register_compras_handlers
 from handlers.gastos import register_gastos_handlers
@@ -30,14 +39,77 @@ from handlers.adelantos import register_adelantos_handlers
 from handlers.capitalizacion import register_capitalizacion_handlers
 from handlers.compra_mixta import register_compra_mixta_handlers
 from handlers.asistente import register_asistente_handlers
-from web import app as flask_app
+from utils.sheets import initialize_sheets, precargar_hojas
+from utils.evidencias import iniciar_uploader
+from utils.procesamiento import ProcesadorPorChat
+from utils.trazas import instrumentar_handlers
+from utils.borradores import crear_persistencia, programar_barrido
+from utils.conversaciones import programar_rearme
 
 
 def start_web():
-    """Run Flask in a background thread."""
+    """Run the price web in a background thread (waitress if installed, else Flask dev server).
+
+    Same process as the bot on purpose: the webhook route hands updates to this Application
+    and Heroku only routes HTTP to the web dyno (see README, Concurrencia).
+    """
+    # Flask and the price page are imported here, off the bot's startup path
+    from web import app as flask_app, preparar_index
+
     port = int(os.environ.get("PORT", 5000))
-    logger.info(f"=== INICIANDO WEB en puerto {port} ===")
-    flask_app.run(host="0.0.0.0", port=port, use_reloader=False)
+    threads = int(os.environ.get("WEB_THREADS", 8))
+    preparar_index()
+    try:
+        from waitress import serve
+    except ImportError:
+        logger.warning("waitress no instalado; usando el servidor de desarrollo de Flask")
+        logger.info(f"=== INICIANDO WEB en puerto {port} ===")
+        flask_app.run(host="0.0.0.0", port=port, use_reloader=False, threaded=True)
+        return
+    logger.info(f"=== INICIANDO WEB (waitress, {threads} hilos) en puerto {port} ===")
+    serve(flask_app, host="0.0.0.0", port=port, threads=threads, ident="cafe-bot")
+
+
+def _warm_sheets():
+    """Sheets client, sheet IDs, headers/migrations, then one batchGet of the hot sheets."""
+    start = time.perf_counter()
+    if not initialize_sheets():
+        logger.warning("No se pudieron inicializar las hojas; se continuará de todas formas")
+        return time.perf_counter() - start
+    if WARMUP_ENABLED and WARMUP_SHEETS:
+        precargar_hojas(WARMUP_SHEETS)
+    return time.perf_counter() - start
+
+
+def _warm_drive():
+    """Build the Drive client so the first evidence upload does not pay for it."""
+    start = time.perf_counter()
+    from utils.drive import get_drive_service
+    get_drive_service()
+    return time.perf_counter() - start
+
+
+def warm_up():
+    """Preload clients and caches concurrently before the bot starts taking updates."""
+    start = time.perf_counter()
+    tareas = {"sheets": _warm_sheets}
+    if WARMUP_ENABLED and DRIVE_ENABLED:
+        tareas["drive"] = _warm_drive
+
+    pool = ThreadPoolExecutor(max_workers=len(tareas), thread_name_prefix="warmup")
+    futuros = {pool.submit(func): nombre for nombre, func in tareas.items()}
+    hechos, pendientes = wait(futuros, timeout=WARMUP_TIMEOUT)
+    # Do not block on tasks that overran the timeout; they finish in the background
+    pool.shutdown(wait=False)
+
+    for futuro in hechos:
+        try:
+            logger.info(f"Warm-up {futuros[futuro]}: {futuro.result():.2f}s")
+        except Exception as e:
+            logger.warning(f"Warm-up {futuros[futuro]} falló: {e}")
+    for futuro in pendientes:
+        logger.warning(f"Warm-up {futuros[futuro]} no terminó en {WARMUP_TIMEOUT}s; se continúa sin esperar")
+    logger.info(f"=== WARM-UP completado en {time.perf_counter() - start:.2f}s ===")
 
 
 def eliminar_webhook():
@@ -52,6 +124,47 @@ def eliminar_webhook():
         logger.error(f"Excepción al eliminar webhook: {e}")
 
 
+async def run_webhook(application):
+    """Run the bot fed by the web server's /telegram/webhook route until SIGTERM/SIGINT."""
+    secret = WEBHOOK_SECRET
+    if not secret:
+        secret = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET no configurado; se usará un secreto aleatorio para esta ejecución")
+    webhook_url = f"{WEBHOOK_URL.rstrip('/')}/telegram/webhook"
+
+    await application.initialize()
+    await application.start()
+
+    loop = asyncio.get_running_loop()
+
+    def sink(data):
+        update = Update.de_json(data, application.bot)
+        asyncio.run_coroutine_threadsafe(application.update_queue.put(update), loop)
+
+    from web import set_telegram_sink
+    set_telegram_sink(sink, secret)
+    await application.bot.set_webhook(
+        url=webhook_url,
+        secret_token=secret,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=True,
+    )
+    logger.info(f"Bot iniciado en modo WEBHOOK: {webhook_url}")
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    try:
+        await stop.wait()
+    finally:
+        set_telegram_sink(None, None)
+        await application.stop()
+        await application.shutdown()
+
+
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.error(f"[ERROR HANDLER] Excepción no manejada: {context.error}")
     logger.error(traceback.format_exc())
@@ -60,16 +173,39 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
 
 
 def main():
+    ensure_dirs()
+    log_config()
+
     # Start Flask web in background thread
     web_thread = threading.Thread(target=start_web, daemon=True)
     web_thread.start()
 
     # Start Telegram bot in main thread
     logger.info("=== INICIANDO BOT DE CAFE ===")
-    eliminar_webhook()
+
+    # Ensure sheets, headers and legacy-row migrations, and preload clients/caches,
+    # before taking updates
+    warm_up()
+
+    # Drain evidence spooled in uploads/ (including files left by a previous run)
+    if DRIVE_ENABLED:
+        iniciar_uploader()
+
+    webhook_mode = BOT_MODE == "webhook"
+    if webhook_mode and not WEBHOOK_URL:
+        logger.error("BOT_MODE=webhook requiere WEBHOOK_URL; se usará POLLING")
+        webhook_mode = False
+    if not webhook_mode:
+        eliminar_webhook()
 
     try:
-        application = Application.builder().token(TOKEN).build()
+        application = (
+            Application.builder()
+            .token(TOKEN)
+            .concurrent_updates(ProcesadorPorChat(BOT_CONCURRENCIA))
+            .persistence(crear_persistencia())
+            .build()
+        )
     except Exception as e:
         logger.error(f"ERROR CRÍTICO al crear aplicación: {e}")
         logger.error(traceback.format_exc())
@@ -85,8 +221,28 @@ def main():
     register_capitalizacion_handlers(application)
     register_compra_mixta_handlers(application)
     register_asistente_handlers(application)
+
+    # Per-update latency traces: one span per handler step
+    instrumentar_handlers(application)
+
     application.add_error_handler(error_handler)
 
+    # Daily price snapshot at market close (plus catch-up of missed days) and the
+    # sweeper that evicts abandoned conversation drafts, and re-armed timeouts for the
+    # conversations restored from persistence (PTB does not persist timeout jobs)
+    if application.job_queue is not None:
+        from web import programar_snapshots
+        programar_snapshots(application.job_queue)
+        programar_barrido(application.job_queue)
+        programar_rearme(application.job_queue)
+    else:
+        logger.warning("JobQueue no disponible (falta python-telegram-bot[job-queue]); no se guardarán snapshots ni se barrerán borradores")
+
+    if webhook_mode:
+        logger.info("Todos los handlers registrados. Bot iniciando en modo WEBHOOK...")
+        asyncio.run(run_webhook(application))
+        return
+
     logger.info("Todos los handlers registrados. Bot iniciando en modo POLLING...")
     application.run_polling(drop_pending_updates=True)
 
@@ -0,0 +1,112 @@
+"""
+Logging overhead of a 10k-row adelantos scan (obtener_proveedores_con_adelantos),
+comparing the old per-row logging against the current one with the production level (INFO).
+
+    antes:   debug_log with f-strings, emitting every message at DEBUG and again at INFO
+    ahora:   lazy %-style debug_log at DEBUG only, guarded once per scan by debug_activo()
+
+Usage:
+    python scripts/bench_logging.py
+    python scripts/bench_logging.py --filas 50000 --repeticiones 5
+"""
+import argparse
+import io
+import logging
+import random
+import time
+
+logger = logging.getLogger("bench.compra_mixta")
+
+
+def _adelantos(filas):
+    rnd = random.Random(0)
+    return [
+        {"id": f"AD-{i:05d}", "proveedor": f"Proveedor {rnd.randint(1, 200)}",
+         "saldo_restante": str(rnd.choice([0, 0, rnd.randint(1, 5000)])), "_row_index": i}
+        for i in range(filas)
+    ]
+
+
+def _debug_log_antes(message):
+    logger.debug(f"### DEBUG ### {message}")
+    logger.info(f"### DEBUG ### {message}")
+
+
+def _debug_log_ahora(message, *args):
+    logger.debug("### DEBUG ### " + message, *args)
+
+
+def _saldo(saldo_str):
+    try:
+        return float(str(saldo_str).replace(',', '.')) if saldo_str else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+def escaneo_antes(adelantos):
+    proveedores = set()
+    for adelanto in adelantos:
+        proveedor = adelanto.get('proveedor', '')
+        if not proveedor:
+            continue
+        saldo_str = adelanto.get('saldo_restante', '0')
+        _debug_log_antes(f"Procesando adelanto para {proveedor} con saldo_restante={saldo_str}")
+        saldo = _saldo(saldo_str)
+        if saldo > 0:
+            proveedores.add(proveedor)
+            _debug_log_antes(f"Añadido proveedor {proveedor} con saldo {saldo}")
+    return proveedores
+
+
+def escaneo_ahora(adelantos):
+    proveedores = set()
+    depurar = logger.isEnabledFor(logging.DEBUG)
+    for adelanto in adelantos:
+        proveedor = adelanto.get('proveedor', '')
+        if not proveedor:
+            continue
+        saldo_str = adelanto.get('saldo_restante', '0')
+        if depurar:
+            _debug_log_ahora("Procesando adelanto para %s con saldo_restante=%s", proveedor, saldo_str)
+        saldo = _saldo(saldo_str)
+        if saldo > 0:
+            proveedores.add(proveedor)
+            if depurar:
+                _debug_log_ahora("Añadido proveedor %s con saldo %s", proveedor, saldo)
+    return proveedores
+
+
+def _medir(funcion, adelantos, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(adelantos)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    # Mismo formato que main.py, escribiendo a memoria para no medir la consola
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+
+    adelantos = _adelantos(args.filas)
+    assert escaneo_antes(adelantos) == escaneo_ahora(adelantos)
+    base = _medir(lambda filas: [_saldo(a.get('saldo_restante')) for a in filas], adelantos, args.repeticiones)
+
+    print(f"{args.filas} filas, nivel INFO, mejor de {args.repeticiones}")
+    print(f"{'':8s} {'total':>10} {'por fila':>10} {'logging/fila':>13}")
+    for nombre, funcion in (("antes", escaneo_antes), ("ahora", escaneo_ahora)):
+        total = _medir(funcion, adelantos, args.repeticiones)
+        print(f"{nombre:8s} {total * 1e3:8.1f}ms {total / args.filas * 1e6:8.2f}µs "
+              f"{max(0.0, total - base) / args.filas * 1e6:11.2f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark of update processing: sequential vs ProcesadorPorChat.
+
+Simulates N updates spread over M chats, each doing a blocking Sheets-like call of
+--latency ms in a worker thread (as the handlers do with asyncio.to_thread), and
+reports updates/sec for each mode plus a check that every chat kept its order.
+
+Usage:
+    python scripts/bench_updates.py --updates 200 --chats 20 --latency 150 --concurrencia 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.procesamiento import ProcesadorPorChat
+
+
+async def _run(concurrencia, updates, chats, latency):
+    procesador = ProcesadorPorChat(concurrencia)
+    await procesador.initialize()
+    vistos = {chat: [] for chat in range(chats)}
+
+    async def handler(chat, seq):
+        await asyncio.to_thread(time.sleep, latency / 1000)
+        vistos[chat].append(seq)
+
+    start = time.perf_counter()
+    tareas = []
+    for i in range(updates):
+        chat = i % chats
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=chat), effective_user=None)
+        # Same dispatch pattern as Application: one task per update, created in arrival order
+        tareas.append(asyncio.create_task(procesador.process_update(update, handler(chat, i))))
+    await asyncio.gather(*tareas)
+    elapsed = time.perf_counter() - start
+    await procesador.shutdown()
+
+    ordenado = all(seqs == sorted(seqs) for seqs in vistos.values())
+    return updates / elapsed, ordenado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=150, help="simulated Sheets latency (ms)")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    args = parser.parse_args()
+
+    for concurrencia in (1, args.concurrencia):
+        rate, ordenado = asyncio.run(_run(concurrencia, args.updates, args.chats, args.latency))
+        modo = "secuencial" if concurrencia == 1 else f"concurrente ({concurrencia})"
+        print(f"{modo:20s} {rate:8.1f} updates/s  orden por chat: {'OK' if ordenado else 'ROTO'}")
+
+
+if __name__ == "__main__":
+    main()
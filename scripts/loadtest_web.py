@@ -0,0 +1,65 @@
+"""
+Simple load test for the price web: requests/sec and latency percentiles per endpoint.
+
+Usage:
+    python scripts/loadtest_web.py --url http://localhost:5000 --requests 2000 --concurrency 16
+
+Only uses the standard library, so it can run from any machine against a deployed dyno.
+"""
+import argparse
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PATHS = [
+    "/api/precios?bolsa=162&dolar=3.79",
+    "/api/historico",
+    "/api/historico?range=90d&max_points=60",
+]
+
+
+def _hit(url):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            resp.read()
+            ok = 200 <= resp.status < 400
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run(base_url, path, total, concurrency):
+    url = base_url.rstrip("/") + path
+    _hit(url)  # warm caches so the first request does not skew the run
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _hit(url), range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if not r[1])
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(
+        f"{path:45s} {total / elapsed:8.1f} req/s  "
+        f"p50 {p(0.50):7.1f} ms  p95 {p(0.95):7.1f} ms  p99 {p(0.99):7.1f} ms  "
+        f"mean {statistics.mean(latencies) * 1000:7.1f} ms  errors {errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--path", action="append", help="endpoint to test (repeatable)")
+    args = parser.parse_args()
+
+    print(f"{args.url}  {args.requests} requests per endpoint, concurrency {args.concurrency}")
+    for path in args.path or DEFAULT_PATHS:
+        run(args.url, path, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
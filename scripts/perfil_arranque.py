@@ -0,0 +1,63 @@
+"""
+Startup profile: runs `python -X importtime -c "import <module>"` in a fresh interpreter
+and prints total import time plus the slowest modules (cumulative, in ms).
+
+Usage:
+    python scripts/perfil_arranque.py              # profile main.py imports
+    python scripts/perfil_arranque.py --module web --top 30
+
+Compare runs before/after a change to see which imports moved off the startup path.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def perfil(module):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+
+    filas = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        try:
+            filas.append((int(cumulative_us), int(self_us), name.rstrip()))
+        except ValueError:
+            continue  # header line
+    errores = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+    return wall, filas, proc.returncode, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    wall, filas, code, errores = perfil(args.module)
+    if code != 0:
+        print(f"import {args.module} falló (código {code}):")
+        print("\n".join(errores[-15:]))
+        return
+
+    # Top-level imports have a single space of indentation after the "|"
+    top_level = [f for f in filas if not f[2].startswith("  ")]
+    total_ms = sum(f[0] for f in top_level) / 1000
+    print(f"import {args.module}: {total_ms:.0f} ms de imports, {wall * 1000:.0f} ms con el arranque del intérprete")
+    print(f"{'acumulado':>10} {'propio':>9}  módulo")
+    for cumulative, self_us, name in sorted(filas, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:8.1f}ms {self_us / 1000:7.1f}ms  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
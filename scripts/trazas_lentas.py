@@ -0,0 +1,59 @@
+"""
+Summary of the per-update traces written by utils/trazas.py (TRAZAS_EXPORTADOR=jsonl):
+latency percentiles per span name and the slowest updates with their step breakdown.
+
+Usage:
+    python scripts/trazas_lentas.py                      # data/trazas.jsonl
+    python scripts/trazas_lentas.py --archivo trazas.jsonl --top 5 --nombre compra_mixta
+"""
+import argparse
+import json
+from collections import defaultdict
+
+
+def _percentil(valores, q):
+    return valores[min(len(valores) - 1, int(q * len(valores)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archivo", default="data/trazas.jsonl")
+    parser.add_argument("--top", type=int, default=10, help="slowest updates to show")
+    parser.add_argument("--nombre", default="", help="only traces containing a span whose name includes this text")
+    args = parser.parse_args()
+
+    with open(args.archivo) as f:
+        trazas = [json.loads(line) for line in f if line.strip()]
+    if args.nombre:
+        trazas = [t for t in trazas if any(args.nombre in s["nombre"] for s in t["spans"])]
+    if not trazas:
+        print("No hay trazas")
+        return
+
+    por_nombre = defaultdict(list)
+    errores = defaultdict(int)
+    for traza in trazas:
+        for s in traza["spans"]:
+            por_nombre[s["nombre"]].append(s["ms"])
+            errores[s["nombre"]] += bool(s.get("error"))
+
+    print(f"{len(trazas)} trazas")
+    print(f"{'span':45s} {'n':>6} {'p50':>9} {'p95':>9} {'max':>9} {'errores':>8}")
+    for nombre, valores in sorted(por_nombre.items(), key=lambda kv: -sum(kv[1])):
+        valores.sort()
+        print(f"{nombre[:45]:45s} {len(valores):6d} {_percentil(valores, 0.5):7.1f}ms "
+              f"{_percentil(valores, 0.95):7.1f}ms {valores[-1]:7.1f}ms {errores[nombre]:8d}")
+
+    print(f"\nUpdates más lentos:")
+    for traza in sorted(trazas, key=lambda t: -t["ms"])[:args.top]:
+        print(f"\n{traza['ms']:.1f} ms  traza {traza['traza']}")
+        profundidad = {None: -1}
+        for s in traza["spans"]:
+            profundidad[s["id"]] = profundidad.get(s["padre"], -1) + 1
+            marca = "  ERROR" if s.get("error") else ""
+            attr = " ".join(f"{k}={v}" for k, v in s.get("attr", {}).items())
+            print(f"  {'  ' * profundidad[s['id']]}{s['nombre']} {s['ms']:.1f} ms (+{s['offset_ms']:.1f}) {attr}{marca}")
+
+
+if __name__ == "__main__":
+    main()
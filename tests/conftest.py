@@ -0,0 +1,10 @@
+"""Entorno de las pruebas: sin escribir trazas ni borradores en data/ del repositorio."""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("CONVERSACIONES_DIR", tempfile.mkdtemp(prefix="cafebot-tests-"))
+os.environ.setdefault("BORRADORES_BACKEND", "memoria")
+os.environ.setdefault("TRAZAS_EXPORTADOR", "ninguno")
@@ -0,0 +1,52 @@
+"""Descuento de saldos de adelantos con compare-before-write (sin Google Sheets)."""
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from utils.sheets import adelantos, core
+
+
+@pytest.fixture
+def hoja(monkeypatch):
+    estado = {"saldo": "100", "lecturas": 0, "escrituras": [], "otro_escritor": None}
+
+    def leer(hoja, celdas):
+        estado["lecturas"] += 1
+        if estado["otro_escritor"]:
+            estado["saldo"] = estado.pop("otro_escritor")
+            estado["otro_escritor"] = None
+        return [estado["saldo"] for _ in celdas]
+
+    def escribir(hoja, updates):
+        estado["escrituras"].append(updates)
+        estado["saldo"] = str(updates[0][2])
+        return True
+
+    monkeypatch.setattr(core, "read_cells", leer)
+    monkeypatch.setattr(core, "update_cells", escribir)
+    monkeypatch.setattr(adelantos, "read_cells", leer)
+    monkeypatch.setattr(adelantos, "localizar_fila", lambda hoja, registro_id: 4)
+    return estado
+
+
+def test_con_saldo_del_borrador_una_lectura_y_una_escritura(hoja):
+    assert adelantos.descontar_saldo_adelanto("AD-1", 30, saldo_leido="100") == (True, 70.0)
+    assert hoja["lecturas"] == 1
+    assert hoja["escrituras"] == [[(4, "saldo_restante", 70.0)]]
+
+
+def test_conflicto_reintenta_con_el_saldo_vigente_sin_releer(hoja):
+    hoja["otro_escritor"] = "80"
+    assert adelantos.descontar_saldo_adelanto("AD-1", 30, saldo_leido="100") == (True, 50.0)
+    assert hoja["lecturas"] == 2 and len(hoja["escrituras"]) == 1
+
+
+def test_conflicto_que_deja_saldo_insuficiente_no_escribe(hoja):
+    hoja["otro_escritor"] = "20"
+    assert adelantos.descontar_saldo_adelanto("AD-1", 30, saldo_leido="100") == (False, 20.0)
+    assert hoja["escrituras"] == []
+
+
+def test_sin_saldo_del_borrador_lo_lee_de_la_hoja(hoja):
+    assert adelantos.descontar_saldo_adelanto("AD-1", 100) == (True, 0.0)
+    assert len(hoja["escrituras"]) == 1
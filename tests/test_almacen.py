@@ -0,0 +1,150 @@
+"""Asignación FIFO de lotes de almacén y su escritura con compare-before-write (sin Google Sheets)."""
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from utils.sheets import almacen, core
+
+
+class HojaFalsa:
+    """Filas de 'almacen' en memoria: row_index -> registro."""
+
+    def __init__(self, monkeypatch):
+        self.filas = {}
+        self.escrituras = []
+        self.lecturas = 0
+        self.antes_de_leer = None  # simula a otro escritor entre la planificación y la escritura
+        monkeypatch.setattr(almacen, "get_filtered_data", self.filtrar)
+        monkeypatch.setattr(core, "read_cells", self.leer)
+        monkeypatch.setattr(core, "update_cells", self.escribir)
+        monkeypatch.setattr(almacen, "localizar_filas", self.localizar)
+
+    def lote(self, row, fecha, kg, lote_id=None):
+        self.filas[row] = {"id": lote_id or f"ALM-{row}", "fecha": fecha, "cantidad_actual": str(kg),
+                           "fase_actual": "PERGAMINO", "notas": ""}
+
+    def filtrar(self, hoja, filtros, usar_cache=True):
+        return [{**fila, "_row_index": row} for row, fila in self.filas.items()]
+
+    def localizar(self, hoja, lote_ids):
+        filas = {fila["id"]: row for row, fila in self.filas.items()}
+        return {lote_id: filas[lote_id] for lote_id in lote_ids if lote_id in filas}
+
+    def leer(self, hoja, celdas):
+        self.lecturas += 1
+        if self.antes_de_leer:
+            self.antes_de_leer(self)
+        return [self.filas[row][columna] for row, columna in celdas]
+
+    def escribir(self, hoja, updates):
+        self.escrituras.append(updates)
+        for row, columna, valor in updates:
+            self.filas[row][columna] = valor
+        return True
+
+
+@pytest.fixture
+def hoja(monkeypatch):
+    return HojaFalsa(monkeypatch)
+
+
+def _plan(cantidad):
+    plan, faltante = almacen.planificar_descuento_almacen("pergamino", cantidad)
+    return [(registro["id"], kg) for registro, kg in plan], faltante
+
+
+def test_plan_exacto_en_un_lote(hoja):
+    hoja.lote(0, "2024-01-02", 50)
+    hoja.lote(1, "2024-01-01", 30)
+    assert _plan(30) == ([("ALM-1", 30.0)], 0.0)
+
+
+def test_plan_que_abarca_varios_lotes(hoja):
+    hoja.lote(0, "2024-01-03", 40)
+    hoja.lote(1, "2024-01-01", 10)
+    hoja.lote(2, "2024-01-02", 20)
+    assert _plan(45) == ([("ALM-1", 10.0), ("ALM-2", 20.0), ("ALM-0", 15.0)], 0.0)
+
+
+def test_empate_de_fecha_se_resuelve_por_fila(hoja):
+    for row in (5, 2, 9):
+        hoja.lote(row, "2024-01-01", 10)
+    assert [lote_id for lote_id, _ in _plan(25)[0]] == ["ALM-2", "ALM-5", "ALM-9"]
+
+
+def test_lotes_con_cantidad_invalida_se_omiten(hoja):
+    hoja.lote(0, "2024-01-01", "n/a")
+    hoja.lote(1, "2024-01-02", "")
+    hoja.lote(2, "2024-01-03", 12)
+    assert _plan(12) == ([("ALM-2", 12.0)], 0.0)
+
+
+def test_stock_insuficiente_no_escribe(hoja):
+    hoja.lote(0, "2024-01-01", 10)
+    hoja.lote(1, "2024-01-02", 5)
+    assert _plan(20)[1] == pytest.approx(5.0)
+    assert almacen.descontar_almacen("PERGAMINO", 20) == (False, "")
+    assert hoja.escrituras == []
+
+
+def test_descuento_lee_una_vez_y_escribe_en_un_lote(hoja):
+    hoja.lote(0, "2024-01-01", 10)
+    hoja.lote(1, "2024-01-02", 20)
+    assert almacen.descontar_almacen("PERGAMINO", 15) == (True, "ALM-0")
+    assert hoja.lecturas == 1 and len(hoja.escrituras) == 1
+    assert float(hoja.filas[0]["cantidad_actual"]) == 0 and float(hoja.filas[1]["cantidad_actual"]) == 15
+
+
+def test_conflicto_vuelve_a_planificar_con_lo_vigente(hoja):
+    hoja.lote(0, "2024-01-01", 10)
+    hoja.lote(1, "2024-01-02", 20)
+
+    def otro_escritor(h):
+        # Otro proceso vende 4 kg del lote más antiguo justo antes de nuestra escritura
+        h.filas[0]["cantidad_actual"] = "6"
+        h.antes_de_leer = None
+
+    hoja.antes_de_leer = otro_escritor
+    assert almacen.descontar_almacen("PERGAMINO", 15) == (True, "ALM-0")
+    assert hoja.lecturas == 2 and len(hoja.escrituras) == 1
+    assert float(hoja.filas[0]["cantidad_actual"]) == 0 and float(hoja.filas[1]["cantidad_actual"]) == 11
+
+
+def test_conflicto_persistente_no_escribe(hoja):
+    hoja.lote(0, "2024-01-01", 10)
+
+    def siempre_cambia(h):
+        h.filas[0]["cantidad_actual"] = str(float(h.filas[0]["cantidad_actual"]) + 1)
+
+    hoja.antes_de_leer = siempre_cambia
+    assert almacen.descontar_almacen("PERGAMINO", 5) == (False, "")
+    assert hoja.lecturas == almacen._MAX_REINTENTOS
+    assert hoja.escrituras == []
+
+
+def test_lote_movido_se_escribe_en_su_fila_nueva(hoja):
+    hoja.lote(3, "2024-01-01", 10)
+    plan, _ = almacen.planificar_descuento_almacen("PERGAMINO", 4)
+    # Alguien inserta una fila encima: el lote pasa de la fila 3 a la 4
+    hoja.filas[4] = hoja.filas.pop(3)
+    hoja.filas[3] = {"id": "ALM-X", "fecha": "2024-01-05", "cantidad_actual": "99", "fase_actual": "PERGAMINO", "notas": ""}
+    assert almacen.aplicar_plan_descuento(plan)
+    assert float(hoja.filas[4]["cantidad_actual"]) == 6 and hoja.filas[3]["cantidad_actual"] == "99"
+
+
+def test_lote_eliminado_es_conflicto(hoja):
+    hoja.lote(0, "2024-01-01", 10)
+    plan, _ = almacen.planificar_descuento_almacen("PERGAMINO", 4)
+    del hoja.filas[0]
+    with pytest.raises(core.ConflictoConcurrencia):
+        almacen.aplicar_plan_descuento(plan)
+    assert hoja.escrituras == []
+
+
+def test_update_cells_if_unchanged_informa_los_valores_vigentes(hoja):
+    hoja.lote(0, "2024-01-01", 10)
+    hoja.filas[0]["cantidad_actual"] = "7"
+    with pytest.raises(core.ConflictoConcurrencia) as error:
+        core.update_cells_if_unchanged("almacen", [(0, "cantidad_actual", "10")], [(0, "cantidad_actual", "5")])
+    assert error.value.actuales == ["7"]
+    assert hoja.escrituras == []
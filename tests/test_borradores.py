@@ -0,0 +1,29 @@
+"""Barrido de user_data de usuarios inactivos."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from telegram.ext import Application
+
+from utils import borradores
+
+
+def test_barrido_descarta_user_data_inactivo():
+    application = Application.builder().token("123:ABC").build()
+    application.user_data[1][borradores._ACTIVIDAD] = time.time()
+    application.user_data[2][borradores._ACTIVIDAD] = time.time() - 3600
+    application.user_data[3]["ai_datos"] = {}  # sin actividad registrada
+
+    assert borradores.purgar_user_data(application, ttl=600) == 2
+    assert list(application.user_data) == [1]
+
+
+def test_marcar_actividad():
+    user_data = {}
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=1))
+    asyncio.run(borradores._marcar_actividad(update, SimpleNamespace(user_data=user_data)))
+    assert time.time() - user_data[borradores._ACTIVIDAD] < 5
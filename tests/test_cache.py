@@ -0,0 +1,31 @@
+"""SWRCache: reintentos tras un fallo cuando todavía no hay valor."""
+from utils.cache import SWRCache
+
+
+def test_sin_valor_respeta_retry_after():
+    llamadas = []
+
+    def loader():
+        llamadas.append(1)
+        raise RuntimeError("upstream caído")
+
+    cache = SWRCache(loader, ttl=60, name="prueba", retry_after=60)
+    valor, meta = cache.get_with_meta()
+    assert valor is None and cache.last_error == "upstream caído"
+    assert meta["age"] is None and 0 < meta["retry_in"] <= 60
+
+    for _ in range(5):
+        assert cache.get() is None
+    assert len(llamadas) == 1
+
+    cache.invalidate()
+    cache.get()
+    assert len(llamadas) == 2
+
+
+def test_se_recupera_tras_el_backoff():
+    respuestas = iter([None, 3.8])
+    cache = SWRCache(lambda: next(respuestas), ttl=60, name="prueba", retry_after=0)
+    assert cache.get() is None
+    valor, meta = cache.get_with_meta()
+    assert valor == 3.8 and meta == {"age": 0.0, "stale": False}
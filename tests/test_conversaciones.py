@@ -0,0 +1,75 @@
+"""Cierre por inactividad de las conversaciones y rearme de sus timeouts tras un reinicio."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("apscheduler")
+
+from telegram.ext import Application, CommandHandler, ConversationHandler, ExtBot, MessageHandler, filters
+
+from utils.conversaciones import ConversacionPersistente
+
+PASO = 1
+
+
+def _conversacion(borradores, timeout):
+    async def inicio(update, context):
+        return PASO
+
+    return ConversacionPersistente(
+        entry_points=[CommandHandler("compra", inicio)],
+        states={PASO: [MessageHandler(filters.TEXT, inicio)]},
+        fallbacks=[],
+        name="compras",
+        conversation_timeout=timeout,
+        borradores=borradores,
+        claves_user_data=("monto",),
+        comando="/compra",
+    )
+
+
+@pytest.fixture
+def avisos(monkeypatch):
+    enviados = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        enviados.append((chat_id, text))
+
+    monkeypatch.setattr(ExtBot, "send_message", send_message)
+    return enviados
+
+
+def test_todas_las_conversaciones_tienen_estado_timeout():
+    conversacion = _conversacion({}, 60)
+    assert ConversationHandler.TIMEOUT in conversacion.states
+    assert PASO in conversacion.states
+
+
+def test_conversacion_restaurada_vence_tras_reiniciar(avisos):
+    async def escenario():
+        borradores = {7: {"tipo_cafe": "CEREZO"}, 8: {"tipo_cafe": "MOTE"}}
+        application = Application.builder().token("123:abc").build()
+        conversacion = _conversacion(borradores, 0.05)
+        application.add_handler(conversacion)
+        # Estado restaurado desde la persistencia: sin job de timeout
+        conversacion._conversations[(7, 7)] = PASO
+        application.user_data[7]["monto"] = 100
+        application.user_data[7]["_actividad"] = 1.0
+
+        await application.job_queue.start()
+        try:
+            assert conversacion.rearmar_timeouts(application) == 1
+            assert (7, 7) in conversacion.timeout_jobs
+            # Un segundo rearme no duplica el job
+            assert conversacion.rearmar_timeouts(application) == 0
+            await asyncio.sleep(0.3)
+        finally:
+            await application.job_queue.stop(wait=False)
+        return conversacion, borradores, application
+
+    conversacion, borradores, application = asyncio.run(escenario())
+    assert (7, 7) not in conversacion._conversations
+    assert borradores == {8: {"tipo_cafe": "MOTE"}}
+    assert application.user_data[7] == {"_actividad": 1.0}
+    assert avisos and avisos[0][0] == 7 and "/compra" in avisos[0][1]
@@ -0,0 +1,47 @@
+"""Índice de deduplicación de evidencias en Drive (sin llamar a Drive)."""
+import io
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from utils import drive
+
+
+@pytest.fixture
+def subidas(monkeypatch, tmp_path):
+    monkeypatch.setattr(drive, "HASH_INDEX_FILE", str(tmp_path / "drive_hashes.json"))
+    monkeypatch.setattr(drive, "_hash_index", None)
+    monkeypatch.setattr(drive, "_archivo_sigue_en_drive", lambda file_id: True)
+    hechas = []
+
+    def subir(stream, file_name, mime_type, folder_id, chunk_size, progress_callback):
+        hechas.append(folder_id)
+        return {"id": f"file-{len(hechas)}", "name": file_name, "webViewLink": "", "duplicado": False}
+
+    monkeypatch.setattr(drive, "_subir_stream", subir)
+    return hechas
+
+
+def _subir(folder_id):
+    return drive.upload_stream_to_drive(io.BytesIO(b"misma foto"), "foto.jpg", folder_id=folder_id)
+
+
+def test_mismo_contenido_misma_carpeta_no_se_resube(subidas):
+    primero = _subir("carpeta-a")
+    segundo = _subir("carpeta-a")
+    assert segundo["id"] == primero["id"] and segundo["duplicado"]
+    assert subidas == ["carpeta-a"]
+
+
+def test_mismo_contenido_otra_carpeta_se_sube(subidas):
+    assert _subir("carpeta-a")["id"] != _subir("carpeta-b")["id"]
+    assert subidas == ["carpeta-a", "carpeta-b"]
+
+
+def test_archivo_borrado_en_drive_se_olvida(subidas, monkeypatch):
+    primero = _subir("carpeta-a")
+    monkeypatch.setattr(drive, "_archivo_sigue_en_drive", lambda file_id: False)
+    segundo = _subir("carpeta-a")
+    assert segundo["id"] != primero["id"] and not segundo["duplicado"]
+    assert len(subidas) == 2
@@ -0,0 +1,84 @@
+"""Cola de evidencias en disco: arranque perezoso y reanudación tras un reinicio (sin Drive)."""
+import json
+import os
+import queue
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from utils import evidencias
+
+
+@pytest.fixture
+def spool(monkeypatch, tmp_path):
+    subidas = []
+    monkeypatch.setattr(evidencias, "DRIVE_ENABLED", True)
+    monkeypatch.setattr(evidencias, "UPLOADS_FOLDER", str(tmp_path))
+    # Estado de un proceso recién arrancado
+    monkeypatch.setattr(evidencias, "_cola", queue.Queue())
+    monkeypatch.setattr(evidencias, "_uploader_iniciado", False)
+    monkeypatch.setattr(evidencias, "_pendientes_retomados", False)
+    monkeypatch.setattr(evidencias, "_executor", None)
+    monkeypatch.setattr(evidencias, "_al_terminar", [])
+    monkeypatch.setattr(evidencias, "EVIDENCIAS_WORKERS", 1)
+
+    def subir(archivo, file_name, mime_type, folder_id, comprimir, progreso):
+        subidas.append((file_name, archivo.read()))
+        return {"id": f"drive-{file_name}"}
+
+    monkeypatch.setattr(evidencias, "_procesar_y_subir", subir)
+    return tmp_path, subidas
+
+
+def _dejar_pendiente(carpeta, spool_id, contenido, creado):
+    """Lo que deja encolar_evidencia en disco si el proceso muere antes de subir"""
+    (carpeta / f"{spool_id}.bin").write_bytes(contenido)
+    ruta_json = carpeta / f"{spool_id}.json"
+    ruta_json.write_text(json.dumps({
+        "id": spool_id, "file_name": f"{spool_id}.jpg", "folder_id": None, "mime_type": "image/jpeg",
+        "comprimir": False, "datos": {"compra": spool_id}, "intentos": 1, "creado": creado,
+    }))
+    os.utime(ruta_json, (creado, creado))
+
+
+def test_pendientes_se_retoman_al_reiniciar(spool):
+    carpeta, subidas = spool
+    _dejar_pendiente(carpeta, "b", b"segunda", 2000)
+    _dejar_pendiente(carpeta, "a", b"primera", 1000)
+    (carpeta / "c.bin.tmp").write_bytes(b"descarga interrumpida")
+    terminadas = []
+    evidencias.registrar_al_terminar(lambda metadatos, resultado: terminadas.append((metadatos["datos"], resultado)))
+
+    assert evidencias.iniciar_uploader() == 2
+    evidencias._cola.join()
+
+    assert subidas == [("a.jpg", b"primera"), ("b.jpg", b"segunda")]
+    assert terminadas == [({"compra": "a"}, {"id": "drive-a.jpg"}), ({"compra": "b"}, {"id": "drive-b.jpg"})]
+    assert sorted(os.listdir(carpeta)) == ["c.bin.tmp"]
+    # Una segunda llamada no vuelve a encolar nada
+    assert evidencias.iniciar_uploader() == 0
+
+
+def test_sin_pendientes_no_arranca_hilos_ni_pool(spool):
+    assert evidencias.iniciar_uploader() == 0
+    assert not evidencias._uploader_iniciado
+    assert evidencias._executor is None
+
+
+def test_sin_drive_no_se_retoma_nada(spool, monkeypatch):
+    carpeta, subidas = spool
+    _dejar_pendiente(carpeta, "a", b"primera", 1000)
+    monkeypatch.setattr(evidencias, "DRIVE_ENABLED", False)
+    assert evidencias.iniciar_uploader() == 0
+    assert not evidencias._uploader_iniciado and subidas == []
+
+
+def test_estadisticas_en_metrics(spool):
+    from utils.metricas import exportar_prometheus
+
+    evidencias._cola.put("x")
+    texto = exportar_prometheus()
+    assert 'cafebot_evidencias{nombre="subidas"}' in texto
+    assert 'cafebot_evidencias{nombre="throughput_bps"}' in texto
+    assert "cafebot_evidencias_en_cola 1" in texto
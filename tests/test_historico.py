@@ -0,0 +1,87 @@
+"""Recuperación de snapshots del histórico de precios (sin Yahoo ni Google Sheets)."""
+import datetime
+
+import pytest
+
+pytest.importorskip("flask")
+
+import web
+
+
+@pytest.fixture
+def historico(monkeypatch, tmp_path):
+    estado = {"filas": [], "guardadas": [], "consultas": 0}
+    hoy = datetime.datetime.now(web._LIMA).date()
+
+    def cierres(symbol, desde, hasta):
+        estado["consultas"] += 1
+        dias = (desde + datetime.timedelta(days=n) for n in range((hasta - desde).days))
+        return {d.isoformat(): 100.0 if symbol == "KC=F" else 3.7 for d in dias if d.weekday() < 5}
+
+    def guardar(hoja, snaps):
+        estado["guardadas"].append(snaps)
+        estado["filas"].extend(snaps)
+        return True
+
+    monkeypatch.setattr(web, "_sheets_ok", True)
+    monkeypatch.setattr(web, "HISTORICO_ESTADO_FILE", str(tmp_path / "estado.json"))
+    monkeypatch.setattr(web, "get_historico_data", lambda: estado["filas"])
+    monkeypatch.setattr(web, "_fetch_daily_closes", cierres)
+    monkeypatch.setattr(web, "sheets_append_rows", guardar, raising=False)
+    monkeypatch.setattr(web, "_historico_add", lambda snap: None)
+    return estado, hoy
+
+
+def test_backfill_recupera_los_dias_habiles_perdidos(historico):
+    estado, hoy = historico
+    ultima = hoy - datetime.timedelta(days=12)
+    estado["filas"] = [{"fecha": ultima.isoformat()}]
+
+    recuperados = web.backfill_historico(max_dias=30)
+
+    esperados = [
+        (ultima + datetime.timedelta(days=n)).isoformat()
+        for n in range(1, 12)
+        if (ultima + datetime.timedelta(days=n)).weekday() < 5
+    ]
+    assert recuperados == len(esperados) >= 7
+    assert [snap["fecha"] for snap in estado["guardadas"][0]] == esperados
+    assert web._load_estado()["last_date"] == esperados[-1]
+
+
+def test_backfill_respeta_max_dias(historico):
+    estado, hoy = historico
+    estado["filas"] = [{"fecha": (hoy - datetime.timedelta(days=40)).isoformat()}]
+
+    web.backfill_historico(max_dias=5)
+    assert all(snap["fecha"] >= (hoy - datetime.timedelta(days=5)).isoformat() for snap in estado["guardadas"][0])
+
+
+def test_backfill_repetido_no_duplica(historico):
+    estado, hoy = historico
+    estado["filas"] = [{"fecha": (hoy - datetime.timedelta(days=10)).isoformat()}]
+    web.backfill_historico(max_dias=30)
+    assert len(estado["guardadas"]) == 1
+
+    assert web.backfill_historico(max_dias=30) == 0
+    assert len(estado["guardadas"]) == 1
+
+
+def test_backfill_sin_hueco_no_consulta(historico):
+    estado, hoy = historico
+    estado["filas"] = [{"fecha": (hoy - datetime.timedelta(days=1)).isoformat()}]
+    assert web.backfill_historico(max_dias=30) == 0
+    assert estado["consultas"] == 0 and estado["guardadas"] == []
+
+
+def test_snapshot_del_dia_ya_guardado_no_hace_nada(historico, monkeypatch):
+    estado, hoy = historico
+    web._marcar_guardado(hoy.isoformat())
+
+    def no_llamar(*args):
+        raise AssertionError("no debe consultar precios ni escribir")
+
+    monkeypatch.setattr(web, "get_coffee_bolsa", no_llamar)
+    monkeypatch.setattr(web, "sheets_append", no_llamar, raising=False)
+    assert web.save_precio_historico() is True
+    assert web._ultima_fecha_guardada() == hoy.isoformat()
@@ -0,0 +1,30 @@
+"""
+Smoke test: every entry point and module must import cleanly (catches NameErrors and
+broken module-level code such as web.py's import-time recargar_zonas()).
+"""
+import importlib
+import pkgutil
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("flask")
+
+import handlers
+import utils
+
+
+def _modulos(paquete):
+    return [m.name for m in pkgutil.walk_packages(paquete.__path__, paquete.__name__ + ".")]
+
+
+@pytest.mark.parametrize("nombre", ["config", "web", "main", "bot", *_modulos(handlers), *_modulos(utils)])
+def test_importa(nombre):
+    importlib.import_module(nombre)
+
+
+def test_web_expone_lo_que_usa_main():
+    web = importlib.import_module("web")
+    assert callable(web.programar_snapshots)
+    assert callable(web.set_telegram_sink)
+    assert web.app.test_client().get("/").status_code == 200
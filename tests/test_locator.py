@@ -0,0 +1,95 @@
+"""Localización de filas por ID y asignación segura de IDs (sin Google Sheets)."""
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from utils.sheets import core, locator
+
+
+@pytest.fixture
+def hoja(monkeypatch):
+    """Hoja 'adelantos' en memoria: lista de filas en el orden de la hoja."""
+    estado = {"filas": [], "lecturas": [], "reconstrucciones": 0, "escrituras": []}
+
+    def leer(hoja, celdas):
+        estado["lecturas"].append(celdas)
+        return [estado["filas"][row].get(columna, "") if row < len(estado["filas"]) else ""
+                for row, columna in celdas]
+
+    def columna(hoja, nombre):
+        estado["reconstrucciones"] += 1
+        return [fila.get(nombre, "") for fila in estado["filas"]]
+
+    def escribir(hoja, updates):
+        estado["escrituras"].append(updates)
+        for row, nombre, valor in updates:
+            estado["filas"][row][nombre] = valor
+        return True
+
+    monkeypatch.setattr(locator, "read_cells", leer)
+    monkeypatch.setattr(locator, "get_column_values", columna)
+    monkeypatch.setattr(core, "read_cells", leer)
+    monkeypatch.setattr(core, "update_cells", escribir)
+    locator.invalidar_indice()
+    yield estado
+    locator.invalidar_indice()
+
+
+def _adelanto(adelanto_id, fecha="2024-01-01", proveedor="Juan"):
+    return {"id": adelanto_id, "fecha": fecha, "proveedor": proveedor}
+
+
+def test_indice_cacheado_se_verifica_con_una_celda(hoja):
+    hoja["filas"] = [_adelanto("AD-1"), _adelanto("AD-2")]
+    assert locator.localizar_fila("adelantos", "AD-2") == 1
+    hoja["lecturas"].clear()
+
+    assert locator.localizar_fila("adelantos", "AD-2") == 1
+    assert hoja["reconstrucciones"] == 1
+    assert hoja["lecturas"] == [[(1, "id")]]
+
+
+def test_indice_desactualizado_se_reconstruye(hoja):
+    hoja["filas"] = [_adelanto("AD-1"), _adelanto("AD-2")]
+    assert locator.localizar_fila("adelantos", "AD-2") == 1
+
+    # Se inserta una fila al principio de la hoja
+    hoja["filas"].insert(0, _adelanto("AD-0"))
+    assert locator.localizar_fila("adelantos", "AD-2") == 2
+    assert hoja["reconstrucciones"] == 2
+
+
+def test_id_inexistente(hoja):
+    hoja["filas"] = [_adelanto("AD-1")]
+    assert locator.localizar_fila("adelantos", "AD-9") is None
+    assert locator.localizar_filas("adelantos", ["AD-1", "AD-9"]) == {"AD-1": 0}
+    assert locator.localizar_fila("adelantos", "") is None
+
+
+def test_asegurar_id_escribe_en_la_fila_leida(hoja):
+    hoja["filas"] = [_adelanto(""), _adelanto("", fecha="2024-01-02")]
+    registro = {**hoja["filas"][1], "_row_index": 1}
+
+    nuevo_id = locator.asegurar_id("adelantos", registro)
+    assert nuevo_id.startswith("AD-")
+    assert hoja["filas"][1]["id"] == nuevo_id and hoja["filas"][0]["id"] == ""
+    assert locator.localizar_fila("adelantos", nuevo_id) == 1
+
+
+def test_asegurar_id_no_escribe_si_la_fila_cambio(hoja):
+    hoja["filas"] = [_adelanto(""), _adelanto("", fecha="2024-01-02")]
+    registro = {**hoja["filas"][1], "_row_index": 1}
+
+    # La hoja se reordenó: en la fila leída ahora hay otro adelanto
+    hoja["filas"].reverse()
+    assert locator.asegurar_id("adelantos", registro) == ""
+    assert hoja["escrituras"] == []
+
+
+def test_asegurar_id_no_pisa_un_id_asignado_por_otro(hoja):
+    hoja["filas"] = [_adelanto("")]
+    registro = {**hoja["filas"][0], "_row_index": 0}
+    hoja["filas"][0]["id"] = "AD-OTRO"
+
+    assert locator.asegurar_id("adelantos", registro) == ""
+    assert hoja["filas"][0]["id"] == "AD-OTRO"
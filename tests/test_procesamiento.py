@@ -0,0 +1,86 @@
+"""ProcesadorPorChat: orden por chat sin que un chat ocupado acapare los cupos."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from utils.procesamiento import ProcesadorPorChat
+
+
+def _update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=None,
+                           callback_query=None, effective_message=None)
+
+
+def test_chat_ocupado_no_bloquea_a_otro_chat():
+    async def escenario():
+        procesador = ProcesadorPorChat(2)
+        liberar = asyncio.Event()
+        atendidos = []
+
+        async def lento(n):
+            await liberar.wait()
+            atendidos.append(("ocupado", n))
+
+        async def rapido():
+            atendidos.append(("libre", 0))
+
+        async with procesador:
+            ocupado = [asyncio.create_task(procesador.process_update(_update(1), lento(n))) for n in range(5)]
+            await asyncio.sleep(0)
+            # El chat libre se atiende aunque el ocupado tenga más updates encolados que cupos
+            await asyncio.wait_for(procesador.process_update(_update(2), rapido()), timeout=1)
+            assert atendidos == [("libre", 0)]
+            liberar.set()
+            await asyncio.gather(*ocupado)
+        return atendidos
+
+    atendidos = asyncio.run(escenario())
+    assert atendidos[1:] == [("ocupado", n) for n in range(5)]
+
+
+def test_updates_de_un_chat_en_orden_y_uno_a_la_vez():
+    async def escenario():
+        procesador = ProcesadorPorChat(4)
+        en_curso = 0
+        maximo = 0
+        orden = []
+
+        async def paso(n):
+            nonlocal en_curso, maximo
+            en_curso += 1
+            maximo = max(maximo, en_curso)
+            await asyncio.sleep(0.001)
+            orden.append(n)
+            en_curso -= 1
+
+        async with procesador:
+            await asyncio.gather(*(procesador.process_update(_update(7), paso(n)) for n in range(10)))
+        assert not procesador._locks
+        return orden, maximo
+
+    orden, maximo = asyncio.run(escenario())
+    assert orden == list(range(10))
+    assert maximo == 1
+
+
+def test_chats_distintos_respetan_el_limite():
+    async def escenario():
+        procesador = ProcesadorPorChat(3)
+        en_curso = 0
+        maximo = 0
+
+        async def paso():
+            nonlocal en_curso, maximo
+            en_curso += 1
+            maximo = max(maximo, en_curso)
+            await asyncio.sleep(0.001)
+            en_curso -= 1
+
+        async with procesador:
+            await asyncio.gather(*(procesador.process_update(_update(chat), paso()) for chat in range(12)))
+        return maximo
+
+    assert asyncio.run(escenario()) == 3
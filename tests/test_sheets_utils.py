@@ -0,0 +1,37 @@
+"""Notación A1 de columnas y rangos de las hojas."""
+import pytest
+
+from utils.sheets import utils
+
+
+@pytest.mark.parametrize("indice, letras", [
+    (0, "A"), (25, "Z"),
+    (26, "AA"), (27, "AB"), (51, "AZ"), (52, "BA"),
+    (701, "ZZ"), (702, "AAA"),
+])
+def test_column_letter(indice, letras):
+    assert utils.column_letter(indice) == letras
+
+
+def test_column_letter_negativo():
+    with pytest.raises(ValueError):
+        utils.column_letter(-1)
+
+
+def test_rangos_de_una_hoja_con_mas_de_26_columnas(monkeypatch):
+    cabeceras = [f"c{i}" for i in range(53)]
+    monkeypatch.setitem(utils.COLUMN_LETTERS, "ancha", {c: utils.column_letter(i) for i, c in enumerate(cabeceras)})
+    monkeypatch.setitem(utils.LAST_COLUMN, "ancha", utils.column_letter(len(cabeceras) - 1))
+
+    assert utils.cell_range("ancha", 0, "c26") == "ancha!AA2"
+    assert utils.cell_range("ancha", 3, "c51") == "ancha!AZ5"
+    assert utils.column_range("ancha", "c52") == "ancha!BA2:BA"
+    assert utils.row_range("ancha", 1) == "ancha!A1:BA1"
+    assert utils.sheet_range("ancha") == "ancha!A:BA"
+
+
+def test_hojas_cortas_se_leen_hasta_z():
+    assert utils.sheet_range("compras") == "compras!A:Z"
+    assert utils.cell_range("compras", 0, "proveedor") == "compras!D2"
+    with pytest.raises(ValueError):
+        utils.get_column_letter("compras", "no_existe")
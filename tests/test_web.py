@@ -0,0 +1,118 @@
+"""Rutas de la web de precios que no dependen de servicios externos."""
+import datetime
+
+import pytest
+
+pytest.importorskip("flask")
+
+import web
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    hoy = datetime.datetime.now(web._LIMA).date()
+    # Solo días hábiles, como la hoja: 60 días naturales tienen ~43 filas
+    filas = [
+        {"fecha": (hoy - datetime.timedelta(days=n)).isoformat(), **{k: 1.0 for k in web._HISTORICO_FIELDS}}
+        for n in range(60, -1, -1)
+        if (hoy - datetime.timedelta(days=n)).weekday() < 5
+    ]
+    monkeypatch.setattr(web, "get_historico_data", lambda: filas)
+    return web.app.test_client(), hoy
+
+
+def test_historico_range_son_dias_naturales(cliente):
+    client, hoy = cliente
+    filas = client.get("/api/historico?range=30").get_json()
+    desde = (hoy - datetime.timedelta(days=30)).isoformat()
+    assert filas and all(f["fecha"] >= desde for f in filas)
+    assert len(filas) < 30
+
+
+def test_metrics_requiere_token(monkeypatch):
+    client = web.app.test_client()
+    monkeypatch.setattr(web, "METRICS_TOKEN", "")
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(web, "METRICS_TOKEN", "secreto")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics?token=otro").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer secreto"}).status_code == 200
+    assert client.get("/metrics?token=secreto").status_code == 200
+
+
+def test_index_negocia_codificacion_y_revalida():
+    client = web.app.test_client()
+
+    identidad = client.get("/")
+    assert identidad.status_code == 200
+    assert "Content-Encoding" not in identidad.headers
+    assert identidad.headers["Vary"] == "Accept-Encoding"
+
+    comprimida = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert comprimida.headers["Content-Encoding"] == "gzip"
+    assert comprimida.headers["Vary"] == "Accept-Encoding"
+    assert comprimida.headers["ETag"] != identidad.headers["ETag"]
+
+    revalidada = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": comprimida.headers["ETag"]})
+    assert revalidada.status_code == 304 and revalidada.data == b""
+    assert revalidada.headers["ETag"] == comprimida.headers["ETag"]
+
+    # El ETag de otra codificación no sirve para revalidar
+    assert client.get("/", headers={"If-None-Match": comprimida.headers["ETag"]}).status_code == 200
+
+
+def test_index_prefiere_brotli():
+    pytest.importorskip("brotli")
+    client = web.app.test_client()
+    resp = client.get("/", headers={"Accept-Encoding": "gzip, br"})
+    assert resp.headers["Content-Encoding"] == "br"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+
+
+def test_lttb_conserva_extremos_y_respeta_max_points():
+    filas = [{"i": i, "v": float((i * 37) % 101)} for i in range(500)]
+    muestra = web._lttb(filas, 50, "v")
+    assert len(muestra) == 50
+    assert muestra[0] is filas[0] and muestra[-1] is filas[-1]
+    assert [f["i"] for f in muestra] == sorted({f["i"] for f in muestra})
+
+
+def test_lttb_no_reduce_series_cortas():
+    filas = [{"v": float(i)} for i in range(10)]
+    assert web._lttb(filas, 10, "v") is filas
+    assert web._lttb(filas, 2, "v") is filas
+
+
+def test_lttb_conserva_picos():
+    filas = [{"v": 0.0} for _ in range(100)]
+    filas[40]["v"] = 99.0
+    assert filas[40] in web._lttb(filas, 10, "v")
+
+
+def test_historico_max_points(cliente):
+    client, _ = cliente
+    completas = client.get("/api/historico?range=60").get_json()
+    filas = client.get("/api/historico?range=60&max_points=10").get_json()
+    assert len(completas) > 10 and len(filas) == 10
+    assert filas[0] == completas[0] and filas[-1] == completas[-1]
+
+
+def test_recargar_zonas_invalida_los_precios_memorizados(monkeypatch):
+    antes = web.calcular_precios(200.0, 3.7)
+    assert web.calcular_precios(200.0, 3.7) is antes
+    web.preparar_index()
+
+    zonas = [dict(zona) for zona in web.ZONAS]
+    zonas[0]["rendimiento"] *= 2
+    monkeypatch.setattr(web, "ZONAS", zonas)
+    try:
+        web.recargar_zonas()
+        assert not web._index_page
+        despues = web.calcular_precios(200.0, 3.7)
+        assert despues is not antes
+        assert despues["zonas"][0]["precio_kg"] == pytest.approx(2 * antes["zonas"][0]["precio_kg"], rel=1e-3)
+        assert despues["zonas"][1:] == antes["zonas"][1:]
+    finally:
+        monkeypatch.undo()
+        web.recargar_zonas()
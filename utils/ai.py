@@ -7,6 +7,8 @@ import logging
 import requests
 from typing import Optional
 
+from utils.metricas import medir
+
 logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """Eres un asistente para un negocio de café en Perú.
@@ -58,23 +60,25 @@ Ejemplos:
 def _call_groq(message: str, groq_api_key: str) -> Optional[dict]:
     """Call Groq API with llama-3.3-70b-versatile."""
     try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {groq_api_key}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "llama-3.3-70b-versatile",
-                "messages": [
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": message},
-                ],
-                "temperature": 0.1,
-                "response_format": {"type": "json_object"},
-            },
-            timeout=10,
-        )
+        with medir("ai.groq") as medicion:
+            response = requests.post(
+                "https://api.groq.com/openai/v1/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {groq_api_key}",
+                    "Content-Type": "application/json",
+                },
+                json={
+                    "model": "llama-3.3-70b-versatile",
+                    "messages": [
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": message},
+                    ],
+                    "temperature": 0.1,
+                    "response_format": {"type": "json_object"},
+                },
+                timeout=10,
+            )
+            medicion.error = response.status_code != 200
         if response.status_code == 200:
             content = response.json()["choices"][0]["message"]["content"]
             return json.loads(content)
@@ -89,14 +93,16 @@ def _call_gemini(message: str, gemini_api_key: str) -> Optional[dict]:
     """Call Gemini 1.5 Flash as backup."""
     try:
         prompt = f"{SYSTEM_PROMPT}\n\nMensaje del usuario: {message}\n\nResponde solo con el JSON:"
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={gemini_api_key}",
-            json={
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {"temperature": 0.1},
-            },
-            timeout=10,
-        )
+        with medir("ai.gemini") as medicion:
+            response = requests.post(
+                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={gemini_api_key}",
+                json={
+                    "contents": [{"parts": [{"text": prompt}]}],
+                    "generationConfig": {"temperature": 0.1},
+                },
+                timeout=10,
+            )
+            medicion.error = response.status_code != 200
         if response.status_code == 200:
             text = response.json()["candidates"][0]["content"]["parts"][0]["text"]
             # Strip markdown code blocks if present
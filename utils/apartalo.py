@@ -6,6 +6,8 @@ Integration with apartalo-core API for BIZ-006 (Finca Rosal).
 import logging
 import requests
 
+from utils.metricas import medir
+
 logger = logging.getLogger(__name__)
 
 APARTALO_BASE  = "https://apartalo-core-9d633cdb9e1a.herokuapp.com"
@@ -43,12 +45,14 @@ def agregar_stock(tipo_cafe: str, cantidad: float, motivo: str = "") -> bool:
             "operacion": "agregar",
             "motivo": motivo or f"Compra {tipo} via bot cafe ({cantidad} kg)",
         }
-        resp = requests.post(
-            _url(f"productos/{BUSINESS_ID}/{codigo}/stock"),
-            json=payload,
-            headers=_HEADERS,
-            timeout=_TIMEOUT,
-        )
+        with medir("apartalo.stock", producto=codigo) as medicion:
+            resp = requests.post(
+                _url(f"productos/{BUSINESS_ID}/{codigo}/stock"),
+                json=payload,
+                headers=_HEADERS,
+                timeout=_TIMEOUT,
+            )
+            medicion.error = resp.status_code != 200
         data = resp.json()
         if resp.status_code == 200 and data.get("success"):
             logger.info(
@@ -82,12 +86,14 @@ def actualizar_precios(precio_pergamino: float, precio_oro_verde: float, precio_
 
 def _update_precio(codigo: str, precio: float, nombre: str) -> bool:
     try:
-        resp = requests.put(
-            _url(f"productos/{BUSINESS_ID}/{codigo}"),
-            json={"precio": round(precio, 2)},
-            headers=_HEADERS,
-            timeout=_TIMEOUT,
-        )
+        with medir("apartalo.precio", producto=codigo) as medicion:
+            resp = requests.put(
+                _url(f"productos/{BUSINESS_ID}/{codigo}"),
+                json={"precio": round(precio, 2)},
+                headers=_HEADERS,
+                timeout=_TIMEOUT,
+            )
+            medicion.error = resp.status_code != 200
         if resp.status_code == 200:
             logger.info(f"[APARTALO] Precio {nombre} actualizado → S/. {precio:.2f}")
             return True
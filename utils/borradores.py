@@ -0,0 +1,247 @@
+"""
+Borradores de conversaciones en curso (compra, gasto, capitalización, compra mixta).
+Cada almacén se usa como el diccionario por usuario que tenían los handlers, pero descarta
+los borradores abandonados después de un TTL y, con el backend "json", los guarda en disco
+en formato compacto para que un reinicio no obligue a repetir el flujo.
+El estado de los ConversationHandler y el user_data se persisten aparte con PicklePersistence
+(crear_persistencia); el mismo barrido descarta el user_data de los usuarios inactivos.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+
+from config import BORRADORES_BACKEND, BORRADORES_TTL, BORRADORES_BARRIDO, CONVERSACIONES_DIR
+from utils.metricas import registrar_gauge
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Segundos que se espera tras un cambio antes de escribir el archivo (agrupa varios cambios)
+_ESPERA_GUARDADO = 2.0
+
+# Todos los almacenes creados, para guardarlos o purgarlos juntos
+_almacenes = []
+
+def _codificar(valor):
+    """Convierte sets a una forma serializable en JSON (el resto ya lo es)"""
+    if isinstance(valor, (set, frozenset)):
+        return {"__set__": list(valor)}
+    raise TypeError(f"Tipo no serializable en borrador: {type(valor).__name__}")
+
+def _decodificar(obj):
+    if len(obj) == 1 and "__set__" in obj:
+        return set(obj["__set__"])
+    return obj
+
+class AlmacenBorradores(MutableMapping):
+    """Diccionario user_id -> datos del borrador, con TTL y persistencia opcional."""
+
+    def __init__(self, nombre, ttl=BORRADORES_TTL, backend=BORRADORES_BACKEND):
+        self.nombre = nombre
+        self.ttl = ttl
+        self.archivo = os.path.join(CONVERSACIONES_DIR, f"{nombre}.json") if backend == "json" else None
+        # user_id -> [último acceso (epoch), datos]
+        self._datos = {}
+        self._lock = threading.RLock()
+        self._timer = None
+        if self.archivo:
+            self._cargar()
+        _almacenes.append(self)
+
+    # ── Interfaz de diccionario ──────────────────────────────────────────────
+    def __getitem__(self, user_id):
+        with self._lock:
+            entrada = self._datos[user_id]
+            entrada[0] = time.time()
+        # Quien lo pide suele modificar el diccionario en el sitio
+        self._programar_guardado()
+        return entrada[1]
+
+    def __setitem__(self, user_id, datos):
+        with self._lock:
+            self._datos[user_id] = [time.time(), datos]
+        self.purgar()
+        self._programar_guardado()
+
+    def __delitem__(self, user_id):
+        with self._lock:
+            del self._datos[user_id]
+        self._programar_guardado()
+
+    def __contains__(self, user_id):
+        with self._lock:
+            return user_id in self._datos
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._datos))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datos)
+
+    # ── TTL ──────────────────────────────────────────────────────────────────
+    def purgar(self):
+        """
+        Descarta los borradores sin actividad durante más de ttl segundos.
+
+        Returns:
+            int: Número de borradores descartados
+        """
+        if self.ttl <= 0:
+            return 0
+        limite = time.time() - self.ttl
+        with self._lock:
+            vencidos = [user_id for user_id, (acceso, _) in self._datos.items() if acceso < limite]
+            for user_id in vencidos:
+                del self._datos[user_id]
+        if vencidos:
+            logger.info("Borradores '%s': descartados %s abandonados", self.nombre, len(vencidos))
+            self._programar_guardado()
+        return len(vencidos)
+
+    # ── Persistencia ─────────────────────────────────────────────────────────
+    def _cargar(self):
+        try:
+            with open(self.archivo) as f:
+                contenido = json.load(f, object_hook=_decodificar)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("No se pudieron cargar los borradores de '%s': %s", self.nombre, e)
+            return
+        # JSON convierte las claves a texto; los user_id de Telegram son enteros
+        self._datos = {int(user_id): entrada for user_id, entrada in contenido.items()}
+        descartados = self.purgar()
+        logger.info("Borradores '%s': %s recuperados (%s vencidos)", self.nombre, len(self._datos), descartados)
+
+    def _programar_guardado(self):
+        if not self.archivo:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(_ESPERA_GUARDADO, self.guardar)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def guardar(self):
+        """Escribe los borradores en disco (escritura atómica, JSON compacto)"""
+        if not self.archivo:
+            return
+        with self._lock:
+            self._timer = None
+            # Nada que guardar ni que vaciar (p. ej. al salir de un proceso que solo importó el módulo)
+            if not self._datos and not os.path.exists(self.archivo):
+                return
+            try:
+                contenido = json.dumps(self._datos, default=_codificar, separators=(",", ":"), ensure_ascii=False)
+            except RuntimeError:
+                # Un handler modificó un borrador mientras se serializaba; se reintenta
+                self._programar_guardado()
+                return
+            except TypeError as e:
+                logger.error("Borradores '%s' no serializables: %s", self.nombre, e)
+                return
+        try:
+            tmp_file = f"{self.archivo}.tmp"
+            with open(tmp_file, "w") as f:
+                f.write(contenido)
+            os.replace(tmp_file, self.archivo)
+        except Exception as e:
+            logger.warning("No se pudieron guardar los borradores de '%s': %s", self.nombre, e)
+
+def guardar_todos():
+    """Escribe en disco todos los almacenes de borradores (al apagar el bot)"""
+    for almacen in _almacenes:
+        almacen.guardar()
+
+atexit.register(guardar_todos)
+
+def purgar_todos():
+    """
+    Descarta los borradores abandonados de todos los almacenes.
+
+    Returns:
+        int: Número total de borradores descartados
+    """
+    return sum(almacen.purgar() for almacen in _almacenes)
+
+def contar_borradores():
+    """
+    Borradores vivos por almacén (gauge).
+
+    Returns:
+        Dict[str, int]: nombre del almacén -> número de borradores
+    """
+    return {almacen.nombre: len(almacen) for almacen in _almacenes}
+
+registrar_gauge("borradores_vivos", "Borradores de conversación en curso por flujo", contar_borradores)
+
+# Clave del user_data con la hora (epoch) del último update del usuario
+_ACTIVIDAD = "_actividad"
+
+async def _marcar_actividad(update, context):
+    """Handler (grupo -1) que anota en el user_data la hora del último update del usuario"""
+    if getattr(update, "effective_user", None) is not None:
+        context.user_data[_ACTIVIDAD] = time.time()
+
+def purgar_user_data(application, ttl=BORRADORES_TTL):
+    """
+    Descarta el user_data de los usuarios sin actividad durante `ttl` segundos
+    (también del archivo de PicklePersistence).
+
+    Args:
+        application: Application de PTB
+        ttl: Segundos de inactividad
+
+    Returns:
+        int: Número de usuarios descartados
+    """
+    limite = time.time() - ttl
+    vencidos = [user_id for user_id, datos in application.user_data.items()
+                if datos.get(_ACTIVIDAD, 0) < limite]
+    for user_id in vencidos:
+        application.drop_user_data(user_id)
+    return len(vencidos)
+
+async def _job_barrido(context):
+    """Callback del JobQueue: purga los borradores y user_data vencidos y registra cuántos quedan"""
+    descartados = purgar_todos()
+    usuarios = purgar_user_data(context.application)
+    vivos = contar_borradores()
+    if descartados or usuarios:
+        logger.info("Barrido de borradores: %s descartados, %s user_data descartados, vivos %s", descartados, usuarios, vivos)
+    else:
+        logger.debug("Barrido de borradores: vivos %s", vivos)
+
+def programar_barrido(job_queue, intervalo=BORRADORES_BARRIDO):
+    """
+    Registra el barrido periódico de borradores abandonados en el JobQueue, y el handler
+    que anota la actividad de cada usuario para poder vencer también su user_data.
+    """
+    from telegram import Update
+    from telegram.ext import TypeHandler
+    job_queue.application.add_handler(TypeHandler(Update, _marcar_actividad), group=-1)
+    job_queue.run_repeating(_job_barrido, interval=intervalo, first=intervalo, name="barrido-borradores")
+    logger.info("Barrido de borradores cada %ss (TTL %ss)", intervalo, BORRADORES_TTL)
+
+def crear_persistencia():
+    """
+    Persistencia de PTB para los estados de los ConversationHandler y user_data (el asistente
+    lo usa entre pasos). chat_data y bot_data no se persisten; el user_data inactivo lo
+    descarta el barrido (purgar_user_data).
+
+    Returns:
+        PicklePersistence: Persistencia en CONVERSACIONES_DIR/conversaciones.pickle
+    """
+    from telegram.ext import PersistenceInput, PicklePersistence
+    return PicklePersistence(
+        filepath=os.path.join(CONVERSACIONES_DIR, "conversaciones.pickle"),
+        store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+        update_interval=30,
+    )
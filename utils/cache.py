@@ -0,0 +1,101 @@
+"""
+Stale-while-revalidate cache for slow upstream values (FX rate, coffee futures).
+Expired values keep being served while a single background refresh runs; if the
+upstream fails the last good value is served and its age is reported.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SWRCache:
+    """Single-value cache with single-flight background refresh. Thread-safe."""
+
+    def __init__(self, loader: Callable[[], Any], ttl: float, name: str = "", retry_after: float = 60):
+        """
+        loader:      returns the fresh value; raising or returning None counts as a failure.
+        ttl:         seconds a value is considered fresh.
+        retry_after: seconds to wait after a failed refresh before trying the upstream again.
+        """
+        self._loader     = loader
+        self._ttl        = ttl
+        self._name       = name or getattr(loader, "__name__", "swr")
+        self._lock       = threading.Lock()
+        self._value      = None
+        self._ts         = 0.0
+        self._refreshing = False
+        self._retry_after = retry_after
+        self._next_retry = 0.0
+        self._done       = threading.Event()
+        self._done.set()
+        self.last_error: Optional[str] = None
+
+    def _load(self):
+        try:
+            value = self._loader()
+            if value is None:
+                raise ValueError("loader returned None")
+            with self._lock:
+                self._value = value
+                self._ts    = time.time()
+                self.last_error = None
+        except Exception as e:
+            with self._lock:
+                self.last_error  = str(e)
+                self._next_retry = time.time() + self._retry_after
+            logger.warning("[CACHE:%s] refresh failed, serving last value: %s", self._name, e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+            self._done.set()
+
+    def _start_refresh(self, background: bool) -> bool:
+        """Begin a refresh unless one is in flight. Caller must hold self._lock."""
+        if self._refreshing:
+            return False
+        self._refreshing = True
+        self._done.clear()
+        if background:
+            threading.Thread(target=self._load, daemon=True, name=f"swr-{self._name}").start()
+        return True
+
+    def get_with_meta(self) -> Tuple[Any, dict]:
+        """Return (value, {"age": seconds or None, "stale": bool}).
+        With no value yet and the upstream backing off after a failure, the value is None
+        and the metadata adds "retry_in" (seconds until the next attempt)."""
+        now = time.time()
+        with self._lock:
+            has_value   = self._value is not None
+            expired     = now - self._ts >= self._ttl
+            backing_off = now < self._next_retry
+            if has_value and expired and not backing_off:
+                self._start_refresh(background=True)
+            load_here = not has_value and not backing_off and self._start_refresh(background=False)
+            wait      = not has_value and not load_here and self._refreshing
+
+        # Nothing to serve yet: first caller loads, concurrent callers wait for it
+        if load_here:
+            self._load()
+        elif wait:
+            self._done.wait(timeout=10)
+
+        with self._lock:
+            value = self._value
+            age   = time.time() - self._ts if value is not None else None
+            meta  = {"age": round(age, 1) if age is not None else None,
+                     "stale": age is not None and age >= self._ttl}
+            if value is None and self._next_retry > time.time():
+                meta["retry_in"] = round(self._next_retry - time.time(), 1)
+        return value, meta
+
+    def get(self) -> Any:
+        return self.get_with_meta()[0]
+
+    def invalidate(self):
+        """Force the next get() to refresh (the old value is still served meanwhile)."""
+        with self._lock:
+            self._ts = 0.0
+            self._next_retry = 0.0
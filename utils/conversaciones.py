@@ -0,0 +1,114 @@
+"""
+ConversationHandler persistente con cierre por inactividad.
+Cada flujo declara dónde guarda su borrador; al vencer conversation_timeout el borrador se
+descarta y se avisa al usuario. PTB no persiste los jobs de timeout, así que tras un
+reinicio las conversaciones restauradas no vencerían nunca: rearmar_timeouts les vuelve
+a programar el timeout completo al arrancar.
+"""
+import datetime
+import logging
+
+from telegram import Chat, Message, ReplyKeyboardRemove, Update, User
+from telegram.ext import ConversationHandler, TypeHandler
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+class ConversacionPersistente(ConversationHandler):
+    """ConversationHandler que cierra las conversaciones inactivas descartando su borrador."""
+
+    def __init__(self, *args, states, borradores=None, claves_user_data=(), comando=None, **kwargs):
+        """
+        Args:
+            states: Estados de la conversación (se les añade ConversationHandler.TIMEOUT)
+            borradores: AlmacenBorradores del flujo, si lo usa
+            claves_user_data: Claves del user_data que forman el borrador, si lo usa
+            comando: Comando para volver a empezar, que se sugiere en el aviso
+        """
+        self.borradores = borradores
+        self.claves_user_data = tuple(claves_user_data)
+        self.comando = comando
+        states = {**states, ConversationHandler.TIMEOUT: [TypeHandler(Update, self._cerrar_por_inactividad)]}
+        super().__init__(*args, states=states, **kwargs)
+
+    async def _cerrar_por_inactividad(self, update, context):
+        """Estado TIMEOUT: descarta el borrador del usuario y le avisa"""
+        user = update.effective_user
+        if user is not None:
+            if self.borradores is not None:
+                self.borradores.pop(user.id, None)
+            if context.user_data is not None:
+                for clave in self.claves_user_data:
+                    context.user_data.pop(clave, None)
+        logger.info("Conversación '%s' de %s cerrada por inactividad", self.name, user.id if user else None)
+
+        chat = update.effective_chat
+        if chat is None:
+            return
+        aviso = "⌛ La operación se canceló por inactividad y no se registró nada."
+        if self.comando:
+            aviso += f"\n\nUsa {self.comando} para empezar de nuevo."
+        try:
+            await context.bot.send_message(chat.id, aviso, reply_markup=ReplyKeyboardRemove())
+        except Exception as e:
+            logger.warning("No se pudo avisar el cierre por inactividad a %s: %s", chat.id, e)
+
+    def _update_de_clave(self, clave):
+        """
+        Update mínimo para una conversación restaurada: el timeout de PTB lo necesita para
+        construir el contexto y para los handlers del estado TIMEOUT.
+
+        Returns:
+            Optional[Update]: None si la clave no es (chat_id, user_id)
+        """
+        if self.per_message or not (self.per_chat and self.per_user) or len(clave) != 2:
+            return None
+        chat_id, user_id = clave
+        tipo = Chat.PRIVATE if chat_id == user_id else Chat.GROUP
+        return Update(0, message=Message(
+            message_id=0,
+            date=datetime.datetime.now(datetime.timezone.utc),
+            chat=Chat(id=chat_id, type=tipo),
+            from_user=User(id=user_id, first_name="", is_bot=False),
+        ))
+
+    def rearmar_timeouts(self, application):
+        """
+        Programa el timeout de las conversaciones restauradas desde la persistencia que
+        no tienen uno (las que ya recibieron un update desde el arranque sí lo tienen).
+
+        Args:
+            application: Application de PTB, ya inicializada
+
+        Returns:
+            int: Número de conversaciones con el timeout rearmado
+        """
+        if not self.conversation_timeout or application.job_queue is None:
+            return 0
+        rearmadas = 0
+        for clave, estado in list(self._conversations.items()):
+            if clave in self.timeout_jobs or estado == self.END:
+                continue
+            update = self._update_de_clave(clave)
+            if update is None:
+                continue
+            context = application.context_types.context.from_update(update, application)
+            self._schedule_job(estado, application, update, context, clave)
+            rearmadas += 1
+        return rearmadas
+
+async def _job_rearmar(context):
+    """Callback del JobQueue (al arrancar): rearma los timeouts de todas las conversaciones"""
+    total = 0
+    for handlers in context.application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversacionPersistente):
+                total += handler.rearmar_timeouts(context.application)
+    logger.info("Timeouts rearmados para %s conversaciones restauradas", total)
+
+def programar_rearme(job_queue):
+    """
+    Rearma los timeouts de las conversaciones restauradas en cuanto arranca el JobQueue
+    (después de que la Application cargó la persistencia).
+    """
+    job_queue.run_once(_job_rearmar, when=0, name="rearmar-timeouts")
@@ -4,14 +4,18 @@ Permite subir archivos al Drive asociado a la cuenta de servicio.
 """
 
 import logging
+import hashlib
 import io
+import json
 import os
+import threading
 import traceback
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseUpload
-from google.oauth2 import service_account
-from config import GOOGLE_CREDENTIALS
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from utils.metricas import ejecutar, medir
+from utils.sheets.locks import bloquear_recursos
+from utils.sheets.service import build_service
+from config import DATA_DIR
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -19,6 +23,30 @@ logger = logging.getLogger(__name__)
 # Ámbitos (scopes) necesarios para Google Drive
 SCOPES = ['https://www.googleapis.com/auth/drive.file', 'https://www.googleapis.com/auth/spreadsheets']
 
+# Nombre de la carpeta principal y subcarpetas de evidencias con su variable de entorno
+ROOT_FOLDER_NAME = "CafeBotEvidencias"
+SUBCARPETAS = {
+    "Compras": "DRIVE_EVIDENCIAS_COMPRAS_ID",
+    "Ventas": "DRIVE_EVIDENCIAS_VENTAS_ID",
+    "Adelantos": "DRIVE_EVIDENCIAS_ADELANTOS_ID",
+    "Gastos": "DRIVE_EVIDENCIAS_GASTOS_ID",
+    "Capitalizacion": "DRIVE_EVIDENCIAS_CAPITALIZACION_ID",
+}
+
+# Caché local de IDs de carpetas para no volver a consultarlas tras un reinicio
+FOLDER_CACHE_FILE = os.path.join(DATA_DIR, "drive_folders.json")
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Índice local "sha256:carpeta" -> archivo ya subido a esa carpeta, para no resubir duplicados
+HASH_INDEX_FILE = os.path.join(DATA_DIR, "drive_hashes.json")
+_hash_index = None
+_hash_index_lock = threading.Lock()
+
+# Cliente de Drive compartido por todo el proceso
+_drive_service = None
+_drive_service_lock = threading.Lock()
+
 # IDs de las carpetas en Google Drive donde se guardarán las evidencias de pago
 # Estos valores deben ser configurados según tu estructura de Drive
 from config import (
@@ -30,86 +58,225 @@ from config import (
     DRIVE_EVIDENCIAS_CAPITALIZACION_ID
 )
 
-# Log de configuración al importar el módulo
-logger.info("=== MÓDULO DRIVE.PY INICIALIZADO ===")
-logger.info(f"DRIVE_EVIDENCIAS_ROOT_ID: {DRIVE_EVIDENCIAS_ROOT_ID or 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_COMPRAS_ID: {DRIVE_EVIDENCIAS_COMPRAS_ID or 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_VENTAS_ID: {DRIVE_EVIDENCIAS_VENTAS_ID or 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_ADELANTOS_ID: {DRIVE_EVIDENCIAS_ADELANTOS_ID or 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_GASTOS_ID: {DRIVE_EVIDENCIAS_GASTOS_ID or 'No configurado'}")
-logger.info(f"DRIVE_EVIDENCIAS_CAPITALIZACION_ID: {DRIVE_EVIDENCIAS_CAPITALIZACION_ID or 'No configurado'}")
+def _log_config_drive():
+    """Registra las carpetas configuradas; se llama al construir el cliente, no al importar"""
+    logger.info("=== MÓDULO DRIVE.PY INICIALIZADO ===")
+    logger.info("DRIVE_EVIDENCIAS_ROOT_ID: %s", DRIVE_EVIDENCIAS_ROOT_ID or 'No configurado')
+    logger.info("DRIVE_EVIDENCIAS_COMPRAS_ID: %s", DRIVE_EVIDENCIAS_COMPRAS_ID or 'No configurado')
+    logger.info("DRIVE_EVIDENCIAS_VENTAS_ID: %s", DRIVE_EVIDENCIAS_VENTAS_ID or 'No configurado')
+    logger.info("DRIVE_EVIDENCIAS_ADELANTOS_ID: %s", DRIVE_EVIDENCIAS_ADELANTOS_ID or 'No configurado')
+    logger.info("DRIVE_EVIDENCIAS_GASTOS_ID: %s", DRIVE_EVIDENCIAS_GASTOS_ID or 'No configurado')
+    logger.info("DRIVE_EVIDENCIAS_CAPITALIZACION_ID: %s", DRIVE_EVIDENCIAS_CAPITALIZACION_ID or 'No configurado')
 
 def get_drive_service():
-    """Inicializa y retorna el servicio de Google Drive"""
-    try:
-        logger.info("Inicializando servicio de Google Drive...")
-        # Verificar que las credenciales estén configuradas
-        if not GOOGLE_CREDENTIALS:
-            logger.error("Credenciales de Google no configuradas")
-            return None
+    """Retorna el servicio de Google Drive, construyéndolo una sola vez por proceso"""
+    global _drive_service
+
+    if _drive_service is not None:
+        return _drive_service
+
+    with _drive_service_lock:
+        if _drive_service is None:
+            _log_config_drive()
+            try:
+                logger.info("Inicializando servicio de Google Drive...")
+                _drive_service = build_service('drive', 'v3', SCOPES)
+                logger.info("Servicio de Google Drive inicializado correctamente")
+            except Exception as e:
+                logger.error("Error al inicializar servicio de Drive: %s", e)
+                logger.error(traceback.format_exc())
+                return None
+    return _drive_service
+
+def calcular_hash(stream, chunk_size=64 * 1024):
+    """
+    Calcula el SHA-256 del contenido de un archivo abierto y lo deja posicionado al inicio
+    
+    Args:
+        stream: Objeto tipo archivo
+        chunk_size: Tamaño de lectura en bytes
+        
+    Returns:
+        str: Hash en hexadecimal
+    """
+    sha256 = hashlib.sha256()
+    stream.seek(0)
+    for bloque in iter(lambda: stream.read(chunk_size), b""):
+        sha256.update(bloque)
+    stream.seek(0)
+    return sha256.hexdigest()
 
-        # Cargar credenciales desde la variable de entorno
+def _clave_hash(content_hash, folder_id):
+    """Clave del índice: el mismo contenido en otra carpeta es otra evidencia"""
+    return f"{content_hash}:{folder_id or ''}"
+
+def _get_hash_index():
+    """Carga (una vez) el índice de hashes desde disco; llamar con _hash_index_lock tomado"""
+    global _hash_index
+    if _hash_index is None:
         try:
-            info = GOOGLE_CREDENTIALS
-            # Si las credenciales son una ruta de archivo
-            if os.path.exists(info):
-                logger.info(f"Cargando credenciales desde archivo: {info}")
-                credentials = service_account.Credentials.from_service_account_file(info, scopes=SCOPES)
-            # Si las credenciales son un JSON en string
-            else:
-                logger.info("Cargando credenciales desde JSON en variable de entorno")
-                import json
-                service_account_info = json.loads(info)
-                credentials = service_account.Credentials.from_service_account_info(
-                    service_account_info, scopes=SCOPES)
-            
-            logger.info("Credenciales cargadas correctamente")
+            with open(HASH_INDEX_FILE, 'r') as f:
+                # Las entradas antiguas (solo el hash, sin carpeta) se descartan
+                _hash_index = {k: v for k, v in json.load(f).items() if ':' in k}
+        except FileNotFoundError:
+            _hash_index = {}
         except Exception as e:
-            logger.error(f"Error al cargar credenciales: {e}")
-            logger.error(traceback.format_exc())
-            return None
+            logger.warning("No se pudo leer el índice de hashes de Drive: %s", e)
+            _hash_index = {}
+    return _hash_index
+
+def _guardar_hash_index(index):
+    """Escribe el índice de forma atómica; llamar con _hash_index_lock tomado"""
+    try:
+        tmp_file = f"{HASH_INDEX_FILE}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_file, HASH_INDEX_FILE)
+    except Exception as e:
+        logger.warning("No se pudo guardar el índice de hashes de Drive: %s", e)
 
-        # Construir servicio de Drive
-        service = build('drive', 'v3', credentials=credentials)
-        logger.info("Servicio de Google Drive inicializado correctamente")
-        return service
+def _archivo_sigue_en_drive(file_id):
+    """
+    Comprueba que un archivo del índice sigue existiendo (y no está en la papelera)
 
+    Returns:
+        bool: False solo si Drive confirma que ya no está; ante otros errores se asume que sigue
+    """
+    from googleapiclient.errors import HttpError
+    try:
+        service = get_drive_service()
+        if not service:
+            return True
+        file = ejecutar(service.files().get(fileId=file_id, fields='id, trashed'))
+        return not file.get('trashed', False)
+    except HttpError as e:
+        if e.resp.status == 404:
+            return False
+        logger.warning("No se pudo verificar el archivo %s en Drive: %s", file_id, e)
+        return True
     except Exception as e:
-        logger.error(f"Error al inicializar servicio de Drive: {e}")
-        logger.error(traceback.format_exc())
-        return None
+        logger.warning("No se pudo verificar el archivo %s en Drive: %s", file_id, e)
+        return True
 
-def upload_file_to_drive(file_bytes, file_name, mime_type="image/jpeg", folder_id=None):
+def carpeta_destino(folder_id=None):
     """
-    Sube un archivo a Google Drive
+    Carpeta donde se sube un archivo: la indicada o, si no hay, la raíz de evidencias
+
+    Returns:
+        str: ID de la carpeta o None
+    """
+    return folder_id or DRIVE_EVIDENCIAS_ROOT_ID or None
+
+@contextmanager
+def reservar_hash(content_hash, folder_id):
+    """
+    Busca un archivo ya subido con el mismo contenido a la misma carpeta y, mientras dura
+    el bloque, impide que otra subida del mismo contenido a esa carpeta haga lo mismo
+    (así dos envíos simultáneos de la misma foto no la suben dos veces).
+    Si Drive indica que el archivo del índice ya no existe, la entrada se descarta.
+
+        with reservar_hash(content_hash, folder_id) as existente:
+            if not existente:
+                file = upload_stream_to_drive(..., deduplicar=False)
+                registrar_hash(content_hash, folder_id, file)
+
+    Args:
+        content_hash: SHA-256 del contenido
+        folder_id: Carpeta destino (ya resuelta con carpeta_destino)
+
+    Returns:
+        dict: Información del archivo en Drive o None si hay que subirlo
+    """
+    clave = _clave_hash(content_hash, folder_id)
+    with bloquear_recursos(f"drive_hash:{clave}"):
+        with _hash_index_lock:
+            archivo = _get_hash_index().get(clave)
+            archivo = dict(archivo) if archivo else None
+        if archivo and not _archivo_sigue_en_drive(archivo.get('id')):
+            logger.info("El archivo %s del índice ya no está en Drive; se subirá de nuevo", archivo.get('id'))
+            with _hash_index_lock:
+                index = _get_hash_index()
+                index.pop(clave, None)
+                _guardar_hash_index(index)
+            archivo = None
+        yield archivo
+
+def registrar_hash(content_hash, folder_id, file):
+    """
+    Guarda en el índice local el archivo subido para un contenido y carpeta
+
+    Args:
+        content_hash: SHA-256 del contenido
+        folder_id: Carpeta donde se subió (ya resuelta con carpeta_destino)
+        file: Respuesta de Drive con id, name y webViewLink
+    """
+    with _hash_index_lock:
+        index = _get_hash_index()
+        index[_clave_hash(content_hash, folder_id)] = {
+            'id': file.get('id'),
+            'name': file.get('name'),
+            'webViewLink': file.get('webViewLink')
+        }
+        _guardar_hash_index(index)
+
+# Tamaño de cada fragmento en subidas reanudables (debe ser múltiplo de 256 KB)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def upload_stream_to_drive(stream, file_name, mime_type="image/jpeg", folder_id=None, chunk_size=UPLOAD_CHUNK_SIZE, progress_callback=None, deduplicar=True, content_hash=None):
+    """
+    Sube a Google Drive el contenido de un archivo abierto, en fragmentos sobre una sesión reanudable.
+    Si el mismo contenido ya se subió antes, devuelve ese archivo (con 'duplicado': True) sin volver a subirlo.
     
     Args:
-        file_bytes: Bytes del archivo a subir
+        stream: Objeto tipo archivo (posicionado al inicio) con el contenido
         file_name: Nombre que tendrá el archivo en Drive
         mime_type: Tipo MIME del archivo
         folder_id: ID de la carpeta donde se guardará (opcional)
+        chunk_size: Tamaño de cada fragmento en bytes
+        progress_callback: Función opcional llamada con (bytes_enviados, bytes_totales) tras cada fragmento
+        deduplicar: Si se consulta/actualiza el índice de hashes de contenido (por carpeta)
+        content_hash: SHA-256 ya calculado (ej. del original antes de comprimir); si es None se calcula
     
     Returns:
         dict: Información del archivo subido o None si hay error
     """
+    folder_id = carpeta_destino(folder_id)
+    if not deduplicar:
+        return _subir_stream(stream, file_name, mime_type, folder_id, chunk_size, progress_callback)
+    try:
+        if content_hash is None:
+            content_hash = calcular_hash(stream)
+        with reservar_hash(content_hash, folder_id) as existente:
+            if existente:
+                logger.info("'%s' ya fue subido como %s (ID: %s), no se vuelve a subir", file_name, existente.get('name'), existente.get('id'))
+                existente['duplicado'] = True
+                return existente
+            file = _subir_stream(stream, file_name, mime_type, folder_id, chunk_size, progress_callback)
+            if file:
+                registrar_hash(content_hash, folder_id, file)
+            return file
+    except Exception as e:
+        logger.error("Error al subir archivo a Drive: %s", e)
+        logger.error(traceback.format_exc())
+        return None
+
+def _subir_stream(stream, file_name, mime_type, folder_id, chunk_size, progress_callback):
+    """Subida reanudable por fragmentos, sin consultar el índice de hashes"""
     try:
-        logger.info(f"=== SUBIENDO ARCHIVO A DRIVE: {file_name} ===")
-        logger.info(f"Tipo MIME: {mime_type}")
-        logger.info(f"Tamaño del archivo: {len(file_bytes)} bytes")
-        logger.info(f"Carpeta especificada: {folder_id or 'No especificada'}")
+        from googleapiclient.errors import HttpError
+        from googleapiclient.http import MediaIoBaseUpload
+        
+        logger.info("=== SUBIENDO ARCHIVO A DRIVE: %s ===", file_name)
+        logger.info("Tipo MIME: %s", mime_type)
+        logger.info("Carpeta especificada: %s", folder_id or 'No especificada')
         
         service = get_drive_service()
         if not service:
             logger.error("No se pudo obtener el servicio de Drive")
             return None
         
-        # Si no se especifica folder_id, usar la carpeta de evidencias raíz predeterminada
         if not folder_id:
-            if DRIVE_EVIDENCIAS_ROOT_ID:
-                folder_id = DRIVE_EVIDENCIAS_ROOT_ID
-                logger.info(f"Usando carpeta raíz de evidencias: {folder_id}")
-            else:
-                logger.warning("DRIVE_EVIDENCIAS_ROOT_ID no está configurado, el archivo se subirá sin carpeta específica")
+            logger.warning("DRIVE_EVIDENCIAS_ROOT_ID no está configurado, el archivo se subirá sin carpeta específica")
         
         # Preparar metadatos del archivo
         file_metadata = {'name': file_name}
@@ -117,36 +284,60 @@ def upload_file_to_drive(file_bytes, file_name, mime_type="image/jpeg", folder_i
         # Si se especificó una carpeta, añadirla a los metadatos
         if folder_id:
             file_metadata['parents'] = [folder_id]
-            logger.info(f"Archivo será guardado en carpeta con ID: {folder_id}")
-        else:
-            logger.warning("El archivo se subirá sin especificar carpeta")
         
-        # Preparar el contenido del archivo
-        media = MediaIoBaseUpload(io.BytesIO(file_bytes), mimetype=mime_type, resumable=True)
+        # Preparar la subida reanudable por fragmentos
+        media = MediaIoBaseUpload(stream, mimetype=mime_type, chunksize=chunk_size, resumable=True)
+        total = media.size()
+        logger.info("Tamaño del archivo: %s bytes", total)
         
-        # Subir el archivo
-        logger.info("Iniciando subida a Google Drive...")
-        file = service.files().create(
+        request = service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id, name, webViewLink'
-        ).execute()
+        )
+        
+        # Enviar fragmento a fragmento
+        file = None
+        with medir("drive.files.upload", tipo=mime_type):
+            while file is None:
+                status, file = request.next_chunk()
+                if status and progress_callback:
+                    progress_callback(status.resumable_progress, total)
+        if progress_callback:
+            progress_callback(total, total)
+        
+        logger.info("¡Archivo subido exitosamente a Drive!")
+        logger.info("Nombre: %s", file.get('name'))
+        logger.info("ID: %s", file.get('id'))
+        logger.info("Enlace: %s", file.get('webViewLink'))
         
-        logger.info(f"¡Archivo subido exitosamente a Drive!")
-        logger.info(f"Nombre: {file.get('name')}")
-        logger.info(f"ID: {file.get('id')}")
-        logger.info(f"Enlace: {file.get('webViewLink')}")
+        file['duplicado'] = False
         return file
     
     except HttpError as e:
-        logger.error(f"Error HTTP al subir archivo a Drive: {e}")
+        logger.error("Error HTTP al subir archivo a Drive: %s", e)
         logger.error(traceback.format_exc())
         return None
     except Exception as e:
-        logger.error(f"Error al subir archivo a Drive: {e}")
+        logger.error("Error al subir archivo a Drive: %s", e)
         logger.error(traceback.format_exc())
         return None
 
+def upload_file_to_drive(file_bytes, file_name, mime_type="image/jpeg", folder_id=None):
+    """
+    Sube un archivo a Google Drive
+    
+    Args:
+        file_bytes: Bytes del archivo a subir
+        file_name: Nombre que tendrá el archivo en Drive
+        mime_type: Tipo MIME del archivo
+        folder_id: ID de la carpeta donde se guardará (opcional)
+    
+    Returns:
+        dict: Información del archivo subido o None si hay error
+    """
+    return upload_stream_to_drive(io.BytesIO(file_bytes), file_name, mime_type, folder_id)
+
 def create_folder_if_not_exists(folder_name, parent_folder_id=None):
     """
     Crea una carpeta en Google Drive si no existe
@@ -159,9 +350,10 @@ def create_folder_if_not_exists(folder_name, parent_folder_id=None):
         str: ID de la carpeta creada o encontrada, None si hay error
     """
     try:
-        logger.info(f"Buscando o creando carpeta '{folder_name}'")
+        from googleapiclient.errors import HttpError
+        logger.info("Buscando o creando carpeta '%s'", folder_name)
         if parent_folder_id:
-            logger.info(f"Carpeta padre especificada: {parent_folder_id}")
+            logger.info("Carpeta padre especificada: %s", parent_folder_id)
         
         service = get_drive_service()
         if not service:
@@ -173,22 +365,22 @@ def create_folder_if_not_exists(folder_name, parent_folder_id=None):
         if parent_folder_id:
             query += f" and '{parent_folder_id}' in parents"
         
-        logger.info(f"Ejecutando búsqueda con query: {query}")
-        results = service.files().list(
+        logger.info("Ejecutando búsqueda con query: %s", query)
+        results = ejecutar(service.files().list(
             q=query,
             spaces='drive',
             fields='files(id, name)'
-        ).execute()
+        ))
         
         items = results.get('files', [])
         
         # Si la carpeta ya existe, devolver su ID
         if items:
-            logger.info(f"Carpeta existente encontrada: {items[0].get('name')} (ID: {items[0].get('id')})")
+            logger.info("Carpeta existente encontrada: %s (ID: %s)", items[0].get('name'), items[0].get('id'))
             return items[0].get('id')
         
         # Si la carpeta no existe, crearla
-        logger.info(f"Carpeta no encontrada. Creando carpeta '{folder_name}'...")
+        logger.info("Carpeta no encontrada. Creando carpeta '%s'...", folder_name)
         folder_metadata = {
             'name': folder_name,
             'mimeType': 'application/vnd.google-apps.folder'
@@ -197,26 +389,108 @@ def create_folder_if_not_exists(folder_name, parent_folder_id=None):
         if parent_folder_id:
             folder_metadata['parents'] = [parent_folder_id]
         
-        folder = service.files().create(
+        folder = ejecutar(service.files().create(
             body=folder_metadata,
             fields='id, name'
-        ).execute()
+        ))
         
-        logger.info(f"Carpeta creada exitosamente: {folder.get('name')} (ID: {folder.get('id')})")
+        logger.info("Carpeta creada exitosamente: %s (ID: %s)", folder.get('name'), folder.get('id'))
         return folder.get('id')
     
     except HttpError as e:
-        logger.error(f"Error HTTP al crear carpeta en Drive: {e}")
+        logger.error("Error HTTP al crear carpeta en Drive: %s", e)
         logger.error(traceback.format_exc())
         return None
     except Exception as e:
-        logger.error(f"Error al crear carpeta en Drive: {e}")
+        logger.error("Error al crear carpeta en Drive: %s", e)
         logger.error(traceback.format_exc())
         return None
 
+def load_folder_cache():
+    """
+    Lee la caché local de IDs de carpetas
+    
+    Returns:
+        dict: {"root_id": str, "folders": {nombre: id}} o dict vacío si no existe
+    """
+    try:
+        with open(FOLDER_CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning("No se pudo leer la caché de carpetas de Drive: %s", e)
+        return {}
+
+def save_folder_cache(cache):
+    """
+    Guarda la caché local de IDs de carpetas (escritura atómica)
+    
+    Args:
+        cache: Diccionario con root_id y folders
+    """
+    try:
+        tmp_file = f"{FOLDER_CACHE_FILE}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, FOLDER_CACHE_FILE)
+    except Exception as e:
+        logger.warning("No se pudo guardar la caché de carpetas de Drive: %s", e)
+
+def list_child_folders(parent_folder_id):
+    """
+    Obtiene todas las subcarpetas de una carpeta con una sola consulta (paginada)
+    
+    Args:
+        parent_folder_id: ID de la carpeta padre
+        
+    Returns:
+        dict: Nombre de carpeta -> ID
+    """
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("No se pudo obtener el servicio de Drive")
+    
+    query = f"'{parent_folder_id}' in parents and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false"
+    folders = {}
+    page_token = None
+    while True:
+        results = ejecutar(service.files().list(
+            q=query,
+            spaces='drive',
+            fields='nextPageToken, files(id, name)',
+            pageSize=100,
+            pageToken=page_token
+        ))
+        for item in results.get('files', []):
+            folders.setdefault(item['name'], item['id'])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return folders
+
+def create_folder(folder_name, parent_folder_id):
+    """
+    Crea una carpeta sin buscarla antes (usar cuando ya se sabe que no existe)
+    
+    Args:
+        folder_name: Nombre de la carpeta
+        parent_folder_id: ID de la carpeta padre
+        
+    Returns:
+        str: ID de la carpeta creada
+    """
+    folder = ejecutar(get_drive_service().files().create(
+        body={'name': folder_name, 'mimeType': FOLDER_MIME_TYPE, 'parents': [parent_folder_id]},
+        fields='id, name'
+    ))
+    logger.info("Carpeta creada exitosamente: %s (ID: %s)", folder.get('name'), folder.get('id'))
+    return folder.get('id')
+
 def setup_drive_folders():
     """
-    Configura la estructura de carpetas necesaria en Google Drive
+    Configura la estructura de carpetas necesaria en Google Drive.
+    Usa la caché local si está completa; si no, lista las subcarpetas de la raíz
+    con una sola consulta y crea en paralelo las que falten.
     
     Returns:
         bool: True si la configuración fue exitosa, False en caso contrario
@@ -224,59 +498,55 @@ def setup_drive_folders():
     try:
         logger.info("=== CONFIGURANDO ESTRUCTURA DE CARPETAS EN GOOGLE DRIVE ===")
         
-        # Nombre de la carpeta principal
-        root_folder_name = "CafeBotEvidencias"
-        
-        # Crear carpeta principal si no existe
-        logger.info(f"Verificando carpeta principal: {root_folder_name}")
-        root_id = create_folder_if_not_exists(root_folder_name)
-        if not root_id:
-            logger.error("No se pudo crear la carpeta principal en Drive")
-            return False
-        
-        # Crear subcarpetas para compras y ventas
-        logger.info("Verificando subcarpeta para Compras")
-        compras_id = create_folder_if_not_exists("Compras", root_id)
-        
-        logger.info("Verificando subcarpeta para Ventas")
-        ventas_id = create_folder_if_not_exists("Ventas", root_id)
-        
-        # Crear subcarpetas para adelantos, gastos y capitalización
-        logger.info("Verificando subcarpeta para Adelantos")
-        adelantos_id = create_folder_if_not_exists("Adelantos", root_id)
-        
-        logger.info("Verificando subcarpeta para Gastos")
-        gastos_id = create_folder_if_not_exists("Gastos", root_id)
+        cache = load_folder_cache()
+        root_id = cache.get('root_id')
+        folders = dict(cache.get('folders', {}))
         
-        logger.info("Verificando subcarpeta para Capitalización")
-        capitalizacion_id = create_folder_if_not_exists("Capitalizacion", root_id)
-        
-        # Verificar que todas las carpetas se crearon correctamente
-        if not (compras_id and ventas_id and adelantos_id and gastos_id and capitalizacion_id):
-            logger.error("No se pudieron crear todas las subcarpetas en Drive")
-            return False
+        if root_id and all(folders.get(nombre) for nombre in SUBCARPETAS):
+            logger.info("Usando IDs de carpetas desde la caché local")
+        else:
+            # Crear carpeta principal si no existe
+            if not root_id:
+                logger.info("Verificando carpeta principal: %s", ROOT_FOLDER_NAME)
+                root_id = create_folder_if_not_exists(ROOT_FOLDER_NAME)
+                if not root_id:
+                    logger.error("No se pudo crear la carpeta principal en Drive")
+                    return False
+            
+            # Una sola consulta para todas las subcarpetas existentes
+            existentes = list_child_folders(root_id)
+            folders = {nombre: existentes[nombre] for nombre in SUBCARPETAS if nombre in existentes}
+            faltantes = [nombre for nombre in SUBCARPETAS if nombre not in folders]
+            
+            # Crear las subcarpetas faltantes en paralelo
+            if faltantes:
+                logger.info("Creando subcarpetas: %s", faltantes)
+                with ThreadPoolExecutor(max_workers=len(faltantes)) as executor:
+                    creadas = executor.map(lambda nombre: create_folder(nombre, root_id), faltantes)
+                    folders.update(zip(faltantes, creadas))
+            
+            # Verificar que todas las carpetas se crearon correctamente
+            if not all(folders.get(nombre) for nombre in SUBCARPETAS):
+                logger.error("No se pudieron crear todas las subcarpetas en Drive")
+                return False
+            
+            save_folder_cache({'root_id': root_id, 'folders': folders})
         
         # Guardar los IDs de las carpetas en variables de entorno para uso futuro
         from config import update_env_var
         
         update_env_var("DRIVE_EVIDENCIAS_ROOT_ID", root_id)
-        update_env_var("DRIVE_EVIDENCIAS_COMPRAS_ID", compras_id)
-        update_env_var("DRIVE_EVIDENCIAS_VENTAS_ID", ventas_id)
-        update_env_var("DRIVE_EVIDENCIAS_ADELANTOS_ID", adelantos_id)
-        update_env_var("DRIVE_EVIDENCIAS_GASTOS_ID", gastos_id)
-        update_env_var("DRIVE_EVIDENCIAS_CAPITALIZACION_ID", capitalizacion_id)
+        for nombre, env_var in SUBCARPETAS.items():
+            update_env_var(env_var, folders[nombre])
         
         logger.info("=== ESTRUCTURA DE CARPETAS EN DRIVE CONFIGURADA CORRECTAMENTE ===")
-        logger.info(f"Carpeta principal: {root_folder_name} (ID: {root_id})")
-        logger.info(f"Subcarpeta Compras ID: {compras_id}")
-        logger.info(f"Subcarpeta Ventas ID: {ventas_id}")
-        logger.info(f"Subcarpeta Adelantos ID: {adelantos_id}")
-        logger.info(f"Subcarpeta Gastos ID: {gastos_id}")
-        logger.info(f"Subcarpeta Capitalización ID: {capitalizacion_id}")
+        logger.info("Carpeta principal: %s (ID: %s)", ROOT_FOLDER_NAME, root_id)
+        for nombre in SUBCARPETAS:
+            logger.info("Subcarpeta %s ID: %s", nombre, folders[nombre])
         return True
     
     except Exception as e:
-        logger.error(f"Error al configurar estructura de carpetas en Drive: {e}")
+        logger.error("Error al configurar estructura de carpetas en Drive: %s", e)
         logger.error(traceback.format_exc())
         return False
 
@@ -291,21 +561,21 @@ def get_file_link(file_id):
         str: URL para ver el archivo, None si hay error
     """
     try:
-        logger.info(f"Obteniendo enlace para archivo con ID: {file_id}")
+        logger.info("Obteniendo enlace para archivo con ID: %s", file_id)
         service = get_drive_service()
         if not service:
             return None
         
-        file = service.files().get(
+        file = ejecutar(service.files().get(
             fileId=file_id,
             fields='webViewLink'
-        ).execute()
+        ))
         
         link = file.get('webViewLink')
-        logger.info(f"Enlace obtenido: {link}")
+        logger.info("Enlace obtenido: %s", link)
         return link
     
     except Exception as e:
-        logger.error(f"Error al obtener enlace de archivo en Drive: {e}")
+        logger.error("Error al obtener enlace de archivo en Drive: %s", e)
         logger.error(traceback.format_exc())
         return None
\ No newline at end of file
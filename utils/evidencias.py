@@ -0,0 +1,389 @@
+"""
+Pipeline de subida de evidencias (fotos y documentos) a Google Drive.
+Descarga el archivo de Telegram a un buffer temporal, opcionalmente recomprime las
+fotos JPEG y lo sube en fragmentos sobre una sesión reanudable desde un pool de hilos,
+sin bloquear el event loop del bot.
+
+Con encolar_evidencia el archivo se guarda primero en UPLOADS_FOLDER y un uploader en
+segundo plano lo sube después; los pendientes se retoman al reiniciar el proceso.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (
+    DRIVE_ENABLED, EVIDENCIAS_WORKERS, EVIDENCIAS_COMPRIMIR, EVIDENCIAS_MAX_LADO, EVIDENCIAS_CALIDAD_JPEG,
+    EVIDENCIAS_MAX_INTENTOS, UPLOADS_FOLDER
+)
+from utils.drive import upload_stream_to_drive, calcular_hash, carpeta_destino, reservar_hash, registrar_hash
+from utils.metricas import registrar_gauge
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Tamaño a partir del cual el buffer temporal pasa de memoria a disco
+SPOOL_MAX_BYTES = 2 * 1024 * 1024
+
+# Pool de hilos para descargas/compresión/subidas (se crea con la primera subida)
+_executor = None
+_executor_lock = threading.Lock()
+
+# Métricas acumuladas del pipeline
+_estadisticas = {
+    "subidas": 0,
+    "errores": 0,
+    "bytes_originales": 0,
+    "bytes_subidos": 0,
+    "segundos_subida": 0.0,
+    "duplicados": 0,
+}
+_estadisticas_lock = threading.Lock()
+
+def _obtener_executor():
+    """Devuelve el pool de hilos de subida, creándolo la primera vez que se usa"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EVIDENCIAS_WORKERS, thread_name_prefix="evidencias")
+        return _executor
+
+def _registrar(**valores):
+    """Suma valores a las métricas acumuladas"""
+    with _estadisticas_lock:
+        for clave, valor in valores.items():
+            _estadisticas[clave] += valor
+
+def get_estadisticas():
+    """
+    Devuelve las métricas acumuladas del pipeline
+
+    Returns:
+        dict: Contadores, bytes y throughput medio de subida (bytes/s)
+    """
+    with _estadisticas_lock:
+        estadisticas = dict(_estadisticas)
+    segundos = estadisticas["segundos_subida"]
+    estadisticas["throughput_bps"] = estadisticas["bytes_subidos"] / segundos if segundos > 0 else 0.0
+    return estadisticas
+
+registrar_gauge("evidencias", "Contadores, bytes y throughput del pipeline de evidencias", get_estadisticas)
+
+def _tamano(archivo):
+    """Tamaño en bytes de un archivo abierto, conservando la posición actual"""
+    posicion = archivo.tell()
+    archivo.seek(0, 2)
+    tamano = archivo.tell()
+    archivo.seek(posicion)
+    return tamano
+
+def comprimir_jpeg(archivo, max_lado=EVIDENCIAS_MAX_LADO, calidad=EVIDENCIAS_CALIDAD_JPEG):
+    """
+    Redimensiona y recomprime una foto JPEG si con eso se reduce su tamaño
+
+    Args:
+        archivo: Objeto tipo archivo con la imagen (posicionado al inicio)
+        max_lado: Lado máximo en píxeles de la imagen resultante
+        calidad: Calidad JPEG (1-95)
+
+    Returns:
+        Objeto tipo archivo con la imagen a subir (el original si no se pudo o no convenía comprimir)
+    """
+    # Pillow es opcional (y se importa solo al comprimir): sin él las fotos se suben tal como llegan
+    try:
+        from PIL import Image
+    except ImportError:
+        return archivo
+
+    try:
+        tamano_original = _tamano(archivo)
+        with Image.open(archivo) as imagen:
+            imagen = imagen.convert("RGB")
+            imagen.thumbnail((max_lado, max_lado))
+            salida = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+            imagen.save(salida, format="JPEG", quality=calidad, optimize=True)
+
+        if _tamano(salida) >= tamano_original:
+            salida.close()
+            archivo.seek(0)
+            return archivo
+
+        logger.info("Imagen recomprimida: %s -> %s bytes", tamano_original, _tamano(salida))
+        salida.seek(0)
+        return salida
+    except Exception as e:
+        logger.warning("No se pudo recomprimir la imagen, se sube la original: %s", e)
+        archivo.seek(0)
+        return archivo
+
+def _procesar_y_subir(archivo, file_name, mime_type, folder_id, comprimir, progreso):
+    """Comprime (si corresponde) y sube el archivo; se ejecuta en el pool de hilos"""
+    a_subir = archivo
+    try:
+        tamano_original = _tamano(archivo)
+        folder_id = carpeta_destino(folder_id)
+        # Hash del original, para detectar reenvíos de la misma foto antes de comprimir
+        content_hash = calcular_hash(archivo)
+        with reservar_hash(content_hash, folder_id) as existente:
+            if existente:
+                _registrar(duplicados=1)
+                logger.info("Evidencia '%s' repetida, se enlaza %s sin volver a subir", file_name, existente.get('id'))
+                existente['duplicado'] = True
+                return existente
+
+            if comprimir and mime_type == "image/jpeg":
+                a_subir = comprimir_jpeg(archivo)
+            tamano_subida = _tamano(a_subir)
+
+            inicio = time.monotonic()
+            resultado = upload_stream_to_drive(
+                a_subir, file_name, mime_type, folder_id, progress_callback=progreso, deduplicar=False
+            )
+            duracion = time.monotonic() - inicio
+
+            if not resultado:
+                _registrar(errores=1)
+                return None
+            registrar_hash(content_hash, folder_id, resultado)
+
+        _registrar(subidas=1, bytes_originales=tamano_original, bytes_subidos=tamano_subida, segundos_subida=duracion)
+        logger.info(
+            "Evidencia '%s' subida: %s bytes en %.2fs (%.1f KB/s)",
+            file_name, tamano_subida, duracion, tamano_subida / duracion / 1024 if duracion > 0 else 0
+        )
+        return resultado
+    finally:
+        if a_subir is not archivo:
+            a_subir.close()
+
+async def subir_evidencia(telegram_file, file_name, folder_id=None, mime_type="image/jpeg", comprimir=EVIDENCIAS_COMPRIMIR, progreso=None):
+    """
+    Descarga un archivo de Telegram y lo sube a Google Drive sin bloquear el event loop
+
+    Args:
+        telegram_file: telegram.File obtenido con get_file()
+        file_name: Nombre que tendrá el archivo en Drive
+        folder_id: ID de la carpeta destino (opcional)
+        mime_type: Tipo MIME del archivo
+        comprimir: Si se recomprimen las fotos JPEG antes de subir
+        progreso: Función opcional (bytes_enviados, bytes_totales), llamada desde el hilo de subida
+
+    Returns:
+        dict: Información del archivo subido o None si hay error
+    """
+    # La descarga no se encadena con la subida fragmento a fragmento: PTB entrega el archivo
+    # completo (download_to_memory no expone un iterador de chunks), y además el hash para
+    # deduplicar y la recompresión JPEG necesitan el contenido entero antes de subir.
+    # El buffer pasa a disco por encima de SPOOL_MAX_BYTES y la subida sí va en fragmentos.
+    archivo = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        await telegram_file.download_to_memory(out=archivo)
+        archivo.seek(0)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _obtener_executor(), _procesar_y_subir, archivo, file_name, mime_type, folder_id, comprimir, progreso
+        )
+    except Exception as e:
+        _registrar(errores=1)
+        logger.error("Error en el pipeline de evidencias para '%s': %s", file_name, e)
+        return None
+    finally:
+        archivo.close()
+
+# --- Cola persistente en disco ---
+
+# Cada evidencia encolada es un par <id>.bin (contenido) + <id>.json (metadatos)
+_cola = queue.Queue()
+_uploader_iniciado = False
+_pendientes_retomados = False
+_uploader_lock = threading.Lock()
+_al_terminar = []
+
+registrar_gauge("evidencias_en_cola", "Evidencias en la cola de subida en segundo plano", lambda: _cola.qsize())
+
+def _rutas_spool(spool_id):
+    """Rutas del contenido y de los metadatos de una evidencia encolada"""
+    base = os.path.join(UPLOADS_FOLDER, spool_id)
+    return f"{base}.bin", f"{base}.json"
+
+def _guardar_metadatos(ruta, metadatos):
+    """Escribe los metadatos de forma atómica"""
+    tmp = f"{ruta}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(metadatos, f)
+    os.replace(tmp, ruta)
+
+def registrar_al_terminar(callback):
+    """
+    Registra una función a llamar cuando una evidencia encolada termina de subirse
+
+    Args:
+        callback: Función (metadatos, resultado) llamada desde el hilo del uploader;
+                  resultado es la respuesta de Drive o None si se agotaron los intentos
+    """
+    _al_terminar.append(callback)
+
+async def encolar_evidencia(telegram_file, file_name, folder_id=None, mime_type="image/jpeg", comprimir=EVIDENCIAS_COMPRIMIR, datos=None):
+    """
+    Descarga un archivo de Telegram a UPLOADS_FOLDER y lo deja en cola para subirlo en segundo plano
+
+    Args:
+        telegram_file: telegram.File obtenido con get_file()
+        file_name: Nombre que tendrá el archivo en Drive
+        folder_id: ID de la carpeta destino (opcional)
+        mime_type: Tipo MIME del archivo
+        comprimir: Si se recomprimen las fotos JPEG antes de subir
+        datos: Diccionario opcional (serializable a JSON) que se devuelve a los callbacks
+
+    Returns:
+        str: ID de la evidencia en la cola o None si no se pudo guardar (o Drive está desactivado)
+    """
+    # Sin Drive no hay uploader que vacíe la cola: no se acumulan archivos en disco
+    if not DRIVE_ENABLED:
+        logger.warning("Drive desactivado (DRIVE_ENABLED): no se encola la evidencia '%s'", file_name)
+        return None
+
+    spool_id = uuid.uuid4().hex
+    ruta_bin, ruta_json = _rutas_spool(spool_id)
+    try:
+        with open(f"{ruta_bin}.tmp", 'wb') as archivo:
+            await telegram_file.download_to_memory(out=archivo)
+        os.replace(f"{ruta_bin}.tmp", ruta_bin)
+
+        # Los metadatos se escriben al final: sin .json la evidencia no se considera encolada
+        _guardar_metadatos(ruta_json, {
+            'id': spool_id,
+            'file_name': file_name,
+            'folder_id': folder_id,
+            'mime_type': mime_type,
+            'comprimir': comprimir,
+            'datos': datos or {},
+            'intentos': 0,
+            'creado': time.time(),
+        })
+        _cola.put(spool_id)
+        _arrancar_workers()
+        logger.info("Evidencia '%s' encolada como %s", file_name, spool_id)
+        return spool_id
+    except Exception as e:
+        logger.error("Error al encolar evidencia '%s': %s", file_name, e)
+        for ruta in (f"{ruta_bin}.tmp", ruta_bin):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        return None
+
+def _procesar_spool(spool_id):
+    """Sube una evidencia encolada; la reintenta o la deja en disco si falla"""
+    ruta_bin, ruta_json = _rutas_spool(spool_id)
+    try:
+        with open(ruta_json, 'r') as f:
+            metadatos = json.load(f)
+    except Exception as e:
+        logger.error("No se pudieron leer los metadatos de la evidencia %s: %s", spool_id, e)
+        return
+
+    resultado = None
+    try:
+        with open(ruta_bin, 'rb') as archivo:
+            resultado = _procesar_y_subir(
+                archivo, metadatos['file_name'], metadatos['mime_type'],
+                metadatos.get('folder_id'), metadatos.get('comprimir', False), None
+            )
+    except Exception as e:
+        logger.error("Error al subir evidencia encolada %s: %s", spool_id, e)
+
+    if resultado:
+        os.remove(ruta_bin)
+        os.remove(ruta_json)
+        logger.info("Evidencia encolada %s subida y retirada de la cola", spool_id)
+    else:
+        metadatos['intentos'] = metadatos.get('intentos', 0) + 1
+        _guardar_metadatos(ruta_json, metadatos)
+        if metadatos['intentos'] < EVIDENCIAS_MAX_INTENTOS:
+            espera = min(300, 5 * 2 ** metadatos['intentos'])
+            logger.warning("Evidencia %s falló (intento %s), reintento en %ss", spool_id, metadatos['intentos'], espera)
+            threading.Timer(espera, _cola.put, args=(spool_id,)).start()
+            return
+        # Se conserva en disco para reintentarla en el próximo arranque
+        logger.error("Evidencia %s no se pudo subir tras %s intentos; queda en %s", spool_id, metadatos['intentos'], UPLOADS_FOLDER)
+
+    for callback in _al_terminar:
+        try:
+            callback(metadatos, resultado)
+        except Exception as e:
+            logger.error("Error en callback de evidencia %s: %s", spool_id, e)
+
+def _worker_uploader():
+    """Consume la cola de evidencias indefinidamente"""
+    while True:
+        spool_id = _cola.get()
+        try:
+            _procesar_spool(spool_id)
+        finally:
+            _cola.task_done()
+
+def pendientes_en_disco():
+    """
+    Lista las evidencias encoladas que siguen en UPLOADS_FOLDER
+
+    Returns:
+        List[str]: IDs de las evidencias pendientes, de la más antigua a la más reciente
+    """
+    pendientes = []
+    try:
+        nombres = os.listdir(UPLOADS_FOLDER)
+    except FileNotFoundError:
+        return []
+    for nombre in nombres:
+        if nombre.endswith('.json'):
+            spool_id = nombre[:-len('.json')]
+            if os.path.exists(_rutas_spool(spool_id)[0]):
+                pendientes.append(spool_id)
+    return sorted(pendientes, key=lambda spool_id: os.path.getmtime(_rutas_spool(spool_id)[1]))
+
+def _arrancar_workers():
+    """Arranca una sola vez los hilos del uploader (EVIDENCIAS_WORKERS en paralelo)"""
+    global _uploader_iniciado
+    with _uploader_lock:
+        if _uploader_iniciado:
+            return
+        _uploader_iniciado = True
+    for i in range(EVIDENCIAS_WORKERS):
+        threading.Thread(target=_worker_uploader, name=f"uploader-evidencias-{i}", daemon=True).start()
+    logger.info("Uploader de evidencias iniciado con %s hilos", EVIDENCIAS_WORKERS)
+
+def iniciar_uploader():
+    """
+    Reencola las evidencias que quedaron pendientes en disco y, si hay alguna, arranca el uploader.
+    Sin pendientes no se crean hilos: el uploader arranca con la primera evidencia encolada.
+    No hace nada si Drive está desactivado.
+
+    Returns:
+        int: Número de evidencias pendientes retomadas
+    """
+    global _pendientes_retomados
+    if not DRIVE_ENABLED:
+        return 0
+    with _uploader_lock:
+        if _pendientes_retomados:
+            return 0
+        _pendientes_retomados = True
+
+    pendientes = pendientes_en_disco()
+    if not pendientes:
+        logger.info("Sin evidencias pendientes en %s; el uploader arrancará al encolar la primera", UPLOADS_FOLDER)
+        return 0
+
+    for spool_id in pendientes:
+        _cola.put(spool_id)
+    _arrancar_workers()
+    logger.info("%s evidencias pendientes retomadas", len(pendientes))
+    return len(pendientes)
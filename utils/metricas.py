@@ -0,0 +1,183 @@
+"""
+Métricas de las llamadas externas (Google Sheets, Drive, IA, apartalo): número de
+llamadas, errores e histograma de latencia por operación y etiquetas (p. ej. la hoja).
+Se exportan en formato de texto de Prometheus desde la ruta /metrics de la web y, dentro
+de un update de Telegram, cada medición es también un span de su traza (utils.trazas).
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+
+from utils.trazas import span_hijo
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_PREFIJO = "cafebot"
+
+class _Serie:
+    __slots__ = ("llamadas", "errores", "suma", "buckets")
+
+    def __init__(self):
+        self.llamadas = 0
+        self.errores = 0
+        self.suma = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # el último es +Inf
+
+# (operacion, etiquetas ordenadas) -> _Serie
+_series = {}
+_series_lock = threading.Lock()
+
+# nombre -> (descripción, función que devuelve {etiqueta: valor} o un número)
+_gauges = {}
+
+def registrar(operacion, segundos, error=False, **etiquetas):
+    """
+    Registra una llamada ya medida.
+
+    Args:
+        operacion: Nombre de la operación (p. ej. "sheets.spreadsheets.values.get")
+        segundos: Duración de la llamada
+        error: Si la llamada falló
+        **etiquetas: Etiquetas adicionales (p. ej. hoja="compras"); las None se omiten
+    """
+    clave = (operacion, tuple(sorted((k, str(v)) for k, v in etiquetas.items() if v is not None)))
+    with _series_lock:
+        serie = _series.get(clave)
+        if serie is None:
+            serie = _series[clave] = _Serie()
+        serie.llamadas += 1
+        serie.suma += segundos
+        serie.buckets[bisect_left(BUCKETS, segundos)] += 1
+        if error:
+            serie.errores += 1
+
+class medir(ContextDecorator):
+    """
+    Mide una llamada como context manager o decorador (funciones síncronas).
+    Cuenta como error si sale con una excepción o si se marca `error = True`:
+
+        with medir("apartalo.stock", producto=codigo) as m:
+            resp = requests.post(...)
+            m.error = resp.status_code != 200
+    """
+
+    def __init__(self, operacion, **etiquetas):
+        self.operacion = operacion
+        self.etiquetas = etiquetas
+        self.error = False
+        self._inicio = 0.0
+        self._span = None
+
+    def _recreate_cm(self):
+        # Cada llamada a una función decorada necesita su propio cronómetro
+        return medir(self.operacion, **self.etiquetas)
+
+    def __enter__(self):
+        # Dentro de un update la llamada queda además como span de su traza
+        self._span = span_hijo(self.operacion, **self.etiquetas)
+        if self._span is not None:
+            self._span.__enter__()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registrar(self.operacion, time.perf_counter() - self._inicio,
+                  error=self.error or exc_type is not None, **self.etiquetas)
+        if self._span is not None:
+            self._span.error = self.error
+            self._span.__exit__(exc_type, exc, tb)
+        return False
+
+def ejecutar(peticion, hoja=None):
+    """
+    Ejecuta una petición de googleapiclient (`.execute()`) midiéndola.
+
+    Args:
+        peticion: HttpRequest devuelto por el cliente de Sheets o Drive
+        hoja: Hoja afectada, si aplica
+
+    Returns:
+        La respuesta de la petición
+    """
+    with medir(getattr(peticion, "methodId", None) or "google.desconocida", hoja=hoja):
+        return peticion.execute()
+
+def registrar_gauge(nombre, descripcion, funcion):
+    """
+    Registra un valor que se calcula al exportar (p. ej. borradores vivos).
+
+    Args:
+        nombre: Nombre de la métrica (sin prefijo)
+        descripcion: Texto de ayuda
+        funcion: Devuelve un número o un diccionario {valor de la etiqueta "nombre": número}
+    """
+    _gauges[nombre] = (descripcion, funcion)
+
+def resumen():
+    """
+    Resumen de las series para logs o diagnóstico.
+
+    Returns:
+        List[Dict]: operación, etiquetas, llamadas, errores y latencia media por serie
+    """
+    with _series_lock:
+        return [
+            {"operacion": operacion, **dict(etiquetas), "llamadas": serie.llamadas,
+             "errores": serie.errores, "media_s": round(serie.suma / serie.llamadas, 4)}
+            for (operacion, etiquetas), serie in sorted(_series.items())
+        ]
+
+def _etiquetas_texto(pares):
+    escapar = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return ",".join(f'{k}="{escapar(v)}"' for k, v in pares)
+
+def exportar_prometheus():
+    """
+    Todas las métricas en el formato de texto de Prometheus (version 0.0.4).
+
+    Returns:
+        str: Cuerpo para la respuesta de /metrics
+    """
+    with _series_lock:
+        series = [(clave, serie.llamadas, serie.errores, serie.suma, list(serie.buckets))
+                  for clave, serie in sorted(_series.items())]
+
+    lineas = [
+        f"# HELP {_PREFIJO}_llamada_segundos Latencia de las llamadas externas",
+        f"# TYPE {_PREFIJO}_llamada_segundos histogram",
+    ]
+    for (operacion, etiquetas), llamadas, _, suma, buckets in series:
+        base = [("operacion", operacion), *etiquetas]
+        acumulado = 0
+        for limite, cantidad in zip((*BUCKETS, "+Inf"), buckets):
+            acumulado += cantidad
+            lineas.append(f"{_PREFIJO}_llamada_segundos_bucket{{{_etiquetas_texto([*base, ('le', str(limite))])}}} {acumulado}")
+        lineas.append(f"{_PREFIJO}_llamada_segundos_sum{{{_etiquetas_texto(base)}}} {suma:.6f}")
+        lineas.append(f"{_PREFIJO}_llamada_segundos_count{{{_etiquetas_texto(base)}}} {llamadas}")
+
+    lineas += [
+        f"# HELP {_PREFIJO}_llamada_errores_total Llamadas externas fallidas",
+        f"# TYPE {_PREFIJO}_llamada_errores_total counter",
+    ]
+    for (operacion, etiquetas), _, errores, _, _ in series:
+        lineas.append(f"{_PREFIJO}_llamada_errores_total{{{_etiquetas_texto([('operacion', operacion), *etiquetas])}}} {errores}")
+
+    for nombre, (descripcion, funcion) in sorted(_gauges.items()):
+        try:
+            valor = funcion()
+        except Exception as e:
+            logger.warning("No se pudo calcular la métrica %s: %s", nombre, e)
+            continue
+        lineas += [f"# HELP {_PREFIJO}_{nombre} {descripcion}", f"# TYPE {_PREFIJO}_{nombre} gauge"]
+        if isinstance(valor, dict):
+            for etiqueta, numero in sorted(valor.items()):
+                lineas.append(f"{_PREFIJO}_{nombre}{{{_etiquetas_texto([('nombre', str(etiqueta))])}}} {numero}")
+        else:
+            lineas.append(f"{_PREFIJO}_{nombre} {valor}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,85 @@
+"""
+Procesamiento concurrente de updates de Telegram conservando el orden por chat.
+Updates de chats distintos se atienden en paralelo (hasta un máximo configurable);
+los de un mismo chat se procesan uno tras otro, en el orden en que llegaron, para que
+los estados de ConversationHandler de un usuario nunca compitan entre sí.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable
+
+from telegram.ext import BaseUpdateProcessor
+
+from utils.trazas import span
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Cupo que se entrega al semáforo de PTB. Solo acota cuántos updates pueden esperar
+# a su chat; la concurrencia real la limita el semáforo propio, tomado después del lock
+_MAX_EN_ESPERA = 1024
+
+class ProcesadorPorChat(BaseUpdateProcessor):
+    """Procesador de updates concurrente con un lock asyncio por chat (tomado antes del cupo)."""
+
+    def __init__(self, max_concurrent_updates: int):
+        # PTB toma su semáforo antes de do_process_update; si ese fuera el límite real, los
+        # updates encolados de un chat ocupado gastarían cupos esperando su lock y
+        # bloquearían a los demás chats. Por eso el límite se aplica con un semáforo propio.
+        super().__init__(max(max_concurrent_updates, _MAX_EN_ESPERA))
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates debe ser un entero positivo")
+        self.limite = max_concurrent_updates
+        self._cupos = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # chat_id -> [lock, número de updates esperando o en proceso]
+        self._locks = {}
+
+    @staticmethod
+    def _clave(update: object):
+        """Chat (o usuario, si no hay chat) que determina el orden del update"""
+        chat = getattr(update, "effective_chat", None)
+        if chat is not None:
+            return chat.id
+        user = getattr(update, "effective_user", None)
+        return user.id if user is not None else None
+
+    @staticmethod
+    def _tipo(update: object):
+        """Comando, callback o mensaje; nunca el texto del usuario"""
+        if getattr(update, "callback_query", None) is not None:
+            return "callback"
+        message = getattr(update, "effective_message", None)
+        texto = getattr(message, "text", None) or ""
+        if texto.startswith("/"):
+            return texto.split()[0].split("@")[0]
+        return "mensaje"
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        clave = self._clave(update)
+        # Span raíz de la traza del update: incluye la espera por el lock del chat y el cupo
+        with span("update", chat=clave, tipo=self._tipo(update)) as raiz:
+            llegada = time.perf_counter()
+            if clave is None:
+                async with self._cupos:
+                    raiz.atributos["espera_ms"] = round((time.perf_counter() - llegada) * 1000, 2)
+                    await coroutine
+                return
+
+            entrada = self._locks.setdefault(clave, [asyncio.Lock(), 0])
+            entrada[1] += 1
+            try:
+                async with entrada[0]:
+                    async with self._cupos:
+                        raiz.atributos["espera_ms"] = round((time.perf_counter() - llegada) * 1000, 2)
+                        await coroutine
+            finally:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    self._locks.pop(clave, None)
+
+    async def initialize(self) -> None:
+        logger.info("Procesamiento concurrente de updates: hasta %s a la vez, orden por chat", self.limite)
+
+    async def shutdown(self) -> None:
+        self._locks.clear()
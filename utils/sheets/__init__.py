@@ -15,6 +15,7 @@ from utils.sheets.constants import (
 from utils.sheets.service import (
     get_sheet_service,
     get_or_create_sheet,
+    fetch_sheet_metadata,
     get_sheets_initialized,
     set_sheets_initialized
 )
@@ -23,9 +24,16 @@ from utils.sheets.service import (
 from utils.sheets.core import (
     initialize_sheets,
     append_data,
+    append_rows,
     update_cell,
+    update_cells,
+    read_cells,
+    update_cell_if_unchanged,
+    update_cells_if_unchanged,
     get_all_data,
     get_filtered_data,
+    precargar_hojas,
+    invalidar_cache_lecturas,
     buscar_proveedor,
 )
 
@@ -35,10 +43,31 @@ from utils.sheets.almacen import (
     get_almacen_cantidad,
     update_almacen_tostado,
     update_almacen,
+    planificar_descuento_almacen,
+    aplicar_plan_descuento,
+    descontar_almacen,
     leer_almacen_para_proceso,
     sincronizar_almacen_con_compras
 )
 
+# Funciones de adelantos
+from utils.sheets.adelantos import descontar_saldo_adelanto
+
+# Localización de filas por ID
+from utils.sheets.locator import (
+    localizar_fila,
+    localizar_filas,
+    update_by_id,
+    asegurar_id,
+    invalidar_indice
+)
+
+# Concurrencia
+from utils.sheets.locks import (
+    ConflictoConcurrencia,
+    bloquear_recursos
+)
+
 # Funciones de proceso
 from utils.sheets.process import (
     es_transicion_valida,
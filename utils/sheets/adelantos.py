@@ -0,0 +1,71 @@
+"""
+Módulo para gestionar los saldos de adelantos en el sistema de hojas de cálculo.
+"""
+import logging
+
+from utils.sheets.core import read_cells, update_cells_if_unchanged
+from utils.sheets.locator import localizar_fila
+from utils.sheets.locks import bloquear_recursos, ConflictoConcurrencia
+from utils.sheets.utils import safe_float
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Reintentos cuando otro escritor modifica el saldo entre la lectura y la escritura
+_MAX_REINTENTOS = 3
+
+def descontar_saldo_adelanto(adelanto_id, monto, saldo_leido=None):
+    """
+    Descuenta un monto del saldo_restante de un adelanto con compare-before-write: el saldo
+    con el que se planificó (el del borrador de la conversación) se compara con el vigente
+    en la hoja en la misma lectura que precede a la escritura. Si otro escritor lo cambió,
+    se reintenta con el saldo vigente, sin volver a leer.
+    La fila se ubica por el ID del adelanto, de modo que inserciones u ordenamientos
+    hechos en la hoja durante la conversación no desvían la escritura a otro adelanto.
+
+    Args:
+        adelanto_id: ID del adelanto (columna 'id')
+        monto: Monto a descontar
+        saldo_leido: saldo_restante leído al planificar; si es None se lee de la hoja
+
+    Returns:
+        Tuple[bool, float]: True si se descontó y el nuevo saldo, o False y el saldo
+                            vigente si no alcanza o hubo un error
+    """
+    monto = float(monto)
+    esperado = saldo_leido
+    saldo_actual = safe_float(esperado) if esperado is not None else 0.0
+
+    with bloquear_recursos(f"adelantos:{adelanto_id}"):
+        for intento in range(1, _MAX_REINTENTOS + 1):
+            try:
+                row_index = localizar_fila('adelantos', adelanto_id)
+                if row_index is None:
+                    logger.error("No se encontró el adelanto %s", adelanto_id)
+                    return False, saldo_actual
+
+                if esperado is None:
+                    esperado = read_cells('adelantos', [(row_index, 'saldo_restante')])[0]
+                saldo_actual = safe_float(esperado)
+
+                if monto > saldo_actual + 1e-9:
+                    logger.warning("Saldo insuficiente en adelanto %s: %s < %s", adelanto_id, saldo_actual, monto)
+                    return False, saldo_actual
+
+                nuevo_saldo = round(saldo_actual - monto, 2)
+                if update_cells_if_unchanged('adelantos', [(row_index, 'saldo_restante', esperado)],
+                                             [(row_index, 'saldo_restante', nuevo_saldo)]):
+                    logger.info("Saldo de adelanto %s (fila %s): %s -> %s", adelanto_id, row_index + 2, saldo_actual, nuevo_saldo)
+                    return True, nuevo_saldo
+                return False, saldo_actual
+            except ConflictoConcurrencia as e:
+                logger.warning("Conflicto al descontar adelanto %s (intento %s/%s): %s", adelanto_id, intento, _MAX_REINTENTOS, e)
+                # Reintentar con el saldo vigente, que ya se leyó al comparar
+                esperado = e.actuales[0] if e.actuales else None
+                saldo_actual = safe_float(esperado) if esperado is not None else saldo_actual
+            except Exception as e:
+                logger.error("Error al descontar saldo de adelanto %s: %s", adelanto_id, e)
+                return False, saldo_actual
+
+    logger.error("No se pudo descontar el adelanto %s: conflicto persistente", adelanto_id)
+    return False, saldo_actual
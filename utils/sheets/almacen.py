@@ -1,16 +1,25 @@
 """
 Módulo para gestionar el almacén de café en el sistema de hojas de cálculo.
 """
+import heapq
 import logging
 from typing import Tuple, Union, List, Dict, Any
 
 from utils.sheets.constants import FASES_CAFE
-from utils.sheets.core import get_filtered_data, append_data, update_cell, get_all_data
+from utils.sheets.core import get_filtered_data, append_data, update_cells, update_cells_if_unchanged, get_all_data
+from utils.sheets.locator import localizar_filas, asegurar_id
+from utils.sheets.locks import bloquear_recursos, ConflictoConcurrencia
 from utils.sheets.utils import safe_float, generate_almacen_id, get_current_datetime_str
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Margen para errores de redondeo al comparar kg
+_TOLERANCIA_KG = 1e-9
+
+# Reintentos cuando otro escritor modifica los lotes entre la lectura y la escritura
+_MAX_REINTENTOS = 3
+
 def get_compras_por_fase(fase):
     """
     Obtiene todas las compras en una fase específica con kg disponibles.
@@ -22,13 +31,13 @@ def get_compras_por_fase(fase):
         List[Dict]: Lista de compras en la fase especificada que aún tienen kg disponibles
     """
     try:
-        logger.info(f"Buscando compras en fase: {fase}")
+        logger.info("Buscando compras en fase: %s", fase)
         
         # Buscar en almacén los registros con la fase actual especificada
         almacen_data = get_filtered_data('almacen', {'fase_actual': fase})
         
         if not almacen_data:
-            logger.warning(f"No se encontró la fase {fase} en el almacén")
+            logger.warning("No se encontró la fase %s en el almacén", fase)
             return []
         
         # Filtrar solo aquellos que tienen kg disponibles
@@ -39,10 +48,10 @@ def get_compras_por_fase(fase):
                 if kg_disponibles > 0:
                     almacen_con_disponible.append(registro)
             except (ValueError, TypeError) as e:
-                logger.warning(f"Error al convertir cantidad_actual: {e}. Valor: {registro.get('cantidad_actual')}")
+                logger.warning("Error al convertir cantidad_actual: %s. Valor: %s", e, registro.get('cantidad_actual'))
         
         if not almacen_con_disponible:
-            logger.warning(f"No hay registros en almacén con kg disponibles para la fase {fase}")
+            logger.warning("No hay registros en almacén con kg disponibles para la fase %s", fase)
             return []
         
         # Obtener las compras correspondientes
@@ -61,14 +70,14 @@ def get_compras_por_fase(fase):
                     compra_con_disponible = compra.copy()
                     compra_con_disponible['cantidad_actual'] = registro_almacen.get('cantidad_actual', '0')
                     compra_con_disponible['almacen_registro_id'] = registro_almacen.get('id', '')
-                    compra_con_disponible['almacen_row_index'] = registro_almacen.get('_row_index', 0)
+                    compra_con_disponible['almacen_id'] = registro_almacen.get('id', '')
                     compras_disponibles.append(compra_con_disponible)
                     break
         
-        logger.info(f"Total compras encontradas en fase {fase}: {len(compras_disponibles)}")
+        logger.info("Total compras encontradas en fase %s: %s", fase, len(compras_disponibles))
         return compras_disponibles
     except Exception as e:
-        logger.error(f"Error al obtener compras en fase {fase}: {e}")
+        logger.error("Error al obtener compras en fase %s: %s", fase, e)
         return []
 
 def get_almacen_cantidad(fase):
@@ -89,7 +98,7 @@ def get_almacen_cantidad(fase):
         almacen_data = get_filtered_data('almacen', {'fase_actual': fase_buscada})
         
         if not almacen_data:
-            logger.warning(f"No se encontró la fase {fase_buscada} en el almacén")
+            logger.warning("No se encontró la fase %s en el almacén", fase_buscada)
             return 0.0
         
         # Calcular la suma total de kg disponibles
@@ -99,14 +108,151 @@ def get_almacen_cantidad(fase):
                 kg_disponibles = safe_float(registro.get('cantidad_actual', '0'))
                 total_disponible += kg_disponibles
             except (ValueError, TypeError) as e:
-                logger.error(f"Error al convertir cantidad_actual: {e}")
+                logger.error("Error al convertir cantidad_actual: %s", e)
         
-        logger.info(f"Cantidad total en almacén para fase {fase_buscada}: {total_disponible} kg")
+        logger.info("Cantidad total en almacén para fase %s: %s kg", fase_buscada, total_disponible)
         return total_disponible
     except Exception as e:
-        logger.error(f"Error al obtener cantidad en almacén para fase {fase}: {e}")
+        logger.error("Error al obtener cantidad en almacén para fase %s: %s", fase, e)
         return 0.0
 
+def _heap_lotes(almacen_data):
+    """
+    Construye un heap con los lotes que tienen kg disponibles, ordenado por fecha
+    (primero los más antiguos). El índice de fila desempata lotes con la misma fecha.
+    
+    Args:
+        almacen_data: Registros de almacén de una misma fase
+    
+    Returns:
+        List[Tuple]: Heap de tuplas (fecha, row_index, kg_disponibles, registro)
+    """
+    heap = []
+    for registro in almacen_data:
+        kg_disponibles = safe_float(registro.get('cantidad_actual', '0'))
+        if kg_disponibles > 0:
+            heap.append((registro.get('fecha', ''), registro.get('_row_index', 0), kg_disponibles, registro))
+    heapq.heapify(heap)
+    return heap
+
+def planificar_descuento_almacen(fase, cantidad):
+    """
+    Calcula qué lotes de una fase se usarán para descontar una cantidad (FIFO),
+    sin escribir nada en la hoja.
+    
+    Args:
+        fase: Fase del café
+        cantidad: Cantidad a descontar en kg
+    
+    Returns:
+        Tuple[List[Tuple[Dict, float]], float]: Plan (registro de almacén, kg a descontar)
+                                                y kg que no se pudieron cubrir
+    """
+    fase_normalizada = fase.strip().upper()
+    almacen_data = get_filtered_data('almacen', {'fase_actual': fase_normalizada}, usar_cache=False)
+    heap = _heap_lotes(almacen_data)
+    
+    plan = []
+    cantidad_restante = float(cantidad)
+    while cantidad_restante > _TOLERANCIA_KG and heap:
+        _, _, kg_disponibles, registro = heapq.heappop(heap)
+        cantidad_a_restar = min(kg_disponibles, cantidad_restante)
+        plan.append((registro, cantidad_a_restar))
+        cantidad_restante -= cantidad_a_restar
+    
+    return plan, max(cantidad_restante, 0.0)
+
+def aplicar_plan_descuento(plan, notas="", es_venta=False):
+    """
+    Escribe un plan de descuento en la hoja de almacén con un único batchUpdate, después de
+    comprobar (en un solo batchGet) que cada lote conserva la cantidad_actual con la que se
+    planificó. Los lotes se ubican por su ID, no por la fila en la que se leyeron.
+    
+    Args:
+        plan: Lista de tuplas (registro de almacén, kg a descontar)
+        notas: Notas adicionales sobre la operación
+        es_venta: Si es True, la nota de cada lote indica los kg vendidos
+    
+    Returns:
+        bool: True si se actualizaron todos los lotes, False en caso contrario
+
+    Raises:
+        ConflictoConcurrencia: Si algún lote cambió o desapareció desde que se leyó
+    """
+    lote_ids = [asegurar_id('almacen', registro) for registro, _ in plan]
+    filas = localizar_filas('almacen', lote_ids)
+    faltantes = [lote_id or '(sin ID)' for lote_id in lote_ids if lote_id not in filas]
+    if faltantes:
+        raise ConflictoConcurrencia(f"almacen: lotes no encontrados: {', '.join(faltantes)}")
+    
+    now = get_current_datetime_str()
+    esperados = []
+    updates = []
+    for (registro, cantidad_a_restar), lote_id in zip(plan, lote_ids):
+        row_index = filas[lote_id]
+        nueva_cantidad = safe_float(registro.get('cantidad_actual', '0')) - cantidad_a_restar
+        
+        detalle = f"Venta de {cantidad_a_restar} kg. {notas}" if es_venta else notas
+        nuevas_notas = f"{registro.get('notas', '')}; {now}: {detalle}"
+        
+        esperados.append((row_index, 'cantidad_actual', registro.get('cantidad_actual', '')))
+        updates.extend([
+            (row_index, 'cantidad_actual', str(nueva_cantidad)),
+            (row_index, 'fecha_actualizacion', now),
+            (row_index, 'notas', nuevas_notas),
+        ])
+    
+    return update_cells_if_unchanged('almacen', esperados, updates)
+
+def descontar_almacen(fase, cantidad_cambio, notas="", es_venta=False):
+    """
+    Descuenta una cantidad del almacén usando los lotes más antiguos primero.
+    El plan completo se calcula antes de escribir; si no hay stock suficiente
+    no se modifica ningún lote.
+    
+    Args:
+        fase: Fase del café
+        cantidad_cambio: Cantidad a restar en kg
+        notas: Notas adicionales sobre la operación
+        es_venta: Si es True, la nota de cada lote indica los kg vendidos
+    
+    Returns:
+        Tuple[bool, str]: True si se descontó correctamente y el ID del primer lote usado,
+                          o False y cadena vacía en caso contrario
+    """
+    fase_normalizada = fase.strip().upper()
+    
+    # Los escritores de la misma fase del proceso se serializan con el lock; contra otros
+    # procesos o ediciones manuales, el plan se escribe solo si sus lotes siguen con la
+    # cantidad leída (si no, se vuelve a planificar)
+    with bloquear_recursos(f"almacen:{fase_normalizada}"):
+        for intento in range(1, _MAX_REINTENTOS + 1):
+            plan, faltante = planificar_descuento_almacen(fase_normalizada, cantidad_cambio)
+            
+            if not plan:
+                logger.warning("No hay suficiente café %s disponible en el almacén", fase_normalizada)
+                return False, ""
+            
+            if faltante > _TOLERANCIA_KG:
+                logger.warning("No se pudo restar toda la cantidad solicitada. Faltan %s kg", faltante)
+                return False, ""
+            
+            try:
+                if not aplicar_plan_descuento(plan, notas, es_venta):
+                    logger.error("Error al aplicar el descuento de %s kg en %s", cantidad_cambio, fase_normalizada)
+                    return False, ""
+                break
+            except ConflictoConcurrencia as e:
+                logger.warning("Lotes de %s modificados por otro escritor, recalculando (intento %s/%s): %s", fase_normalizada, intento, _MAX_REINTENTOS, e)
+        else:
+            logger.error("No se pudo descontar %s kg de %s: conflicto persistente", cantidad_cambio, fase_normalizada)
+            return False, ""
+    
+    for registro, cantidad_a_restar in plan:
+        logger.info("Actualizado registro %s: restado %s kg", registro.get('id'), cantidad_a_restar)
+    
+    return True, plan[0][0].get('id', '')
+
 def update_almacen_tostado(fase, cantidad_cambio, notas=""):
     """
     Actualiza la cantidad de café tostado disponible en el almacén (solo restar).
@@ -123,91 +269,13 @@ def update_almacen_tostado(fase, cantidad_cambio, notas=""):
     """
     try:
         if fase.strip().upper() != "TOSTADO":
-            logger.error(f"Esta función solo es para actualizar café TOSTADO, se recibió: {fase}")
+            logger.error("Esta función solo es para actualizar café TOSTADO, se recibió: %s", fase)
             return False, ""
             
-        logger.info(f"Actualizando almacén TOSTADO - Cantidad a restar: {cantidad_cambio} kg")
-        
-        # Obtener todos los registros de TOSTADO con cantidad disponible
-        almacen_data = get_filtered_data('almacen', {'fase_actual': 'TOSTADO'})
-        
-        if not almacen_data:
-            logger.warning("No se encontraron registros de TOSTADO en el almacén")
-            return False, ""
-        
-        # Filtrar los que tienen cantidad disponible
-        registros_con_disponible = []
-        for registro in almacen_data:
-            try:
-                kg_disponibles = safe_float(registro.get('cantidad_actual', '0'))
-                if kg_disponibles > 0:
-                    registros_con_disponible.append(registro)
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Error al convertir cantidad_actual: {e}")
-        
-        if not registros_con_disponible:
-            logger.warning("No hay suficiente café TOSTADO disponible en el almacén")
-            return False, ""
-        
-        # Ordenar los registros por fecha (primero los más antiguos)
-        registros_con_disponible.sort(key=lambda x: x.get('fecha', ''))
-        
-        # Cantidad restante por actualizar
-        cantidad_restante = float(cantidad_cambio)
-        resultados = []
-        registro_usado = None
-        
-        for registro in registros_con_disponible:
-            if cantidad_restante <= 0:
-                break
-                
-            try:
-                kg_disponibles = safe_float(registro.get('cantidad_actual', '0'))
-                
-                # Determinar cuánto restar de este registro
-                cantidad_a_restar = min(kg_disponibles, cantidad_restante)
-                nueva_cantidad = kg_disponibles - cantidad_a_restar
-                
-                # Actualizar en la hoja
-                row_index = registro.get('_row_index')
-                now = get_current_datetime_str()
-                
-                # Actualizar la celda de cantidad_actual
-                result1 = update_cell('almacen', row_index, 'cantidad_actual', str(nueva_cantidad))
-                
-                # Actualizar la fecha de actualización
-                result2 = update_cell('almacen', row_index, 'fecha_actualizacion', now)
-                
-                # Actualizar las notas para incluir esta operación
-                notas_actuales = registro.get('notas', '')
-                nuevas_notas = f"{notas_actuales}; {now}: Venta de {cantidad_a_restar} kg. {notas}"
-                result3 = update_cell('almacen', row_index, 'notas', nuevas_notas)
-                
-                resultados.extend([result1, result2, result3])
-                
-                logger.info(f"Actualizado registro {registro.get('id')}: restado {cantidad_a_restar} kg, nuevo valor: {nueva_cantidad} kg")
-                
-                # Guardar el registro usado para relación en ventas
-                if registro_usado is None:
-                    registro_usado = registro
-                
-                # Actualizar cantidad restante
-                cantidad_restante -= cantidad_a_restar
-                
-            except Exception as e:
-                logger.error(f"Error al actualizar registro {registro.get('id')}: {e}")
-        
-        # Verificar si se pudo restar toda la cantidad solicitada
-        if cantidad_restante > 0:
-            logger.warning(f"No se pudo restar toda la cantidad solicitada. Faltan {cantidad_restante} kg")
-            return False, ""
-        
-        # Verificar que todas las actualizaciones fueron exitosas
-        almacen_id = registro_usado.get('id', '') if registro_usado else ""
-        return all(resultados), almacen_id
-        
+        logger.info("Actualizando almacén TOSTADO - Cantidad a restar: %s kg", cantidad_cambio)
+        return descontar_almacen("TOSTADO", cantidad_cambio, notas, es_venta=True)
     except Exception as e:
-        logger.error(f"Error al actualizar almacén de TOSTADO: {e}")
+        logger.error("Error al actualizar almacén de TOSTADO: %s", e)
         return False, ""
 
 def update_almacen(fase, cantidad_cambio, operacion="sumar", notas="", compra_id=""):
@@ -228,92 +296,15 @@ def update_almacen(fase, cantidad_cambio, operacion="sumar", notas="", compra_id
             - En otros casos: bool que indica si se actualizó correctamente
     """
     try:
-        logger.info(f"Actualizando almacén - Fase: {fase}, Cambio: {cantidad_cambio} kg, Operación: {operacion}, Compra ID: {compra_id}")
+        logger.info("Actualizando almacén - Fase: %s, Cambio: %s kg, Operación: %s, Compra ID: %s", fase, cantidad_cambio, operacion, compra_id)
         
         # Normalizar fase
         fase_normalizada = fase.strip().upper()
         
         # Si la operación es "restar", actualizar registros existentes en lugar de crear uno nuevo con valor negativo
         if operacion == "restar":
-            logger.info(f"Operación RESTAR en almacén para {fase_normalizada} - Cantidad: {cantidad_cambio} kg")
-            
-            # Obtener todos los registros con la fase actual y cantidad disponible
-            almacen_data = get_filtered_data('almacen', {'fase_actual': fase_normalizada})
-            
-            if not almacen_data:
-                logger.warning(f"No se encontraron registros de {fase_normalizada} en el almacén")
-                return False, ""
-            
-            # Filtrar los que tienen cantidad disponible
-            registros_con_disponible = []
-            for registro in almacen_data:
-                try:
-                    kg_disponibles = safe_float(registro.get('cantidad_actual', '0'))
-                    if kg_disponibles > 0:
-                        registros_con_disponible.append(registro)
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Error al convertir cantidad_actual: {e}")
-            
-            if not registros_con_disponible:
-                logger.warning(f"No hay suficiente café {fase_normalizada} disponible en el almacén")
-                return False, ""
-            
-            # Ordenar los registros por fecha (primero los más antiguos)
-            registros_con_disponible.sort(key=lambda x: x.get('fecha', ''))
-            
-            # Cantidad restante por actualizar
-            cantidad_restante = float(cantidad_cambio)
-            resultados = []
-            registro_usado = None
-            
-            for registro in registros_con_disponible:
-                if cantidad_restante <= 0:
-                    break
-                    
-                try:
-                    kg_disponibles = safe_float(registro.get('cantidad_actual', '0'))
-                    
-                    # Determinar cuánto restar de este registro
-                    cantidad_a_restar = min(kg_disponibles, cantidad_restante)
-                    nueva_cantidad = kg_disponibles - cantidad_a_restar
-                    
-                    # Actualizar en la hoja
-                    row_index = registro.get('_row_index')
-                    now = get_current_datetime_str()
-                    
-                    # Actualizar la celda de cantidad_actual
-                    result1 = update_cell('almacen', row_index, 'cantidad_actual', str(nueva_cantidad))
-                    
-                    # Actualizar la fecha de actualización
-                    result2 = update_cell('almacen', row_index, 'fecha_actualizacion', now)
-                    
-                    # Actualizar las notas para incluir esta operación
-                    notas_actuales = registro.get('notas', '')
-                    nuevas_notas = f"{notas_actuales}; {now}: {notas}"
-                    result3 = update_cell('almacen', row_index, 'notas', nuevas_notas)
-                    
-                    resultados.extend([result1, result2, result3])
-                    
-                    logger.info(f"Actualizado registro {registro.get('id')}: restado {cantidad_a_restar} kg, nuevo valor: {nueva_cantidad} kg")
-                    
-                    # Guardar el registro usado para relación en ventas
-                    if registro_usado is None:
-                        registro_usado = registro
-                    
-                    # Actualizar cantidad restante
-                    cantidad_restante -= cantidad_a_restar
-                    
-                except Exception as e:
-                    logger.error(f"Error al actualizar registro {registro.get('id')}: {e}")
-            
-            # Verificar si se pudo restar toda la cantidad solicitada
-            if cantidad_restante > 0:
-                logger.warning(f"No se pudo restar toda la cantidad solicitada. Faltan {cantidad_restante} kg")
-                return False, ""
-            
-            # Verificar que todas las actualizaciones fueron exitosas
-            almacen_id = registro_usado.get('id', '') if registro_usado else ""
-            return all(resultados), almacen_id
+            logger.info("Operación RESTAR en almacén para %s - Cantidad: %s kg", fase_normalizada, cantidad_cambio)
+            return descontar_almacen(fase_normalizada, cantidad_cambio, notas)
         
         # Para operaciones "sumar" y "establecer", crear un nuevo registro
         now = get_current_datetime_str()
@@ -334,13 +325,13 @@ def update_almacen(fase, cantidad_cambio, operacion="sumar", notas="", compra_id
         resultado = append_data("almacen", nueva_entrada)
         
         if resultado:
-            logger.info(f"Nuevo registro de almacén creado correctamente: {nueva_entrada['id']}")
+            logger.info("Nuevo registro de almacén creado correctamente: %s", nueva_entrada['id'])
             return True
         else:
-            logger.error(f"Error al crear nuevo registro de almacén")
+            logger.error("Error al crear nuevo registro de almacén")
             return False
     except Exception as e:
-        logger.error(f"Error al actualizar almacén: {e}")
+        logger.error("Error al actualizar almacén: %s", e)
         # Para las operaciones que no son de TOSTADO y restar, devolver un tuple (False, "")
         if operacion == "restar":
             return False, ""
@@ -360,7 +351,7 @@ def leer_almacen_para_proceso():
         almacen_data = get_all_data('almacen')
         
         if not almacen_data:
-            logger.error(f"No se pudieron obtener datos de almacén")
+            logger.error("No se pudieron obtener datos de almacén")
             return {}
         
         # Agrupar y sumar por fase_actual
@@ -381,11 +372,11 @@ def leer_almacen_para_proceso():
                         resultados[fase_actual]['cantidad_total'] += kg_disponibles
                         resultados[fase_actual]['registros'].append(registro)
                 except (ValueError, TypeError) as e:
-                    logger.error(f"Error al procesar cantidad_actual en almacén: {e}")
+                    logger.error("Error al procesar cantidad_actual en almacén: %s", e)
         
         return resultados
     except Exception as e:
-        logger.error(f"Error al leer almacén para proceso: {e}")
+        logger.error("Error al leer almacén para proceso: %s", e)
         return {}
 
 def sincronizar_almacen_con_compras():
@@ -422,9 +413,9 @@ def sincronizar_almacen_con_compras():
                     # Verificar si ya existe un registro en almacén para esta compra
                     compra_id = compra.get('id', '')
                     if compra_id:
-                        almacen_existente = get_filtered_data('almacen', {'compra_id': compra_id})
+                        almacen_existente = get_filtered_data('almacen', {'compra_id': compra_id}, usar_cache=False)
                         if almacen_existente:
-                            logger.info(f"Ya existe registro en almacén para compra {compra_id}")
+                            logger.debug("Ya existe registro en almacén para compra %s", compra_id)
                             continue
                     
                     # Crear registro en almacén
@@ -443,11 +434,11 @@ def sincronizar_almacen_con_compras():
                         })
                         resultados.append(resultado)
                         if resultado:
-                            logger.info(f"Creado registro en almacén para compra {compra_id}")
+                            logger.info("Creado registro en almacén para compra %s", compra_id)
                         else:
-                            logger.warning(f"Error al crear registro en almacén para compra {compra_id}")
+                            logger.warning("Error al crear registro en almacén para compra %s", compra_id)
                 except Exception as e:
-                    logger.error(f"Error al procesar compra {compra.get('id', '')}: {e}")
+                    logger.error("Error al procesar compra %s: %s", compra.get('id', ''), e)
                     resultados.append(False)
         
         # Verificar resultados
@@ -455,8 +446,8 @@ def sincronizar_almacen_con_compras():
             logger.info("Sincronización de almacén completada correctamente")
             return True
         else:
-            logger.warning(f"Sincronización parcial: {resultados.count(True)}/{len(resultados)} operaciones exitosas")
+            logger.warning("Sincronización parcial: %s/%s operaciones exitosas", resultados.count(True), len(resultados))
             return resultados.count(True) > 0
     except Exception as e:
-        logger.error(f"Error al sincronizar almacén con compras: {e}")
+        logger.error("Error al sincronizar almacén con compras: %s", e)
         return False
\ No newline at end of file
@@ -2,19 +2,81 @@
 Módulo con las operaciones básicas para Google Sheets.
 """
 import logging
+import threading
+import time
 from typing import Dict, List, Any, Optional, Union
 import requests
 
+from config import SHEETS_CACHE_TTL
+
+from utils.metricas import ejecutar, medir
 from utils.sheets.constants import HEADERS
-from utils.sheets.service import get_sheet_service, get_or_create_sheet, get_sheet_id, get_sheets_initialized, set_sheets_initialized
-from utils.sheets.utils import format_date_for_sheets, generate_unique_id, generate_almacen_id, get_current_datetime_str, safe_float
+from utils.sheets.locks import ConflictoConcurrencia
+from utils.sheets.service import (
+    get_sheet_service, get_or_create_sheet, get_sheet_id, get_sheets_initialized, set_sheets_initialized,
+    fetch_sheet_metadata, register_sheet_ids
+)
+from utils.sheets.utils import (
+    format_date_for_sheets, generate_unique_id, generate_almacen_id, get_current_datetime_str, safe_float,
+    get_column_letter, cell_range, column_range, row_range, sheet_range
+)
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Caché de lecturas completas por hoja: sheet_name -> (timestamp, filas).
+# Se invalida en cada escritura desde este proceso; el TTL cubre ediciones manuales en la hoja.
+_cache_lecturas = {}
+_cache_lecturas_lock = threading.Lock()
+
+def invalidar_cache_lecturas(sheet_name=None):
+    """
+    Descarta las lecturas en caché de una hoja (o de todas).
+    
+    Args:
+        sheet_name: Nombre de la hoja, o None para todas
+    """
+    with _cache_lecturas_lock:
+        if sheet_name is None:
+            _cache_lecturas.clear()
+        else:
+            _cache_lecturas.pop(sheet_name, None)
+
+def _guardar_en_cache(sheet_name, rows):
+    """Guarda las filas leídas de una hoja en la caché de lecturas"""
+    if SHEETS_CACHE_TTL > 0:
+        with _cache_lecturas_lock:
+            _cache_lecturas[sheet_name] = (time.monotonic(), rows)
+
+def _leer_de_cache(sheet_name):
+    """Devuelve una copia de las filas en caché si siguen vigentes, o None"""
+    with _cache_lecturas_lock:
+        entrada = _cache_lecturas.get(sheet_name)
+    if entrada is None or time.monotonic() - entrada[0] >= SHEETS_CACHE_TTL:
+        return None
+    # Copias para que quien modifique los diccionarios no altere la caché
+    return [dict(row) for row in entrada[1]]
+
+def _filas_a_diccionarios(values):
+    """Convierte los valores leídos (cabecera + filas) en diccionarios con _row_index"""
+    if not values:
+        return []
+    headers = values[0]
+    rows = []
+    for i, row in enumerate(values[1:]):  # Saltar la fila de cabeceras
+        # Asegurarse de que la fila tenga la misma longitud que las cabeceras
+        row_padded = row + [""] * (len(headers) - len(row))
+        # Añadir el _row_index para referencia futura (basado en 0)
+        row_dict = dict(zip(headers, row_padded))
+        row_dict['_row_index'] = i
+        rows.append(row_dict)
+    return rows
+
 def initialize_sheets():
     """
     Inicializa las hojas de Google Sheets con las cabeceras correctas.
+    Hace una sola lectura de metadatos, un solo batchUpdate para crear las hojas que falten,
+    un solo batchGet de las filas de cabecera y una sola escritura para las cabeceras pendientes.
     
     Returns:
         bool: True si se inicializaron correctamente, False en caso contrario
@@ -28,108 +90,190 @@ def initialize_sheets():
         sheets = get_sheet_service()
         spreadsheet_id = get_or_create_sheet()
         
-        # Obtener todas las hojas existentes
-        sheet_metadata = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-        existing_sheets = {sheet['properties']['title'] for sheet in sheet_metadata.get('sheets', [])}
-        
-        # Para cada hoja definida en HEADERS
-        for sheet_name, headers in HEADERS.items():
-            # Verificar si la hoja existe
-            if sheet_name not in existing_sheets:
-                # Crear la hoja
-                logger.info(f"Creando hoja '{sheet_name}'...")
-                requests = [{
-                    'addSheet': {
-                        'properties': {
-                            'title': sheet_name
-                        }
-                    }
-                }]
-                sheets.spreadsheets().batchUpdate(
-                    spreadsheetId=spreadsheet_id,
-                    body={'requests': requests}
-                ).execute()
-                
-                # Verificar si la hoja se creó correctamente
-                sheet_metadata = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-                updated_existing_sheets = {sheet['properties']['title'] for sheet in sheet_metadata.get('sheets', [])}
-                
-                if sheet_name in updated_existing_sheets:
-                    logger.info(f"Hoja '{sheet_name}' creada correctamente")
-                else:
-                    logger.error(f"Error al crear la hoja '{sheet_name}'")
-                    continue
-            
-            # Verificar si la hoja tiene cabeceras
-            range_name = f"{sheet_name}!A1:Z1"
-            result = sheets.spreadsheets().values().get(
+        # 1. Obtener todas las hojas existentes (una sola lectura de metadatos)
+        existing_sheets = fetch_sheet_metadata()
+        
+        # 2. Crear todas las hojas faltantes en un solo batchUpdate
+        missing_sheets = [sheet_name for sheet_name in HEADERS if sheet_name not in existing_sheets]
+        if missing_sheets:
+            logger.info("Creando hojas: %s", missing_sheets)
+            response = ejecutar(sheets.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
-                range=range_name
-            ).execute()
-            
-            values = result.get('values', [])
-            
+                body={'requests': [
+                    {'addSheet': {'properties': {'title': sheet_name}}}
+                    for sheet_name in missing_sheets
+                ]}
+            ))
+            register_sheet_ids([
+                reply['addSheet']['properties']
+                for reply in response.get('replies', [])
+                if 'addSheet' in reply
+            ])
+            logger.info("Hojas creadas correctamente: %s", missing_sheets)
+        
+        # 3. Leer todas las filas de cabecera en un solo batchGet
+        sheet_names = list(HEADERS.keys())
+        result = ejecutar(sheets.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[row_range(sheet_name, 1) for sheet_name in sheet_names]
+        ))
+        
+        # 4. Escribir en una sola llamada las cabeceras que falten o estén incompletas
+        header_updates = []
+        for sheet_name, value_range in zip(sheet_names, result.get('valueRanges', [])):
+            headers = HEADERS[sheet_name]
+            values = value_range.get('values', [])
             if not values or len(values[0]) < len(headers):
-                # Escribir las cabeceras
-                logger.info(f"Escribiendo cabeceras para la hoja '{sheet_name}'...")
-                sheets.spreadsheets().values().update(
-                    spreadsheetId=spreadsheet_id,
-                    range=range_name,
-                    valueInputOption="RAW",
-                    body={"values": [headers]}
-                ).execute()
-                
-                logger.info(f"Cabeceras para '{sheet_name}' actualizadas correctamente")
-            else:
-                logger.info(f"La hoja '{sheet_name}' ya tiene cabeceras")
-            
-            # Operaciones especiales por tipo de hoja
-            if sheet_name == 'compras':
-                # Para compras existentes, asegurarse de que tengan un ID único
-                # Esto es para mantener compatibilidad con compras que no tenían ID
-                compras = get_all_data('compras')
-                for i, compra in enumerate(compras):
-                    if not compra.get('id'):
-                        # Generar un ID único
-                        nuevo_id = generate_unique_id()
-                        # Actualizar la compra
-                        update_cell('compras', compra['_row_index'], 'id', nuevo_id)
-                        logger.info(f"Asignado ID {nuevo_id} a compra existente (fila {compra['_row_index'] + 2})")
-                    
-                    # Migrar datos antiguos al nuevo formato: fase_actual y kg_disponibles van a almacen
-                    if ('fase_actual' in compra or 'kg_disponibles' in compra) and compra.get('tipo_cafe'):
-                        fase = compra.get('fase_actual', compra.get('tipo_cafe'))
-                        kg_disponibles = safe_float(compra.get('kg_disponibles', compra.get('cantidad', 0)))
-                        
-                        # Verificar si ya existe un registro en almacén para esta compra
-                        compra_id = compra.get('id', '')
-                        almacen_existente = []
-                        if compra_id:
-                            almacen_existente = get_filtered_data('almacen', {'compra_id': compra_id})
-                        
-                        # Solo crear registro si no existe y si hay kg disponibles
-                        if not almacen_existente and kg_disponibles > 0:
-                            now = get_current_datetime_str()
-                            append_data('almacen', {
-                                'id': generate_almacen_id(),
-                                'compra_id': compra_id,
-                                'tipo_cafe_origen': fase,
-                                'fecha': now,
-                                'cantidad': compra.get('cantidad', 0),
-                                'fase_actual': fase,
-                                'cantidad_actual': kg_disponibles,
-                                'notas': f"Migración automática desde compra ID: {compra_id}",
-                                'fecha_actualizacion': now
-                            })
-                            logger.info(f"Creado registro en almacén para compra {compra_id} con {kg_disponibles} kg en fase {fase}")
+                header_updates.append({'range': row_range(sheet_name, 1), 'values': [headers]})
+        
+        if header_updates:
+            logger.info("Escribiendo cabeceras para %s hojas...", len(header_updates))
+            ejecutar(sheets.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={'valueInputOption': 'RAW', 'data': header_updates}
+            ))
+            logger.info("Cabeceras actualizadas correctamente")
+        else:
+            logger.info("Todas las hojas ya tienen cabeceras")
+        
+        # 5. Migraciones de datos antiguos
+        _migrar_compras()
+        _migrar_adelantos()
         
         # Marcar hojas como inicializadas para esta sesión
+        invalidar_cache_lecturas()
         set_sheets_initialized(True)
         
         logger.info("Inicialización de hojas completada correctamente")
         return True
     except Exception as e:
-        logger.error(f"Error al inicializar las hojas: {e}")
+        logger.error("Error al inicializar las hojas: %s", e)
+        return False
+
+def _migrar_compras():
+    """
+    Asigna ID a las compras que no lo tienen y mueve fase_actual/kg_disponibles antiguos
+    a almacén, con una lectura por hoja y escrituras en lote.
+    """
+    compras = get_all_data('compras', usar_cache=False)
+    if not compras:
+        return
+    
+    # Para compras existentes, asegurarse de que tengan un ID único
+    # Esto es para mantener compatibilidad con compras que no tenían ID
+    id_updates = []
+    for compra in compras:
+        if not compra.get('id'):
+            compra['id'] = generate_unique_id()
+            id_updates.append((compra['_row_index'], 'id', compra['id']))
+            logger.info("Asignado ID %s a compra existente (fila %s)", compra['id'], compra['_row_index'] + 2)
+    if id_updates:
+        update_cells('compras', id_updates)
+    
+    # Migrar datos antiguos al nuevo formato: fase_actual y kg_disponibles van a almacen
+    compras_antiguas = [
+        compra for compra in compras
+        if ('fase_actual' in compra or 'kg_disponibles' in compra) and compra.get('tipo_cafe')
+    ]
+    if not compras_antiguas:
+        return
+    
+    compras_en_almacen = {registro.get('compra_id') for registro in get_all_data('almacen', usar_cache=False)}
+    now = get_current_datetime_str()
+    nuevos_registros = []
+    for compra in compras_antiguas:
+        fase = compra.get('fase_actual', compra.get('tipo_cafe'))
+        kg_disponibles = safe_float(compra.get('kg_disponibles', compra.get('cantidad', 0)))
+        compra_id = compra.get('id', '')
+        
+        # Solo crear registro si no existe y si hay kg disponibles
+        if compra_id not in compras_en_almacen and kg_disponibles > 0:
+            nuevos_registros.append({
+                'id': generate_almacen_id(),
+                'compra_id': compra_id,
+                'tipo_cafe_origen': fase,
+                'fecha': now,
+                'cantidad': compra.get('cantidad', 0),
+                'fase_actual': fase,
+                'cantidad_actual': kg_disponibles,
+                'notas': f"Migración automática desde compra ID: {compra_id}",
+                'fecha_actualizacion': now
+            })
+            compras_en_almacen.add(compra_id)
+            logger.info("Creando registro en almacén para compra %s con %s kg en fase %s", compra_id, kg_disponibles, fase)
+    
+    if nuevos_registros:
+        append_rows('almacen', nuevos_registros)
+
+def _migrar_adelantos():
+    """
+    Asigna ID a los adelantos registrados antes de existir la columna 'id'.
+    """
+    id_updates = []
+    for adelanto in get_all_data('adelantos', usar_cache=False):
+        if not adelanto.get('id'):
+            nuevo_id = generate_unique_id("AD-")
+            id_updates.append((adelanto['_row_index'], 'id', nuevo_id))
+            logger.info("Asignado ID %s a adelanto existente (fila %s)", nuevo_id, adelanto['_row_index'] + 2)
+    if id_updates:
+        update_cells('adelantos', id_updates)
+
+def append_rows(sheet_name, rows):
+    """
+    Añade varias filas a la hoja especificada con un solo appendCells.
+    A diferencia de append_data no aplica valores por defecto ni crea registros derivados.
+    
+    Args:
+        sheet_name: Nombre de la hoja
+        rows: Lista de diccionarios con los datos a añadir
+        
+    Returns:
+        bool: True si se añadieron los datos correctamente, False en caso contrario
+    """
+    if sheet_name not in HEADERS:
+        logger.error("Nombre de hoja inválido: %s", sheet_name)
+        raise ValueError(f"Nombre de hoja inválido: {sheet_name}")
+    
+    if not rows:
+        return True
+    
+    try:
+        sheet_id = get_sheet_id(sheet_name)
+        if sheet_id is None:
+            logger.error("No se pudo encontrar el ID de la hoja '%s'", sheet_name)
+            return False
+        
+        headers = HEADERS[sheet_name]
+        request_body = {
+            "requests": [
+                {
+                    "appendCells": {
+                        "sheetId": sheet_id,
+                        "rows": [
+                            {
+                                "values": [
+                                    {"userEnteredValue": {"stringValue": str(row.get(header, "")) if row.get(header) is not None else ""}}
+                                    for header in headers
+                                ]
+                            }
+                            for row in rows
+                        ],
+                        "fields": "userEnteredValue"
+                    }
+                }
+            ]
+        }
+        
+        ejecutar(get_sheet_service().spreadsheets().batchUpdate(
+            spreadsheetId=get_or_create_sheet(),
+            body=request_body
+        ), hoja=sheet_name)
+        
+        logger.info("Añadidas %s filas a '%s' con un solo appendCells", len(rows), sheet_name)
+        invalidar_cache_lecturas(sheet_name)
+        return True
+    except Exception as e:
+        logger.error("Error al añadir filas en lote a '%s': %s", sheet_name, e)
         return False
 
 def append_data(sheet_name, data):
@@ -144,7 +288,7 @@ def append_data(sheet_name, data):
         bool: True si se añadieron los datos correctamente, False en caso contrario
     """
     if sheet_name not in HEADERS:
-        logger.error(f"Nombre de hoja inválido: {sheet_name}")
+        logger.error("Nombre de hoja inválido: %s", sheet_name)
         raise ValueError(f"Nombre de hoja inválido: {sheet_name}")
     
     try:
@@ -156,7 +300,7 @@ def append_data(sheet_name, data):
             # Siempre asignar un ID único, incluso si ya existe uno
             if not data.get('id'):
                 data['id'] = generate_unique_id()
-                logger.info(f"Generado ID único para compra: {data['id']}")
+                logger.info("Generado ID único para compra: %s", data['id'])
             
             # Calcular precio total si no está especificado o es 0
             if ('preciototal' not in data or not data.get('preciototal') or safe_float(data.get('preciototal')) == 0) and 'cantidad' in data and 'precio' in data:
@@ -165,16 +309,21 @@ def append_data(sheet_name, data):
                     precio = float(str(data.get('precio', '0')).replace(',', '.'))
                     # Asegurar que el precio no sea 0
                     if precio <= 0:
-                        logger.warning(f"Precio está configurado a {precio}, podría ser un error. Se guardará como está.")
+                        logger.warning("Precio está configurado a %s, podría ser un error. Se guardará como está.", precio)
                     data['preciototal'] = str(round(cantidad * precio, 2))
-                    logger.info(f"Calculado precio total para compra: {data['preciototal']}")
+                    logger.info("Calculado precio total para compra: %s", data['preciototal'])
                 except (ValueError, TypeError) as e:
-                    logger.warning(f"Error al calcular precio total: {e}")
+                    logger.warning("Error al calcular precio total: %s", e)
+        
+        # Para adelantos, asegurar que tenga un ID para poder ubicar la fila aunque cambie de posición
+        if sheet_name == 'adelantos' and not data.get('id'):
+            data['id'] = generate_unique_id("AD-")
+            logger.info("Generado ID único para adelanto: %s", data['id'])
         
         # Para almacén, asegurar que tenga un ID único
         if sheet_name == 'almacen' and 'id' not in data:
             data['id'] = generate_almacen_id()
-            logger.info(f"Generado ID único para almacén: {data['id']}")
+            logger.info("Generado ID único para almacén: %s", data['id'])
             
             # Si no tiene fecha, agregar la fecha actual
             if 'fecha' not in data or not data['fecha']:
@@ -183,20 +332,19 @@ def append_data(sheet_name, data):
             # Agregar fecha de actualización si no existe
             if 'fecha_actualizacion' not in data or not data['fecha_actualizacion']:
                 data['fecha_actualizacion'] = get_current_datetime_str()
-                logger.info(f"Añadida fecha de actualización: {data['fecha_actualizacion']}")
+                logger.info("Añadida fecha de actualización: %s", data['fecha_actualizacion'])
         
         # Convertir el diccionario a una lista ordenada según las cabeceras
         headers = HEADERS[sheet_name]
         row_data = []
         
-        # Imprimir información detallada para depurar
-        logger.info(f"Cabeceras para la hoja '{sheet_name}': {headers}")
-        logger.info(f"Datos recibidos: {data}")
+        # Información detallada solo para depurar (el diccionario completo es caro de formatear)
+        logger.debug("Datos recibidos para '%s': %s", sheet_name, data)
         
         # Verificar que todos los campos necesarios existan
         for header in headers:
             if header not in data or not data[header]:
-                logger.warning(f"Campo '{header}' faltante o vacío en los datos. Usando valor por defecto.")
+                logger.debug("Campo '%s' faltante o vacío en los datos. Usando valor por defecto.", header)
                 
                 # Valores por defecto según el campo
                 if header == 'tipo_cafe' or header == 'tipo_cafe_origen':
@@ -226,14 +374,13 @@ def append_data(sheet_name, data):
                 if isinstance(data['hora'], str) and len(data['hora']) == 8 and data['hora'][2] == ':' and data['hora'][5] == ':':
                     # Prefijo con comilla simple para forzar formato de texto
                     data['hora'] = f"'{data['hora']}'"
-                    logger.info(f"Hora formateada como texto: {data['hora']}")
+                    logger.debug("Hora formateada como texto: %s", data['hora'])
         
         # Construir la fila de datos ordenada según las cabeceras
         for header in headers:
             row_data.append(data.get(header, ""))
         
-        logger.info(f"Añadiendo datos a '{sheet_name}': {data}")
-        logger.info(f"Datos formateados para Sheets: {row_data}")
+        logger.debug("Fila formateada para '%s': %s", sheet_name, row_data)
         
         # ENFOQUE USANDO APPENDCELLS (más robusto)
         try:
@@ -241,10 +388,10 @@ def append_data(sheet_name, data):
             sheet_id = get_sheet_id(sheet_name)
             
             if sheet_id is None:
-                logger.error(f"No se pudo encontrar el ID de la hoja '{sheet_name}'")
+                logger.error("No se pudo encontrar el ID de la hoja '%s'", sheet_name)
                 return False
             
-            logger.info(f"Usando sheet_id: {sheet_id} para '{sheet_name}'")
+            logger.debug("Usando sheet_id %s para '%s'", sheet_id, sheet_name)
             
             # 2. Usamos appendCells directamente en el API
             request_body = {
@@ -267,12 +414,13 @@ def append_data(sheet_name, data):
             }
             
             # Ejecutar el batchUpdate con la solicitud de appendCells
-            response = service.spreadsheets().batchUpdate(
+            response = ejecutar(service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body=request_body
-            ).execute()
+            ), hoja=sheet_name)
             
-            logger.info(f"Datos añadidos correctamente a '{sheet_name}' usando appendCells")
+            logger.info("Datos añadidos correctamente a '%s' usando appendCells", sheet_name)
+            invalidar_cache_lecturas(sheet_name)
             
             # Si se agregó exitosamente una compra, crear también el registro en almacén
             # SOLO crear registro en almacén si es una compra nueva y no si ya estamos creando un registro de almacén
@@ -287,7 +435,7 @@ def append_data(sheet_name, data):
                     # Verificar si ya existe un registro en almacén para esta compra
                     almacen_existente = []
                     if compra_id:
-                        almacen_existente = get_filtered_data('almacen', {'compra_id': compra_id})
+                        almacen_existente = get_filtered_data('almacen', {'compra_id': compra_id}, usar_cache=False)
                     
                     # SOLO crear registro si no existe y si hay kg disponibles
                     if not almacen_existente and cantidad > 0:
@@ -311,47 +459,48 @@ def append_data(sheet_name, data):
                         result_almacen = append_data('almacen', nuevo_almacen)
                         
                         if result_almacen:
-                            logger.info(f"Registro de almacén creado para compra {data.get('id')}: {cantidad} kg de {fase}")
+                            logger.info("Registro de almacén creado para compra %s: %s kg de %s", data.get('id'), cantidad, fase)
                         else:
-                            logger.warning(f"No se pudo crear registro en almacén para compra {data.get('id')}")
+                            logger.warning("No se pudo crear registro en almacén para compra %s", data.get('id'))
                     else:
                         if almacen_existente:
-                            logger.info(f"Ya existe un registro en almacén para la compra {compra_id}, no se creará otro")
+                            logger.info("Ya existe un registro en almacén para la compra %s, no se creará otro", compra_id)
                     
                 except Exception as e:
-                    logger.error(f"Error al crear registro en almacén después de compra: {e}")
+                    logger.error("Error al crear registro en almacén después de compra: %s", e)
                     # No fallar si hay un error en el almacén, solo registrar
             
             return True
         except Exception as e:
-            logger.error(f"Error al usar appendCells: {e}")
+            logger.error("Error al usar appendCells: %s", e)
             
             # Si falla el método principal, intentar un método de respaldo
             try:
                 logger.info("Intentando método de respaldo con batchUpdate...")
                 
                 # Obtener todas las filas para determinar el índice de la próxima fila
-                response = service.spreadsheets().values().get(
+                response = ejecutar(service.spreadsheets().values().get(
                     spreadsheetId=spreadsheet_id,
                     range=f"{sheet_name}!A:A"
-                ).execute()
+                ), hoja=sheet_name)
                 
                 # Determinar la próxima fila (la cantidad de filas actuales + 1)
                 next_row = len(response.get('values', [])) + 1
-                logger.info(f"Siguiente fila disponible: {next_row}")
+                logger.info("Siguiente fila disponible: %s", next_row)
                 
                 # Actualizar esa fila específica
-                update_response = service.spreadsheets().values().update(
+                update_response = ejecutar(service.spreadsheets().values().update(
                     spreadsheetId=spreadsheet_id,
-                    range=f"{sheet_name}!A{next_row}:Z{next_row}",
+                    range=row_range(sheet_name, next_row),
                     valueInputOption="USER_ENTERED",
                     body={"values": [row_data]}
-                ).execute()
+                ), hoja=sheet_name)
                 
-                logger.info(f"Datos añadidos correctamente a '{sheet_name}' en la fila {next_row} usando método de respaldo")
+                logger.info("Datos añadidos correctamente a '%s' en la fila %s usando método de respaldo", sheet_name, next_row)
+                invalidar_cache_lecturas(sheet_name)
                 return True
             except Exception as backup_error:
-                logger.error(f"Error con método de respaldo: {backup_error}")
+                logger.error("Error con método de respaldo: %s", backup_error)
                 
                 # Último intento: crear fila por fila manualmente (enfoque extremadamente básico)
                 try:
@@ -372,19 +521,22 @@ def append_data(sheet_name, data):
                     }
                     
                     # Realizar la solicitud POST
-                    response = requests.post(url, json=data_to_send, headers=headers)
+                    with medir("sheets.values.append_http", hoja=sheet_name) as medicion:
+                        response = requests.post(url, json=data_to_send, headers=headers)
+                        medicion.error = response.status_code != 200
                     
                     if response.status_code == 200:
-                        logger.info(f"Datos añadidos correctamente a '{sheet_name}' usando método de último recurso")
+                        logger.info("Datos añadidos correctamente a '%s' usando método de último recurso", sheet_name)
+                        invalidar_cache_lecturas(sheet_name)
                         return True
                     else:
-                        logger.error(f"Error con método de último recurso: {response.text}")
+                        logger.error("Error con método de último recurso: %s", response.text)
                         return False
                 except Exception as final_error:
-                    logger.error(f"Error con método de último recurso: {final_error}")
+                    logger.error("Error con método de último recurso: %s", final_error)
                     return False
     except Exception as e:
-        logger.error(f"Error global al añadir datos a {sheet_name}: {e}")
+        logger.error("Error global al añadir datos a %s: %s", sheet_name, e)
         return False
 
 def update_cell(sheet_name, row_index, column_name, value):
@@ -401,7 +553,7 @@ def update_cell(sheet_name, row_index, column_name, value):
         bool: True si se actualizó correctamente, False en caso contrario
     """
     if sheet_name not in HEADERS:
-        logger.error(f"Nombre de hoja inválido: {sheet_name}")
+        logger.error("Nombre de hoja inválido: %s", sheet_name)
         raise ValueError(f"Nombre de hoja inválido: {sheet_name}")
     
     try:
@@ -411,7 +563,7 @@ def update_cell(sheet_name, row_index, column_name, value):
         # Obtener índice de la columna
         headers = HEADERS[sheet_name]
         if column_name not in headers:
-            logger.error(f"Nombre de columna inválido: {column_name}")
+            logger.error("Nombre de columna inválido: %s", column_name)
             raise ValueError(f"Nombre de columna inválido: {column_name}")
         
         column_index = headers.index(column_name)
@@ -420,15 +572,14 @@ def update_cell(sheet_name, row_index, column_name, value):
         # Fila 1 son las cabeceras, los datos comienzan en la fila 2
         real_row = row_index + 2
         
-        # Convertir índice de columna a letra de columna de Excel (A, B, C, ...)
-        column_letter = chr(65 + column_index)  # 65 es el código ASCII para 'A'
-        cell_reference = f"{column_letter}{real_row}"
+        # Letra de columna precalculada (A, B, ..., Z, AA, ...)
+        cell_reference = f"{get_column_letter(sheet_name, column_name)}{real_row}"
         
         # Pre-procesamiento para campos específicos
         if (sheet_name == 'adelantos' and column_name == 'fecha') or column_name == 'fecha':
             value = format_date_for_sheets(value)
         
-        logger.info(f"Actualizando celda {cell_reference} en hoja '{sheet_name}' con valor: {value}")
+        logger.info("Actualizando celda %s en hoja '%s' con valor: %s", cell_reference, sheet_name, value)
         
         # ENFOQUE MÁS ROBUSTO: Usar batchUpdate con updateCells
         try:
@@ -436,7 +587,7 @@ def update_cell(sheet_name, row_index, column_name, value):
             sheet_id = get_sheet_id(sheet_name)
             
             if sheet_id is None:
-                logger.error(f"No se pudo encontrar el ID de la hoja '{sheet_name}'")
+                logger.error("No se pudo encontrar el ID de la hoja '%s'", sheet_name)
                 return False
             
             # 2. Crear la solicitud de actualización usando updateCells
@@ -469,93 +620,322 @@ def update_cell(sheet_name, row_index, column_name, value):
             }
             
             # 3. Ejecutar la solicitud
-            response = service.spreadsheets().batchUpdate(
+            response = ejecutar(service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
                 body=request_body
-            ).execute()
+            ), hoja=sheet_name)
             
-            logger.info(f"Celda actualizada correctamente con batchUpdate: {sheet_name}!{cell_reference}")
+            logger.info("Celda actualizada correctamente con batchUpdate: %s!%s", sheet_name, cell_reference)
+            invalidar_cache_lecturas(sheet_name)
             return True
         except Exception as e:
-            logger.error(f"Error al actualizar celda con batchUpdate: {e}")
+            logger.error("Error al actualizar celda con batchUpdate: %s", e)
             
             # Método alternativo de respaldo
             try:
                 logger.info("Intentando método alternativo para actualizar celda...")
                 
                 # Usar el método tradicional values().update()
-                service.spreadsheets().values().update(
+                ejecutar(service.spreadsheets().values().update(
                     spreadsheetId=spreadsheet_id,
                     range=f"{sheet_name}!{cell_reference}",
                     valueInputOption="USER_ENTERED",
                     body={"values": [[value]]}
-                ).execute()
+                ), hoja=sheet_name)
                 
-                logger.info(f"Celda actualizada correctamente con método alternativo: {sheet_name}!{cell_reference}")
+                logger.info("Celda actualizada correctamente con método alternativo: %s!%s", sheet_name, cell_reference)
+                invalidar_cache_lecturas(sheet_name)
                 return True
             except Exception as backup_error:
-                logger.error(f"Error con método alternativo para actualizar celda: {backup_error}")
+                logger.error("Error con método alternativo para actualizar celda: %s", backup_error)
                 return False
     except Exception as e:
-        logger.error(f"Error global al actualizar celda: {e}")
+        logger.error("Error global al actualizar celda: %s", e)
         return False
 
-def get_all_data(sheet_name):
+def update_cells(sheet_name, updates):
+    """
+    Actualiza varias celdas de una hoja en una sola llamada batchUpdate.
+
+    Args:
+        sheet_name: Nombre de la hoja
+        updates: Lista de tuplas (row_index, column_name, value); row_index basado en 0
+                 para las filas de datos, igual que en update_cell
+
+    Returns:
+        bool: True si se actualizaron todas las celdas, False en caso contrario
+    """
+    if sheet_name not in HEADERS:
+        logger.error("Nombre de hoja inválido: %s", sheet_name)
+        raise ValueError(f"Nombre de hoja inválido: {sheet_name}")
+
+    if not updates:
+        return True
+
+    headers = HEADERS[sheet_name]
+    for _, column_name, _ in updates:
+        if column_name not in headers:
+            logger.error("Nombre de columna inválido: %s", column_name)
+            raise ValueError(f"Nombre de columna inválido: {column_name}")
+
+    try:
+        spreadsheet_id = get_or_create_sheet()
+        service = get_sheet_service()
+
+        sheet_id = get_sheet_id(sheet_name)
+        if sheet_id is None:
+            logger.error("No se pudo encontrar el ID de la hoja '%s'", sheet_name)
+            return False
+
+        requests_body = []
+        for row_index, column_name, value in updates:
+            column_index = headers.index(column_name)
+            real_row = row_index + 2
+
+            if column_name == 'fecha':
+                value = format_date_for_sheets(value)
+
+            requests_body.append({
+                "updateCells": {
+                    "range": {
+                        "sheetId": sheet_id,
+                        "startRowIndex": real_row - 1,
+                        "endRowIndex": real_row,
+                        "startColumnIndex": column_index,
+                        "endColumnIndex": column_index + 1
+                    },
+                    "rows": [
+                        {
+                            "values": [
+                                {
+                                    "userEnteredValue": {
+                                        "stringValue": str(value) if value is not None else ""
+                                    }
+                                }
+                            ]
+                        }
+                    ],
+                    "fields": "userEnteredValue"
+                }
+            })
+
+        ejecutar(service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": requests_body}
+        ), hoja=sheet_name)
+
+        logger.info("Actualizadas %s celdas en '%s' con un solo batchUpdate", len(updates), sheet_name)
+        invalidar_cache_lecturas(sheet_name)
+        return True
+    except Exception as e:
+        logger.error("Error al actualizar celdas en lote en '%s': %s", sheet_name, e)
+        return False
+
+def read_cells(sheet_name, cells):
+    """
+    Lee el valor actual de varias celdas con un solo batchGet, sin pasar por la lectura completa de la hoja.
+
+    Args:
+        sheet_name: Nombre de la hoja
+        cells: Lista de tuplas (row_index, column_name); row_index basado en 0 para las filas de datos
+
+    Returns:
+        List[str]: Valores en el mismo orden que cells ("" para celdas vacías)
+    """
+    if sheet_name not in HEADERS:
+        logger.error("Nombre de hoja inválido: %s", sheet_name)
+        raise ValueError(f"Nombre de hoja inválido: {sheet_name}")
+
+    if not cells:
+        return []
+
+    ranges = [cell_range(sheet_name, row_index, column_name) for row_index, column_name in cells]
+
+    result = ejecutar(get_sheet_service().spreadsheets().values().batchGet(
+        spreadsheetId=get_or_create_sheet(),
+        ranges=ranges
+    ), hoja=sheet_name)
+
+    values = []
+    for value_range in result.get('valueRanges', []):
+        rows = value_range.get('values', [])
+        values.append(rows[0][0] if rows and rows[0] else "")
+    return values
+
+def get_column_values(sheet_name, column_name):
+    """
+    Lee solo una columna de la hoja (sin la cabecera), útil para índices por ID.
+
+    Args:
+        sheet_name: Nombre de la hoja
+        column_name: Nombre de la columna
+
+    Returns:
+        List[str]: Valores de la columna por fila de datos ("" para celdas vacías)
+    """
+    if sheet_name not in HEADERS:
+        logger.error("Nombre de hoja inválido: %s", sheet_name)
+        raise ValueError(f"Nombre de hoja inválido: {sheet_name}")
+
+    result = ejecutar(get_sheet_service().spreadsheets().values().get(
+        spreadsheetId=get_or_create_sheet(),
+        range=column_range(sheet_name, column_name)
+    ), hoja=sheet_name)
+
+    return [row[0] if row else "" for row in result.get('values', [])]
+
+def mismo_valor(actual, esperado):
+    """
+    Compara dos valores de celda tolerando diferencias de formato numérico ("150" y "150.0").
+
+    Args:
+        actual: Valor leído de la hoja
+        esperado: Valor que se esperaba encontrar
+
+    Returns:
+        bool: True si representan el mismo valor
+    """
+    actual_str = str(actual if actual is not None else "").strip().lstrip("'")
+    esperado_str = str(esperado if esperado is not None else "").strip().lstrip("'")
+    if actual_str == esperado_str:
+        return True
+    try:
+        return abs(float(actual_str.replace(',', '.')) - float(esperado_str.replace(',', '.'))) < 1e-9
+    except ValueError:
+        return False
+
+def update_cells_if_unchanged(sheet_name, esperados, updates):
+    """
+    Compare-before-write en lote: lee con un solo batchGet las celdas que se usaron para
+    planificar, comprueba que siguen con los valores planificados y escribe con un solo
+    batchUpdate. Así otro proceso o una edición manual de la hoja no se pisan en silencio.
+
+    Args:
+        sheet_name: Nombre de la hoja
+        esperados: Lista de tuplas (row_index, column_name, valor leído al planificar)
+        updates: Lista de tuplas (row_index, column_name, value) a escribir
+
+    Returns:
+        bool: True si se escribió, False si la escritura falló
+
+    Raises:
+        ConflictoConcurrencia: Si alguna celda ya no tiene el valor planificado
+                               (con los valores vigentes en `actuales`)
+    """
+    actuales = read_cells(sheet_name, [(row_index, column_name) for row_index, column_name, _ in esperados])
+    distintos = [
+        f"{column_name} fila {row_index + 2}: se esperaba '{esperado}' y hay '{actual}'"
+        for (row_index, column_name, esperado), actual in zip(esperados, actuales)
+        if not mismo_valor(actual, esperado)
+    ]
+    if distintos:
+        raise ConflictoConcurrencia(f"{sheet_name}: " + "; ".join(distintos), actuales=actuales)
+    return update_cells(sheet_name, updates)
+
+def update_cell_if_unchanged(sheet_name, row_index, column_name, expected, value):
+    """
+    Actualiza una celda solo si su valor actual coincide con el esperado (compare-before-write).
+
+    Args:
+        sheet_name: Nombre de la hoja
+        row_index: Índice de la fila (basado en 0 para las filas de datos)
+        column_name: Nombre de la columna
+        expected: Valor que se leyó antes de calcular el nuevo valor
+        value: Nuevo valor para la celda
+
+    Returns:
+        bool: True si se actualizó, False si la escritura falló
+
+    Raises:
+        ConflictoConcurrencia: Si otro escritor modificó la celda
+    """
+    return update_cells_if_unchanged(
+        sheet_name, [(row_index, column_name, expected)], [(row_index, column_name, value)]
+    )
+
+def get_all_data(sheet_name, usar_cache=True):
     """
     Obtiene todos los datos de la hoja especificada.
     
     Args:
         sheet_name: Nombre de la hoja
+        usar_cache: Si es False se lee siempre de la hoja (para decisiones que
+                    deben ver el valor vigente, como descontar stock)
         
     Returns:
         List[Dict]: Lista de diccionarios con los datos
     """
     if sheet_name not in HEADERS:
-        logger.error(f"Nombre de hoja inválido: {sheet_name}")
+        logger.error("Nombre de hoja inválido: %s", sheet_name)
         raise ValueError(f"Nombre de hoja inválido: {sheet_name}")
     
+    if usar_cache:
+        rows = _leer_de_cache(sheet_name)
+        if rows is not None:
+            return rows
+    
     try:
         spreadsheet_id = get_or_create_sheet()
         sheets = get_sheet_service()
         
-        range_name = f"{sheet_name}!A:Z"
+        range_name = sheet_range(sheet_name)
         
         # Usar la llamada directa a sheets.spreadsheets().values().get()
         result = None
         try:
-            result = sheets.spreadsheets().values().get(
+            result = ejecutar(sheets.spreadsheets().values().get(
                 spreadsheetId=spreadsheet_id,
                 range=range_name
-            ).execute()
+            ), hoja=sheet_name)
         except Exception as e:
-            logger.error(f"Error al ejecutar values().get() para {sheet_name}: {e}")
+            logger.error("Error al ejecutar values().get() para %s: %s", sheet_name, e)
             # Si hay un error específico con values(), intentar otra aproximación
             return handle_values_attribute_error(sheet_name, spreadsheet_id, sheets)
         
         values = result.get('values', [])
         
         if not values:
-            logger.info(f"No hay datos en la hoja '{sheet_name}'")
+            logger.info("No hay datos en la hoja '%s'", sheet_name)
+            _guardar_en_cache(sheet_name, [])
             return []
         
         # Convertir filas a diccionarios usando las cabeceras
-        headers = values[0]
-        rows = []
-        
-        for i, row in enumerate(values[1:]):  # Saltar la fila de cabeceras
-            # Asegurarse de que la fila tenga la misma longitud que las cabeceras
-            row_padded = row + [""] * (len(headers) - len(row))
-            # Añadir el _row_index para referencia futura (basado en 0)
-            row_dict = dict(zip(headers, row_padded))
-            row_dict['_row_index'] = i
-            rows.append(row_dict)
+        rows = _filas_a_diccionarios(values)
+        _guardar_en_cache(sheet_name, rows)
         
-        logger.info(f"Obtenidos {len(rows)} registros de '{sheet_name}'")
-        return rows
+        logger.info("Obtenidos %s registros de '%s'", len(rows), sheet_name)
+        return [dict(row) for row in rows]
     except Exception as e:
-        logger.error(f"Error al obtener datos de {sheet_name}: {e}")
+        logger.error("Error al obtener datos de %s: %s", sheet_name, e)
         return []
 
+def precargar_hojas(sheet_names):
+    """
+    Lee varias hojas completas con un solo batchGet y las deja en la caché de lecturas.
+    
+    Args:
+        sheet_names: Lista de nombres de hojas
+        
+    Returns:
+        Dict[str, int]: Número de filas cargadas por hoja
+    """
+    sheet_names = [sheet_name for sheet_name in sheet_names if sheet_name in HEADERS]
+    if not sheet_names:
+        return {}
+    
+    result = ejecutar(get_sheet_service().spreadsheets().values().batchGet(
+        spreadsheetId=get_or_create_sheet(),
+        ranges=[sheet_range(sheet_name) for sheet_name in sheet_names]
+    ))
+    
+    cargadas = {}
+    for sheet_name, value_range in zip(sheet_names, result.get('valueRanges', [])):
+        rows = _filas_a_diccionarios(value_range.get('values', []))
+        _guardar_en_cache(sheet_name, rows)
+        cargadas[sheet_name] = len(rows)
+    logger.info("Hojas precargadas en caché: %s", cargadas)
+    return cargadas
+
 def handle_values_attribute_error(sheet_name, spreadsheet_id, sheets_service):
     """
     Maneja el error 'Resource' object has no attribute 'values'.
@@ -568,11 +948,11 @@ def handle_values_attribute_error(sheet_name, spreadsheet_id, sheets_service):
     Returns:
         List[Dict]: Lista de diccionarios con los datos
     """
-    logger.info(f"Usando método alternativo para obtener datos de la hoja '{sheet_name}'")
+    logger.info("Usando método alternativo para obtener datos de la hoja '%s'", sheet_name)
     
     try:
         # 1. Obtener metadatos de la hoja
-        sheet_metadata = sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+        sheet_metadata = ejecutar(sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id), hoja=sheet_name)
         target_sheet = None
         
         # Buscar la hoja específica
@@ -582,27 +962,27 @@ def handle_values_attribute_error(sheet_name, spreadsheet_id, sheets_service):
                 break
         
         if not target_sheet:
-            logger.warning(f"No se encontró la hoja '{sheet_name}' en el spreadsheet")
+            logger.warning("No se encontró la hoja '%s' en el spreadsheet", sheet_name)
             return []
         
         # 2. Usar batchGet para obtener datos
         # Este método es más robusto y evita usar directamente el atributo 'values'
-        result = sheets_service.spreadsheets().values().batchGet(
+        result = ejecutar(sheets_service.spreadsheets().values().batchGet(
             spreadsheetId=spreadsheet_id,
-            ranges=[f"{sheet_name}!A:Z"]
-        ).execute()
+            ranges=[sheet_range(sheet_name)]
+        ), hoja=sheet_name)
         
         # Extraer los valores del resultado
         value_ranges = result.get('valueRanges', [])
         if not value_ranges or 'values' not in value_ranges[0]:
-            logger.warning(f"No se encontraron datos en la hoja '{sheet_name}'")
+            logger.warning("No se encontraron datos en la hoja '%s'", sheet_name)
             return []
         
         values = value_ranges[0]['values']
         
         # Procesar los valores como antes
         if not values:
-            logger.info(f"No hay datos en la hoja '{sheet_name}'")
+            logger.info("No hay datos en la hoja '%s'", sheet_name)
             return []
         
         # Convertir filas a diccionarios usando las cabeceras
@@ -617,14 +997,14 @@ def handle_values_attribute_error(sheet_name, spreadsheet_id, sheets_service):
             row_dict['_row_index'] = i
             rows.append(row_dict)
         
-        logger.info(f"Obtenidos {len(rows)} registros de '{sheet_name}' usando método alternativo")
+        logger.info("Obtenidos %s registros de '%s' usando método alternativo", len(rows), sheet_name)
         return rows
         
     except Exception as e:
-        logger.error(f"Error en método alternativo para obtener datos: {e}")
+        logger.error("Error en método alternativo para obtener datos: %s", e)
         return []
 
-def get_filtered_data(sheet_name, filters=None, days=None):
+def get_filtered_data(sheet_name, filters=None, days=None, usar_cache=True):
     """
     Obtiene datos filtrados de la hoja especificada.
     
@@ -632,11 +1012,12 @@ def get_filtered_data(sheet_name, filters=None, days=None):
         sheet_name: Nombre de la hoja
         filters: Diccionario de filtros campo:valor
         days: Si se proporciona, filtra por entradas en los últimos X días
+        usar_cache: Si es False se lee siempre de la hoja
         
     Returns:
         List[Dict]: Lista de diccionarios con los datos filtrados
     """
-    all_data = get_all_data(sheet_name)
+    all_data = get_all_data(sheet_name, usar_cache=usar_cache)
     
     if not all_data:
         return []
@@ -666,7 +1047,7 @@ def get_filtered_data(sheet_name, filters=None, days=None):
         # TODO: Implementar filtrado por fecha
         pass
     
-    logger.info(f"Filtrado: de {len(all_data)} registros a {len(filtered_data)} registros")
+    logger.debug("Filtrado: de %s registros a %s registros", len(all_data), len(filtered_data))
     return filtered_data
 
 
@@ -692,8 +1073,8 @@ def buscar_proveedor(nombre: str) -> dict | None:
             return None
 
         # Log the actual column names from the sheet so we can debug mismatches
-        logger.info(f"[PROVEEDOR] Columnas disponibles en la hoja: {list(proveedores[0].keys())}")
-        logger.info(f"[PROVEEDOR] Buscando: '{nombre}'")
+        logger.info("[PROVEEDOR] Columnas disponibles en la hoja: %s", list(proveedores[0].keys()))
+        logger.info("[PROVEEDOR] Buscando: '%s'", nombre)
 
         nombre_norm = nombre.strip().lower()
 
@@ -717,30 +1098,30 @@ def buscar_proveedor(nombre: str) -> dict | None:
         # 1. Exact match
         for p in proveedores:
             if _get_name(p) == nombre_norm:
-                logger.info(f"[PROVEEDOR] Encontrado (exacto): {p}")
+                logger.info("[PROVEEDOR] Encontrado (exacto): %s", p)
                 return _normalize_proveedor(p)
 
         # 2. Substring: user input inside provider name
         for p in proveedores:
             if nombre_norm in _get_name(p):
-                logger.info(f"[PROVEEDOR] Encontrado (subcadena): {p}")
+                logger.info("[PROVEEDOR] Encontrado (subcadena): %s", p)
                 return _normalize_proveedor(p)
 
         # 3. Substring: provider name inside user input
         for p in proveedores:
             if _get_name(p) in nombre_norm:
-                logger.info(f"[PROVEEDOR] Encontrado (subcadena inversa): {p}")
+                logger.info("[PROVEEDOR] Encontrado (subcadena inversa): %s", p)
                 return _normalize_proveedor(p)
 
         # 4. Any word from user input matches any word in provider name
         for p in proveedores:
             prov_words = _words(_get_name(p)) - {""}
             if user_words & prov_words:
-                logger.info(f"[PROVEEDOR] Encontrado (palabra): {p}")
+                logger.info("[PROVEEDOR] Encontrado (palabra): %s", p)
                 return _normalize_proveedor(p)
 
-        logger.warning(f"[PROVEEDOR] '{nombre}' no encontrado en la hoja.")
+        logger.warning("[PROVEEDOR] '%s' no encontrado en la hoja.", nombre)
         return None
     except Exception as e:
-        logger.error(f"Error buscando proveedor '{nombre}': {e}")
+        logger.error("Error buscando proveedor '%s': %s", nombre, e)
         return None
\ No newline at end of file
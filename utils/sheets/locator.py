@@ -0,0 +1,171 @@
+"""
+Módulo para localizar filas por su ID en lugar de por la posición leída en un momento dado.
+Mantiene un índice id -> fila por hoja que se verifica con una lectura de una sola celda
+antes de usarlo y se reconstruye cuando la hoja cambió de estructura (filas insertadas,
+ordenadas o eliminadas).
+"""
+import logging
+import threading
+
+from utils.sheets.constants import HEADERS
+from utils.sheets.core import read_cells, update_cells, update_cells_if_unchanged, get_column_values
+from utils.sheets.locks import bloquear_recursos, ConflictoConcurrencia
+from utils.sheets.utils import generate_unique_id
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Índices id -> row_index (basado en 0 para las filas de datos) por hoja
+_indices = {}
+_indices_lock = threading.Lock()
+
+# Prefijos de ID para hojas cuyas filas antiguas pueden no tener ID
+PREFIJOS_ID = {
+    "compras": "CP-",
+    "almacen": "AL-",
+    "adelantos": "AD-",
+}
+
+def invalidar_indice(sheet_name=None):
+    """
+    Descarta el índice de una hoja (o de todas) para que se reconstruya en el próximo uso.
+
+    Args:
+        sheet_name: Nombre de la hoja, o None para todas
+    """
+    with _indices_lock:
+        if sheet_name is None:
+            _indices.clear()
+        else:
+            _indices.pop(sheet_name, None)
+
+def _reconstruir_indice(sheet_name):
+    """
+    Lee solo la columna 'id' de la hoja y reconstruye su índice.
+
+    Args:
+        sheet_name: Nombre de la hoja
+
+    Returns:
+        Dict[str, int]: Índice id -> row_index
+    """
+    ids = get_column_values(sheet_name, 'id')
+    indice = {}
+    for row_index, valor in enumerate(ids):
+        valor = str(valor).strip()
+        if valor:
+            indice[valor] = row_index
+    with _indices_lock:
+        _indices[sheet_name] = indice
+    logger.info("Índice de IDs reconstruido para '%s': %s filas", sheet_name, len(indice))
+    return indice
+
+def localizar_filas(sheet_name, registro_ids):
+    """
+    Obtiene las filas actuales de varios registros a partir de sus IDs.
+    Las posiciones cacheadas se verifican con un solo batchGet de la columna 'id';
+    si alguna no coincide o falta, el índice se reconstruye una vez.
+
+    Args:
+        sheet_name: Nombre de la hoja (debe tener columna 'id')
+        registro_ids: IDs de los registros
+
+    Returns:
+        Dict[str, int]: ID -> row_index actual (basado en 0 para las filas de datos);
+                        los IDs que no existen en la hoja no aparecen
+    """
+    if 'id' not in HEADERS.get(sheet_name, []):
+        raise ValueError(f"La hoja '{sheet_name}' no tiene columna 'id'")
+
+    registro_ids = [str(registro_id).strip() for registro_id in registro_ids]
+    registro_ids = [registro_id for registro_id in registro_ids if registro_id]
+    if not registro_ids:
+        return {}
+
+    with _indices_lock:
+        indice = _indices.get(sheet_name, {})
+        cacheadas = {registro_id: indice.get(registro_id) for registro_id in registro_ids}
+
+    # Verificar las posiciones cacheadas con una lectura de una celda por registro
+    if all(row_index is not None for row_index in cacheadas.values()):
+        leidos = read_cells(sheet_name, [(row_index, 'id') for row_index in cacheadas.values()])
+        if all(str(leido).strip() == registro_id for registro_id, leido in zip(cacheadas, leidos)):
+            return cacheadas
+        logger.info("Índice de '%s' desactualizado, reconstruyendo", sheet_name)
+
+    indice = _reconstruir_indice(sheet_name)
+    return {registro_id: indice[registro_id] for registro_id in registro_ids if registro_id in indice}
+
+def localizar_fila(sheet_name, registro_id):
+    """
+    Obtiene la fila actual de un registro a partir de su ID.
+
+    Args:
+        sheet_name: Nombre de la hoja (debe tener columna 'id')
+        registro_id: ID del registro
+
+    Returns:
+        Optional[int]: row_index actual (basado en 0 para las filas de datos) o None si no existe
+    """
+    return localizar_filas(sheet_name, [registro_id]).get(str(registro_id).strip())
+
+def update_by_id(sheet_name, registro_id, changes):
+    """
+    Actualiza columnas de un registro identificado por su ID, sin depender de _row_index.
+
+    Args:
+        sheet_name: Nombre de la hoja (debe tener columna 'id')
+        registro_id: ID del registro
+        changes: Diccionario columna -> nuevo valor
+
+    Returns:
+        bool: True si se actualizó correctamente, False en caso contrario
+    """
+    try:
+        with bloquear_recursos(f"{sheet_name}:{registro_id}"):
+            row_index = localizar_fila(sheet_name, registro_id)
+            if row_index is None:
+                logger.error("No se encontró el registro '%s' en la hoja '%s'", registro_id, sheet_name)
+                return False
+            return update_cells(sheet_name, [(row_index, column, value) for column, value in changes.items()])
+    except Exception as e:
+        logger.error("Error al actualizar '%s' en '%s': %s", registro_id, sheet_name, e)
+        return False
+
+def asegurar_id(sheet_name, registro):
+    """
+    Devuelve el ID de un registro recién leído, asignándole uno si la fila no lo tiene
+    (filas creadas antes de que la hoja tuviera columna 'id').
+    El ID solo se escribe si la fila sigue sin ID y conserva la fecha y el proveedor
+    leídos, para no marcar otra fila si la hoja se reordenó desde la lectura.
+
+    Args:
+        sheet_name: Nombre de la hoja
+        registro: Diccionario leído con get_all_data (incluye _row_index)
+
+    Returns:
+        str: ID del registro, o cadena vacía si no se pudo asignar
+    """
+    registro_id = str(registro.get('id', '')).strip()
+    if registro_id:
+        return registro_id
+
+    row_index = registro.get('_row_index')
+    if row_index is None:
+        return ""
+
+    columnas = [columna for columna in ('fecha', 'proveedor') if columna in HEADERS.get(sheet_name, [])]
+    esperados = [(row_index, 'id', '')] + [(row_index, columna, registro.get(columna, '')) for columna in columnas]
+    nuevo_id = generate_unique_id(PREFIJOS_ID.get(sheet_name, "ID-"))
+    try:
+        if not update_cells_if_unchanged(sheet_name, esperados, [(row_index, 'id', nuevo_id)]):
+            return ""
+    except ConflictoConcurrencia as e:
+        logger.warning("No se asignó ID a la fila %s de '%s', cambió desde la lectura: %s", row_index + 2, sheet_name, e)
+        return ""
+
+    registro['id'] = nuevo_id
+    with _indices_lock:
+        _indices.setdefault(sheet_name, {})[nuevo_id] = row_index
+    logger.info("Asignado ID %s a fila %s de '%s'", nuevo_id, row_index + 2, sheet_name)
+    return nuevo_id
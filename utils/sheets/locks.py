@@ -0,0 +1,59 @@
+"""
+Módulo con bloqueos por recurso para serializar escrituras concurrentes en las hojas.
+Cada recurso (por ejemplo una fase del almacén o la fila de un adelanto) tiene su propio
+lock, de modo que solo se esperan entre sí los escritores que tocan los mismos datos.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Locks por recurso y lock que protege el diccionario
+_locks = {}
+_locks_guard = threading.Lock()
+
+class ConflictoConcurrencia(Exception):
+    """
+    El valor de una celda cambió entre la lectura y la escritura.
+    `actuales` trae los valores vigentes leídos al comparar, para reintentar sin otra lectura.
+    """
+
+    def __init__(self, mensaje, actuales=None):
+        super().__init__(mensaje)
+        self.actuales = actuales or []
+
+def get_lock(recurso):
+    """
+    Obtiene el lock asociado a un recurso, creándolo si es necesario.
+
+    Args:
+        recurso: Identificador del recurso (ej. "almacen:PERGAMINO", "adelantos:12")
+
+    Returns:
+        threading.RLock: Lock del recurso
+    """
+    with _locks_guard:
+        lock = _locks.get(recurso)
+        if lock is None:
+            lock = threading.RLock()
+            _locks[recurso] = lock
+        return lock
+
+@contextmanager
+def bloquear_recursos(*recursos):
+    """
+    Adquiere los locks de varios recursos en orden fijo para evitar interbloqueos.
+
+    Args:
+        recursos: Identificadores de los recursos a bloquear
+    """
+    locks = [get_lock(recurso) for recurso in sorted(set(recursos))]
+    for lock in locks:
+        lock.acquire()
+    try:
+        yield
+    finally:
+        for lock in reversed(locks):
+            lock.release()
@@ -49,7 +49,7 @@ def calcular_merma_sugerida(origen, destino, cantidad):
         
         return 0.0
     except Exception as e:
-        logger.error(f"Error al calcular merma sugerida: {e}")
+        logger.error("Error al calcular merma sugerida: %s", e)
         return 0.0
 
 def actualizar_almacen_desde_proceso(origen, destino, cantidad, merma):
@@ -66,7 +66,7 @@ def actualizar_almacen_desde_proceso(origen, destino, cantidad, merma):
         bool: True si se actualizó correctamente, False en caso contrario
     """
     try:
-        logger.info(f"Actualizando almacén desde proceso - Origen: {origen}, Destino: {destino}, Cantidad: {cantidad} kg, Merma: {merma} kg")
+        logger.info("Actualizando almacén desde proceso - Origen: %s, Destino: %s, Cantidad: %s kg, Merma: %s kg", origen, destino, cantidad, merma)
         
         # 1. Restar la cantidad procesada de la fase de origen
         resultado_origen = update_almacen(
@@ -93,5 +93,5 @@ def actualizar_almacen_desde_proceso(origen, destino, cantidad, merma):
         
         return resultado_origen and resultado_destino
     except Exception as e:
-        logger.error(f"Error al actualizar almacén desde proceso: {e}")
+        logger.error("Error al actualizar almacén desde proceso: %s", e)
         return False
\ No newline at end of file
@@ -3,18 +3,100 @@ Módulo para gestionar la conexión con el servicio de Google Sheets.
 """
 import json
 import logging
+import os
+import threading
 from typing import Any
-import googleapiclient.discovery
-from google.oauth2 import service_account
 from config import SPREADSHEET_ID, GOOGLE_CREDENTIALS
+from utils.metricas import ejecutar
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Ámbitos de la API de Google Sheets
+SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
 # Variables globales para el servicio de Google Sheets
 _sheet_service = None
+# Información de la cuenta de servicio ya parseada y credenciales por conjunto de ámbitos
+_credentials_info = None
+_credentials = {}
+_service_lock = threading.Lock()
 # Variable para controlar la inicialización
 _sheets_initialized = False
+# Caché de IDs internos de las hojas (título -> sheetId)
+_sheet_ids = {}
+
+def load_credentials(scopes):
+    """
+    Obtiene las credenciales de la cuenta de servicio para los ámbitos indicados.
+    GOOGLE_CREDENTIALS (JSON o ruta a archivo) se parsea una sola vez por proceso.
+    
+    Args:
+        scopes: Lista de ámbitos OAuth
+        
+    Returns:
+        service_account.Credentials: Credenciales con los ámbitos solicitados
+    """
+    global _credentials_info
+    # Importación diferida: google-auth solo se carga al construir el primer cliente
+    from google.oauth2 import service_account
+    
+    key = tuple(sorted(scopes))
+    with _service_lock:
+        if key in _credentials:
+            return _credentials[key]
+        
+        if _credentials_info is None:
+            if not GOOGLE_CREDENTIALS:
+                raise ValueError("Credenciales de Google no configuradas")
+            # Si GOOGLE_CREDENTIALS es un string JSON, cargarlo como un dict
+            if GOOGLE_CREDENTIALS.lstrip().startswith('{') or not os.path.exists(GOOGLE_CREDENTIALS):
+                _credentials_info = json.loads(GOOGLE_CREDENTIALS)
+            else:
+                # Si es un path a un archivo, cargarlo
+                with open(GOOGLE_CREDENTIALS, 'r') as f:
+                    _credentials_info = json.load(f)
+        
+        credentials = service_account.Credentials.from_service_account_info(_credentials_info, scopes=list(scopes))
+        _credentials[key] = credentials
+        return credentials
+
+def build_service(api, version, scopes):
+    """
+    Construye un cliente de la API de Google reutilizable desde varios hilos.
+    Usa el documento de descubrimiento incluido en la librería (sin descargarlo ni
+    escribir caché) y crea un transporte HTTP autorizado por cada solicitud, porque
+    httplib2 no es seguro para uso concurrente.
+    
+    Args:
+        api: Nombre de la API (ej. 'sheets', 'drive')
+        version: Versión de la API (ej. 'v4', 'v3')
+        scopes: Lista de ámbitos OAuth
+        
+    Returns:
+        El recurso de la API construido
+    """
+    # Importación diferida: googleapiclient/httplib2 tardan en importarse y no se
+    # necesitan hasta la primera llamada a la API
+    import googleapiclient.discovery
+    import googleapiclient.http
+    import google_auth_httplib2
+    import httplib2
+    
+    credentials = load_credentials(scopes)
+    
+    def build_request(http, *args, **kwargs):
+        new_http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+        return googleapiclient.http.HttpRequest(new_http, *args, **kwargs)
+    
+    return googleapiclient.discovery.build(
+        api,
+        version,
+        http=google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http()),
+        requestBuilder=build_request,
+        static_discovery=True,
+        cache_discovery=False
+    )
 
 def get_sheet_service():
     """
@@ -27,24 +109,13 @@ def get_sheet_service():
     
     if _sheet_service is None:
         try:
-            # Si GOOGLE_CREDENTIALS es un string JSON, cargarlo como un dict
-            if GOOGLE_CREDENTIALS.startswith('{'):
-                credentials_info = json.loads(GOOGLE_CREDENTIALS)
-            else:
-                # Si es un path a un archivo, cargarlo
-                with open(GOOGLE_CREDENTIALS, 'r') as f:
-                    credentials_info = json.load(f)
-            
-            # Crear credenciales a partir de la información
-            credentials = service_account.Credentials.from_service_account_info(
-                credentials_info, scopes=['https://www.googleapis.com/auth/spreadsheets']
-            )
-            
-            # Crear servicio
-            _sheet_service = googleapiclient.discovery.build('sheets', 'v4', credentials=credentials)
-            logger.info("Servicio de Google Sheets inicializado correctamente")
+            service = build_service('sheets', 'v4', SHEETS_SCOPES)
+            with _service_lock:
+                if _sheet_service is None:
+                    _sheet_service = service
+                    logger.info("Servicio de Google Sheets inicializado correctamente")
         except Exception as e:
-            logger.error(f"Error al inicializar el servicio de Google Sheets: {e}")
+            logger.error("Error al inicializar el servicio de Google Sheets: %s", e)
             raise
     
     return _sheet_service
@@ -79,9 +150,44 @@ def set_sheets_initialized(value: bool):
     global _sheets_initialized
     _sheets_initialized = value
 
+def register_sheet_ids(sheet_metadata) -> dict:
+    """
+    Guarda en caché los IDs internos de las hojas a partir de los metadatos del spreadsheet.
+    
+    Args:
+        sheet_metadata: Respuesta de spreadsheets().get() o lista de 'properties' de hojas
+        
+    Returns:
+        dict: Mapa título -> sheetId de las hojas registradas
+    """
+    if isinstance(sheet_metadata, dict):
+        properties = [sheet['properties'] for sheet in sheet_metadata.get('sheets', [])]
+    else:
+        properties = sheet_metadata
+    
+    ids = {props['title']: props['sheetId'] for props in properties}
+    _sheet_ids.update(ids)
+    return ids
+
+def fetch_sheet_metadata() -> dict:
+    """
+    Lee los títulos e IDs de todas las hojas con una sola llamada y actualiza la caché.
+    
+    Returns:
+        dict: Mapa título -> sheetId de todas las hojas existentes
+    """
+    sheets = get_sheet_service()
+    sheet_metadata = ejecutar(sheets.spreadsheets().get(
+        spreadsheetId=get_or_create_sheet(),
+        fields="sheets.properties(sheetId,title)"
+    ))
+    _sheet_ids.clear()
+    return register_sheet_ids(sheet_metadata)
+
 def get_sheet_id(sheet_name: str) -> Any:
     """
     Obtiene el ID interno de una hoja específica dentro del spreadsheet.
+    Usa la caché y solo vuelve a leer los metadatos si la hoja no está registrada.
     
     Args:
         sheet_name: Nombre de la hoja
@@ -89,21 +195,14 @@ def get_sheet_id(sheet_name: str) -> Any:
     Returns:
         Any: ID interno de la hoja o None si no se encuentra
     """
+    if sheet_name in _sheet_ids:
+        return _sheet_ids[sheet_name]
+    
     try:
-        sheets = get_sheet_service()
-        spreadsheet_id = get_or_create_sheet()
-        
-        # Obtener metadatos de todas las hojas
-        sheet_metadata = sheets.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-        sheets_list = sheet_metadata.get('sheets', [])
-        
-        # Buscar la hoja específica por nombre
-        for sheet in sheets_list:
-            if sheet['properties']['title'] == sheet_name:
-                return sheet['properties']['sheetId']
-        
-        logger.warning(f"No se encontró la hoja '{sheet_name}' en el spreadsheet")
-        return None
+        sheet_id = fetch_sheet_metadata().get(sheet_name)
+        if sheet_id is None:
+            logger.warning("No se encontró la hoja '%s' en el spreadsheet", sheet_name)
+        return sheet_id
     except Exception as e:
-        logger.error(f"Error al obtener ID de la hoja '{sheet_name}': {e}")
-        return None
\ No newline at end of file
+        logger.error("Error al obtener ID de la hoja '%s': %s", sheet_name, e)
+        return None
@@ -6,6 +6,8 @@ import string
 import random
 import datetime
 
+from utils.sheets.constants import HEADERS
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
@@ -82,4 +84,108 @@ def safe_float(value):
             return float(value.replace(',', '.'))
         return 0.0
     except (ValueError, TypeError):
-        return 0.0
\ No newline at end of file
+        return 0.0
+
+# Número mínimo de columnas que se leen en rangos completos (A:Z), para no truncar
+# columnas que existan en la hoja aunque no estén en HEADERS
+_MIN_COLUMNAS_LECTURA = 26
+
+def column_letter(column_index):
+    """
+    Convierte un índice de columna (basado en 0) a su letra en notación A1 (A..Z, AA..ZZ, AAA...)
+
+    Args:
+        column_index: Índice de la columna (0 = A)
+
+    Returns:
+        str: Letra(s) de la columna
+    """
+    if column_index < 0:
+        raise ValueError(f"Índice de columna inválido: {column_index}")
+    letras = ""
+    n = column_index + 1
+    while n > 0:
+        n, resto = divmod(n - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+# Mapas cabecera -> letra de columna precalculados por hoja
+COLUMN_LETTERS = {
+    sheet_name: {header: column_letter(i) for i, header in enumerate(headers)}
+    for sheet_name, headers in HEADERS.items()
+}
+
+# Última columna que se lee/escribe en rangos de fila completa por hoja
+LAST_COLUMN = {
+    sheet_name: column_letter(max(len(headers), _MIN_COLUMNAS_LECTURA) - 1)
+    for sheet_name, headers in HEADERS.items()
+}
+
+def get_column_letter(sheet_name, column_name):
+    """
+    Obtiene la letra de una columna de una hoja a partir de su cabecera
+
+    Args:
+        sheet_name: Nombre de la hoja
+        column_name: Nombre de la columna
+
+    Returns:
+        str: Letra de la columna
+    """
+    try:
+        return COLUMN_LETTERS[sheet_name][column_name]
+    except KeyError:
+        raise ValueError(f"Columna inválida '{column_name}' en hoja '{sheet_name}'")
+
+def cell_range(sheet_name, row_index, column_name):
+    """
+    Referencia A1 de una celda de datos
+
+    Args:
+        sheet_name: Nombre de la hoja
+        row_index: Índice de la fila (basado en 0 para las filas de datos)
+        column_name: Nombre de la columna
+
+    Returns:
+        str: Rango A1 (ej. "compras!C5")
+    """
+    return f"{sheet_name}!{get_column_letter(sheet_name, column_name)}{row_index + 2}"
+
+def column_range(sheet_name, column_name):
+    """
+    Rango A1 de una columna completa sin la cabecera
+
+    Args:
+        sheet_name: Nombre de la hoja
+        column_name: Nombre de la columna
+
+    Returns:
+        str: Rango A1 (ej. "adelantos!H2:H")
+    """
+    letra = get_column_letter(sheet_name, column_name)
+    return f"{sheet_name}!{letra}2:{letra}"
+
+def row_range(sheet_name, row_number):
+    """
+    Rango A1 de una fila completa de la hoja
+
+    Args:
+        sheet_name: Nombre de la hoja
+        row_number: Número de fila real en la hoja (1 = cabeceras)
+
+    Returns:
+        str: Rango A1 (ej. "compras!A1:Z1")
+    """
+    return f"{sheet_name}!A{row_number}:{LAST_COLUMN.get(sheet_name, 'Z')}{row_number}"
+
+def sheet_range(sheet_name):
+    """
+    Rango A1 con todas las columnas de la hoja
+
+    Args:
+        sheet_name: Nombre de la hoja
+
+    Returns:
+        str: Rango A1 (ej. "compras!A:Z")
+    """
+    return f"{sheet_name}!A:{LAST_COLUMN.get(sheet_name, 'Z')}"
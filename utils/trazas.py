@@ -0,0 +1,235 @@
+"""
+Trazas de latencia por update de Telegram.
+Cada update abre un span raíz (ProcesadorPorChat); los handlers instrumentados abren un
+span con su nombre y estado de conversación, y cada llamada medida con utils.metricas.medir
+(Sheets, Drive, IA, apartalo) queda como span hijo. El span actual vive en un ContextVar,
+así que la jerarquía se conserva también dentro de asyncio.to_thread.
+Al cerrar el span raíz la traza completa se exporta en segundo plano: a un archivo
+JSON-lines (por defecto) o a OpenTelemetry si está instalado (TRAZAS_EXPORTADOR=otel).
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from config import TRAZAS_EXPORTADOR, TRAZAS_ARCHIVO, TRAZAS_MIN_MS, TRAZAS_MAX_BYTES
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+_span_actual = ContextVar("span_actual", default=None)
+
+class Span:
+    """Tramo medido de una traza."""
+
+    __slots__ = ("nombre", "atributos", "traza", "span_id", "padre_id", "inicio_ns", "epoch_ns", "fin_ns", "error", "_token")
+
+    def __init__(self, nombre, padre=None, **atributos):
+        self.nombre = nombre
+        self.atributos = {k: v for k, v in atributos.items() if v is not None}
+        # La traza es la lista de spans compartida por toda la jerarquía
+        self.traza = padre.traza if padre is not None else {"id": uuid.uuid4().hex, "spans": []}
+        self.span_id = uuid.uuid4().hex[:16]
+        self.padre_id = padre.span_id if padre is not None else None
+        self.inicio_ns = 0
+        self.epoch_ns = 0
+        self.fin_ns = 0
+        self.error = False
+        self._token = None
+
+    def __enter__(self):
+        self.epoch_ns = time.time_ns()
+        self.inicio_ns = time.perf_counter_ns()
+        self._token = _span_actual.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.fin_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.error = True
+            self.atributos.setdefault("excepcion", exc_type.__name__)
+        _span_actual.reset(self._token)
+        self.traza["spans"].append(self)
+        if self.padre_id is None:
+            _exportar(self.traza)
+        return False
+
+    @property
+    def duracion_ms(self):
+        return (self.fin_ns - self.inicio_ns) / 1e6
+
+def span(nombre, **atributos):
+    """
+    Abre un span hijo del actual, o una traza nueva si no hay ninguna activa.
+
+    Args:
+        nombre: Nombre del tramo (p. ej. "compra_mixta.confirmar_step")
+        **atributos: Atributos del tramo (las None se omiten)
+
+    Returns:
+        Span: Context manager del tramo
+    """
+    return Span(nombre, _span_actual.get(), **atributos)
+
+def span_hijo(nombre, **atributos):
+    """
+    Como span(), pero solo si ya hay una traza activa (para instrumentar llamadas
+    que también ocurren fuera de un update, como el snapshot diario).
+
+    Returns:
+        Span o None
+    """
+    padre = _span_actual.get()
+    return Span(nombre, padre, **atributos) if padre is not None else None
+
+def trazar_callback(nombre, callback, **atributos):
+    """
+    Envuelve el callback async de un handler para que abra un span con su nombre.
+
+    Args:
+        nombre: Nombre del span
+        callback: Coroutine function del handler
+        **atributos: Atributos fijos (p. ej. estado de la conversación)
+
+    Returns:
+        Coroutine function equivalente
+    """
+    if getattr(callback, "_trazado", False):
+        return callback
+
+    @functools.wraps(callback)
+    async def envoltura(update, context):
+        with span(nombre, **atributos):
+            return await callback(update, context)
+
+    envoltura._trazado = True
+    return envoltura
+
+def instrumentar_handlers(application):
+    """
+    Envuelve los callbacks de todos los handlers registrados (incluidos los estados de
+    los ConversationHandler) para que cada paso aparezca como span en la traza del update.
+
+    Args:
+        application: Application de PTB con los handlers ya registrados
+    """
+    from telegram.ext import ConversationHandler
+
+    def _envolver(handler, prefijo, estado=None):
+        callback = getattr(handler, "callback", None)
+        if callback is None:
+            return 0
+        modulo = prefijo or callback.__module__.rsplit(".", 1)[-1]
+        handler.callback = trazar_callback(f"{modulo}.{callback.__name__}", callback, estado=estado)
+        return 1
+
+    total = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                nombre = handler.name
+                for h in handler.entry_points:
+                    total += _envolver(h, nombre, "entrada")
+                for estado, hs in handler.states.items():
+                    for h in hs:
+                        total += _envolver(h, nombre, str(estado))
+                for h in handler.fallbacks:
+                    total += _envolver(h, nombre, "fallback")
+            else:
+                total += _envolver(handler, None)
+    logger.info("Trazas: %s callbacks de handlers instrumentados (exportador: %s)", total, TRAZAS_EXPORTADOR)
+
+# ── Exportación ───────────────────────────────────────────────────────────────
+_cola = queue.SimpleQueue()
+_exportador_iniciado = threading.Event()
+_exportador_lock = threading.Lock()
+
+def _exportar(traza):
+    if TRAZAS_EXPORTADOR == "ninguno":
+        return
+    _iniciar_exportador()
+    _cola.put(traza)
+
+def _iniciar_exportador():
+    if _exportador_iniciado.is_set():
+        return
+    with _exportador_lock:
+        if _exportador_iniciado.is_set():
+            return
+        threading.Thread(target=_bucle_exportador, daemon=True, name="trazas").start()
+        _exportador_iniciado.set()
+
+def _bucle_exportador():
+    escribir = _escribir_jsonl
+    if TRAZAS_EXPORTADOR == "otel":
+        try:
+            escribir = _exportador_otel()
+        except ImportError:
+            logger.warning("TRAZAS_EXPORTADOR=otel pero opentelemetry no está instalado; se usará JSON-lines")
+    while True:
+        traza = _cola.get()
+        try:
+            escribir(traza)
+        except Exception as e:
+            logger.warning("No se pudo exportar la traza %s: %s", traza['id'], e)
+
+def _spans_ordenados(traza):
+    # Los hijos se cierran antes que el padre; para exportar se ordenan por inicio
+    return sorted(traza["spans"], key=lambda s: s.inicio_ns)
+
+def _escribir_jsonl(traza):
+    spans = _spans_ordenados(traza)
+    raiz = next((s for s in spans if s.padre_id is None), None)
+    if raiz is None or raiz.duracion_ms < TRAZAS_MIN_MS:
+        return
+    linea = json.dumps({
+        "traza": traza["id"],
+        "inicio": raiz.epoch_ns // 1_000_000,
+        "ms": round(raiz.duracion_ms, 2),
+        "spans": [
+            {
+                "id": s.span_id, "padre": s.padre_id, "nombre": s.nombre,
+                "offset_ms": round((s.inicio_ns - raiz.inicio_ns) / 1e6, 2),
+                "ms": round(s.duracion_ms, 2),
+                **({"error": True} if s.error else {}),
+                **({"attr": s.atributos} if s.atributos else {}),
+            }
+            for s in spans
+        ],
+    }, separators=(",", ":"), ensure_ascii=False, default=str)
+    if os.path.exists(TRAZAS_ARCHIVO) and os.path.getsize(TRAZAS_ARCHIVO) > TRAZAS_MAX_BYTES:
+        os.replace(TRAZAS_ARCHIVO, f"{TRAZAS_ARCHIVO}.1")
+    with open(TRAZAS_ARCHIVO, "a") as f:
+        f.write(linea + "\n")
+
+def _exportador_otel():
+    """Reproduce cada traza terminada como spans de OpenTelemetry (con sus tiempos reales)."""
+    from opentelemetry import trace
+
+    tracer = trace.get_tracer("cafe-bot")
+
+    def escribir(traza):
+        spans = _spans_ordenados(traza)
+        raiz = next((s for s in spans if s.padre_id is None), None)
+        if raiz is None or raiz.duracion_ms < TRAZAS_MIN_MS:
+            return
+        otel = {}
+        for s in spans:
+            padre = otel.get(s.padre_id)
+            contexto = trace.set_span_in_context(padre) if padre is not None else None
+            inicio = raiz.epoch_ns + (s.inicio_ns - raiz.inicio_ns)
+            o = tracer.start_span(s.nombre, context=contexto, start_time=inicio,
+                                  attributes={k: str(v) for k, v in s.atributos.items()})
+            if s.error:
+                o.set_status(trace.Status(trace.StatusCode.ERROR))
+            otel[s.span_id] = o
+        # Cerrar en orden inverso para que los hijos terminen antes que sus padres
+        for s in reversed(spans):
+            otel[s.span_id].end(end_time=raiz.epoch_ns + (s.fin_ns - raiz.inicio_ns))
+
+    return escribir
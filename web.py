@@ -2,17 +2,40 @@
 Public price web for Cooperativa Agroindustrial Villa Rica Golden Coffee Ltda.
 Serves a price calculator page based on the CC Golden Excel formulas.
 """
+import asyncio
+import datetime
+import gzip
+import hashlib
+import hmac
+import json
+import os
 import time
 import logging
 import threading
+from functools import lru_cache
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
 import requests as http_requests
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, render_template_string, request, jsonify
+
+from config import HISTORICO_ESTADO_FILE, HISTORICO_HORA_CIERRE, HISTORICO_BACKFILL_DIAS, METRICS_TOKEN, ensure_dirs
+from utils.cache import SWRCache
+from utils.metricas import exportar_prometheus
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 logger = logging.getLogger(__name__)
 
 # ── Sheets integration (optional — only available when running via main.py) ──
 try:
-    from utils.sheets import append_data as sheets_append, get_all_data as sheets_get_all
+    from utils.sheets import (
+        append_data as sheets_append,
+        append_rows as sheets_append_rows,
+        get_all_data as sheets_get_all,
+    )
     _sheets_ok = True
 except Exception:
     _sheets_ok = False
@@ -20,47 +43,38 @@ except Exception:
 app = Flask(__name__)
 
 # ── Exchange rate cache (USD → PEN) ──────────────────────────────────────────
-_fx_cache = {"rate": None, "ts": 0}
 _FX_TTL   = 3600  # 1 hour
 
+def _fetch_usd_pen_rate():
+    resp = http_requests.get(
+        "https://open.er-api.com/v6/latest/USD", timeout=5
+    )
+    return round(resp.json()["rates"]["PEN"], 4)
+
+_fx_cache = SWRCache(_fetch_usd_pen_rate, _FX_TTL, name="fx")
+
 def get_usd_pen_rate():
-    now = time.time()
-    if _fx_cache["rate"] and now - _fx_cache["ts"] < _FX_TTL:
-        return _fx_cache["rate"]
-    try:
-        resp = http_requests.get(
-            "https://open.er-api.com/v6/latest/USD", timeout=5
-        )
-        rate = resp.json()["rates"]["PEN"]
-        _fx_cache["rate"] = round(rate, 4)
-        _fx_cache["ts"]   = now
-        return _fx_cache["rate"]
-    except Exception:
-        return _fx_cache["rate"]
+    return _fx_cache.get()
 
 
 # ── Coffee futures cache (KC=F — ICE Coffee C, USD/quintal) ──────────────────
-_bolsa_cache = {"price": None, "ts": 0}
 _BOLSA_TTL   = 1800  # 30 minutes
 
+def _fetch_coffee_bolsa():
+    # Yahoo Finance unofficial endpoint — no API key required
+    resp = http_requests.get(
+        "https://query1.finance.yahoo.com/v8/finance/chart/KC%3DF",
+        headers={"User-Agent": "Mozilla/5.0"},
+        timeout=5,
+    )
+    meta  = resp.json()["chart"]["result"][0]["meta"]
+    price = meta.get("regularMarketPrice") or meta.get("previousClose")
+    return round(float(price), 2)
+
+_bolsa_cache = SWRCache(_fetch_coffee_bolsa, _BOLSA_TTL, name="bolsa")
+
 def get_coffee_bolsa():
-    now = time.time()
-    if _bolsa_cache["price"] and now - _bolsa_cache["ts"] < _BOLSA_TTL:
-        return _bolsa_cache["price"]
-    try:
-        # Yahoo Finance unofficial endpoint — no API key required
-        resp = http_requests.get(
-            "https://query1.finance.yahoo.com/v8/finance/chart/KC%3DF",
-            headers={"User-Agent": "Mozilla/5.0"},
-            timeout=5,
-        )
-        meta  = resp.json()["chart"]["result"][0]["meta"]
-        price = meta.get("regularMarketPrice") or meta.get("previousClose")
-        _bolsa_cache["price"] = round(float(price), 2)
-        _bolsa_cache["ts"]    = now
-        return _bolsa_cache["price"]
-    except Exception:
-        return _bolsa_cache["price"]
+    return _bolsa_cache.get()
 
 # Average rendimiento per zone (source: CC Golden 2019.xlsx - Perg Org Proc Indiv)
 ZONAS = [
@@ -125,7 +139,37 @@ ZONAS = [
 ]
 
 # ── Historical price snapshot ─────────────────────────────────────────────────
-_last_saved_date = {"date": None}   # avoid duplicate rows on the same day
+# Scheduled on the bot's JobQueue (see programar_snapshots): one job per weekday after
+# the ICE coffee close, plus a catch-up at startup that backfills missed days from
+# Yahoo daily closes. The last saved date is persisted, and the sheet itself is the
+# fallback because Heroku wipes the local disk on every restart.
+_LIMA = ZoneInfo("America/Lima")
+_snapshot_lock = threading.Lock()
+
+def _load_estado():
+    try:
+        with open(HISTORICO_ESTADO_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"[HISTORICO] Estado ilegible, se ignora: {e}")
+        return {}
+
+def _marcar_guardado(fecha):
+    """Persist the last saved snapshot date (atomic write)."""
+    tmp_file = f"{HISTORICO_ESTADO_FILE}.tmp"
+    try:
+        with open(tmp_file, "w") as f:
+            json.dump({"last_date": fecha, "updated_at": datetime.datetime.now(_LIMA).isoformat()}, f)
+        os.replace(tmp_file, HISTORICO_ESTADO_FILE)
+    except Exception as e:
+        logger.warning(f"[HISTORICO] No se pudo guardar el estado: {e}")
+
+def _ultima_fecha_guardada():
+    """Latest snapshot date from the state file or the sheet, whichever is newer ('' if none)."""
+    data = get_historico_data()
+    return max(_load_estado().get("last_date") or "", data[-1]["fecha"] if data else "")
 
 def _compute_snapshot(bolsa, dolar):
     """Calculate all price fields from bolsa + dolar."""
@@ -142,27 +186,30 @@ def _compute_snapshot(bolsa, dolar):
     }
 
 def save_precio_historico():
-    """Fetch live prices and save one row per day to preciosHistoricos sheet."""
+    """Fetch live prices and save today's row to preciosHistoricos (once per day)."""
     if not _sheets_ok:
-        return
-    import datetime, pytz
-    today = datetime.datetime.now(pytz.timezone("America/Lima")).strftime("%Y-%m-%d")
-    if _last_saved_date["date"] == today:
-        return  # already saved today
-    bolsa = get_coffee_bolsa()
-    dolar = get_usd_pen_rate()
-    if not bolsa or not dolar:
-        logger.warning("[HISTORICO] No se pudo obtener precios live para guardar.")
-        return
-    snap = _compute_snapshot(bolsa, dolar)
-    snap["fecha"] = today
-    try:
-        sheets_append("preciosHistoricos", snap)
-        _last_saved_date["date"] = today
+        return False
+    today = datetime.datetime.now(_LIMA).strftime("%Y-%m-%d")
+    with _snapshot_lock:
+        if _ultima_fecha_guardada() >= today:
+            return True  # already saved today
+        bolsa = get_coffee_bolsa()
+        dolar = get_usd_pen_rate()
+        if not bolsa or not dolar:
+            logger.warning("[HISTORICO] No se pudo obtener precios live para guardar.")
+            return False
+        snap = _compute_snapshot(bolsa, dolar)
+        snap["fecha"] = today
+        try:
+            if not sheets_append("preciosHistoricos", snap):
+                logger.error("[HISTORICO] No se pudo guardar el snapshot")
+                return False
+        except Exception as e:
+            logger.error(f"[HISTORICO] Error al guardar: {e}")
+            return False
+        _marcar_guardado(today)
+        _historico_add(snap)
         logger.info(f"[HISTORICO] Snapshot guardado: {snap}")
-    except Exception as e:
-        logger.error(f"[HISTORICO] Error al guardar: {e}")
-        return
 
     # Update prices in apartalo-core (Pergamino + Verde/Oro Verde)
     try:
@@ -174,8 +221,85 @@ def save_precio_historico():
         )
     except Exception as e:
         logger.error(f"[APARTALO] Error actualizando precios: {e}")
-
-def get_historico_data():
+    return True
+
+def _fetch_daily_closes(symbol, desde, hasta):
+    """Yahoo daily closes for symbol as {'YYYY-MM-DD': close}, dates in [desde, hasta)."""
+    inicio = datetime.datetime.combine(desde, datetime.time(), _LIMA)
+    fin    = datetime.datetime.combine(hasta, datetime.time(), _LIMA)
+    resp = http_requests.get(
+        f"https://query1.finance.yahoo.com/v8/finance/chart/{quote(symbol)}",
+        params={"period1": int(inicio.timestamp()), "period2": int(fin.timestamp()), "interval": "1d"},
+        headers={"User-Agent": "Mozilla/5.0"},
+        timeout=10,
+    )
+    result = resp.json()["chart"]["result"][0]
+    # Bars are stamped at the exchange's session start; date them in its own timezone
+    tz = ZoneInfo(result["meta"].get("exchangeTimezoneName") or "America/Lima")
+    closes = result["indicators"]["quote"][0].get("close") or []
+    cierres = {}
+    for ts, close in zip(result.get("timestamp") or [], closes):
+        if close is None:
+            continue
+        fecha = datetime.datetime.fromtimestamp(ts, tz).date()
+        if desde <= fecha < hasta:
+            cierres[fecha.isoformat()] = float(close)
+    return cierres
+
+def backfill_historico(max_dias=HISTORICO_BACKFILL_DIAS):
+    """Save rows for trading days missed since the last snapshot (up to max_dias back, excluding today)."""
+    if not _sheets_ok:
+        return 0
+    hoy = datetime.datetime.now(_LIMA).date()
+    with _snapshot_lock:
+        ultima = _ultima_fecha_guardada()
+        if not ultima:
+            return 0  # empty series: nothing to catch up to
+        desde = max(datetime.date.fromisoformat(ultima) + datetime.timedelta(days=1),
+                    hoy - datetime.timedelta(days=max_dias))
+        if desde >= hoy:
+            return 0
+        try:
+            bolsas  = _fetch_daily_closes("KC=F", desde, hoy)
+            # Start the FX lookup a week earlier so a missing day can reuse the previous close
+            dolares = _fetch_daily_closes("PEN=X", desde - datetime.timedelta(days=7), hoy)
+        except Exception as e:
+            logger.error(f"[HISTORICO] Error al obtener cierres para el backfill: {e}")
+            return 0
+
+        snaps = []
+        for fecha in sorted(bolsas):
+            previos = [d for d in dolares if d <= fecha]
+            if not previos:
+                continue
+            snap = _compute_snapshot(bolsas[fecha], dolares[max(previos)])
+            snap["fecha"] = fecha
+            snaps.append(snap)
+        if not snaps:
+            logger.info(f"[HISTORICO] Sin días que recuperar desde {desde}")
+            return 0
+        if not sheets_append_rows("preciosHistoricos", snaps):
+            logger.error("[HISTORICO] No se pudieron guardar los días recuperados")
+            return 0
+        _marcar_guardado(snaps[-1]["fecha"])
+        for snap in snaps:
+            _historico_add(snap)
+    logger.info(f"[HISTORICO] Backfill: {len(snaps)} días recuperados ({snaps[0]['fecha']} .. {snaps[-1]['fecha']})")
+    return len(snaps)
+
+# ── Historico cache ───────────────────────────────────────────────────────────
+# The series only changes when a snapshot is saved, which updates it in place;
+# the TTL is just a safety net for rows edited directly in the sheet.
+_HISTORICO_FIELDS = ("bolsa", "dolar", "precio_bolsa", "pergamino_seco", "mote", "cerezo", "oro_verde")
+_historico_cache  = {"data": None, "ts": 0, "version": ""}
+_historico_lock   = threading.Lock()
+_HISTORICO_TTL    = 12 * 3600
+
+def _historico_version(data):
+    last = data[-1]["fecha"] if data else ""
+    return hashlib.sha1(f"{len(data)}|{last}|{json.dumps(data[-1:])}".encode()).hexdigest()[:16]
+
+def _load_historico():
     """Read all rows from preciosHistoricos sheet."""
     if not _sheets_ok:
         return []
@@ -199,22 +323,116 @@ def get_historico_data():
         return sorted(result, key=lambda x: x["fecha"])
     except Exception as e:
         logger.error(f"[HISTORICO] Error al leer: {e}")
-        return []
+        return None
+
+def _historico_add(snap):
+    """Merge a freshly saved snapshot into the cached series (if loaded)."""
+    with _historico_lock:
+        data = _historico_cache["data"]
+        if data is None:
+            return
+        row = {"fecha": snap["fecha"], **{k: float(snap[k]) for k in _HISTORICO_FIELDS}}
+        data = [r for r in data if r["fecha"] != row["fecha"]] + [row]
+        data.sort(key=lambda x: x["fecha"])
+        _historico_cache["data"]    = data
+        _historico_cache["version"] = _historico_version(data)
 
-def _scheduler_loop():
-    """Background thread: try to save a snapshot every 6 hours."""
-    time.sleep(10)   # let Flask start first
-    while True:
-        try:
-            save_precio_historico()
-        except Exception as e:
-            logger.error(f"[SCHEDULER] {e}")
-        time.sleep(3600 * 6)  # retry in 6 hours
-
-threading.Thread(target=_scheduler_loop, daemon=True, name="precio-scheduler").start()
-
-
-def calcular_precios(bolsa, dolar):
+def get_historico_data():
+    """Cached, date-sorted historico series (read-only)."""
+    with _historico_lock:
+        if _historico_cache["data"] is not None and time.time() - _historico_cache["ts"] < _HISTORICO_TTL:
+            return _historico_cache["data"]
+        data = _load_historico()
+        if data is None:
+            # Keep serving the previous series if the sheet read failed
+            return _historico_cache["data"] or []
+        _historico_cache["data"]    = data
+        _historico_cache["ts"]      = time.time()
+        _historico_cache["version"] = _historico_version(data)
+        return data
+
+def _lttb(rows, threshold, field):
+    """Largest-Triangle-Three-Buckets downsampling of rows on rows[i][field]."""
+    n = len(rows)
+    if threshold >= n or threshold < 3:
+        return rows
+    sampled = [rows[0]]
+    bucket = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket) + 1
+        end   = int((i + 1) * bucket) + 1
+        nxt_start = end
+        nxt_end   = min(int((i + 2) * bucket) + 1, n)
+        avg_x = (nxt_start + nxt_end - 1) / 2
+        avg_y = sum(r[field] for r in rows[nxt_start:nxt_end]) / max(nxt_end - nxt_start, 1)
+        ax, ay = a, rows[a][field]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (rows[j][field] - ay) - (ax - j) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(rows[best])
+        a = best
+    sampled.append(rows[-1])
+    return sampled
+
+def _parse_days(value):
+    """'30', '30d', '12w', '6m', '1y' or 'all' -> days (0 = all)."""
+    value = (value or "").strip().lower()
+    if not value or value == "all":
+        return 0
+    units = {"d": 1, "w": 7, "m": 30, "y": 365}
+    if value[-1] in units:
+        return int(value[:-1]) * units[value[-1]]
+    return int(value)
+
+def _hora_cierre():
+    hora, minuto = (int(x) for x in HISTORICO_HORA_CIERRE.split(":"))
+    return datetime.time(hora, minuto, tzinfo=_LIMA)
+
+async def _job_snapshot(context):
+    """Daily JobQueue callback: save today's snapshot off the event loop."""
+    if not await asyncio.to_thread(save_precio_historico):
+        logger.warning("[SCHEDULER] Snapshot no guardado; se reintentará en el catch-up del próximo arranque")
+
+async def _job_catch_up(context):
+    """Startup JobQueue callback: backfill missed days, then today's row if the close has passed."""
+    await asyncio.to_thread(backfill_historico)
+    ahora = datetime.datetime.now(_LIMA)
+    if ahora.weekday() < 5 and ahora.time() >= _hora_cierre().replace(tzinfo=None):
+        await asyncio.to_thread(save_precio_historico)
+
+def programar_snapshots(job_queue):
+    """Register the weekday snapshot at market close (Lima time) and the startup catch-up."""
+    job_queue.run_daily(_job_snapshot, time=_hora_cierre(), days=(1, 2, 3, 4, 5), name="precio-historico")
+    job_queue.run_once(_job_catch_up, when=15, name="precio-historico-catch-up")
+    logger.info(f"[SCHEDULER] Snapshot diario programado a las {HISTORICO_HORA_CIERRE} (Lima), lunes a viernes")
+
+# Pre-rendered index page: {encoding: (body, etag)}; emptied when ZONAS changes
+_index_page = {}
+_INDEX_CACHE_CONTROL = "public, max-age=300"
+
+# ── Precomputed zone table ───────────────────────────────────────────────────
+# Zone names, display percentages and rendimientos are static, so they are laid out
+# once; per (bolsa, dolar) pair only the price column is computed, in a plain Python
+# loop (not vectorized: with a handful of zones the memo is what saves the work).
+_zona_nombres     = ()
+_zona_pct         = ()
+_zona_rendimiento = ()
+
+def recargar_zonas():
+    """Rebuild the zone table from ZONAS and drop memoized price results."""
+    global _zona_nombres, _zona_pct, _zona_rendimiento
+    _zona_nombres     = tuple(z["zona"] for z in ZONAS)
+    _zona_rendimiento = tuple(z["rendimiento"] for z in ZONAS)
+    _zona_pct         = tuple(round(r * 100, 2) for r in _zona_rendimiento)
+    _calcular_precios_memo.cache_clear()
+    _index_page.clear()
+
+
+@lru_cache(maxsize=256)
+def _calcular_precios_memo(bolsa, dolar):
     precio_bolsa = bolsa * dolar
     cc = 29 * dolar
     pergamino_seco = (precio_bolsa - cc) / 60
@@ -223,11 +441,12 @@ def calcular_precios(bolsa, dolar):
     lata = pergamino_seco * 7.3
     mote = lata - 3.5
     cerezo = (precio_bolsa / 60) / (280 / 55.2) - (41 / 280)
-    zonas_calc = []
-    for z in ZONAS:
-        r = z["rendimiento"]
-        precio_zona = round((precio_bolsa - cc) * r / 46, 4)
-        zonas_calc.append({"zona": z["zona"], "rendimiento": round(r * 100, 2), "precio_kg": precio_zona})
+    neto = precio_bolsa - cc
+    precios_zona = [round(neto * r / 46, 4) for r in _zona_rendimiento]
+    zonas_calc = [
+        {"zona": zona, "rendimiento": pct, "precio_kg": precio}
+        for zona, pct, precio in zip(_zona_nombres, _zona_pct, precios_zona)
+    ]
     return {
         "precio_bolsa": round(precio_bolsa, 2),
         "cc": round(cc, 2),
@@ -241,6 +460,14 @@ def calcular_precios(bolsa, dolar):
     }
 
 
+def calcular_precios(bolsa, dolar):
+    """Prices for a (bolsa, dolar) pair; memoized, treat the result as read-only."""
+    return _calcular_precios_memo(float(bolsa), float(dolar))
+
+
+recargar_zonas()
+
+
 HTML = """<!DOCTYPE html>
 <html lang="es">
 <head>
@@ -932,32 +1159,94 @@ function renderHistChart() {
 </html>"""
 
 
+def preparar_index():
+    """Render the index once and keep identity, gzip and brotli bodies with their ETags."""
+    if _index_page:
+        return _index_page
+    with app.app_context():
+        html = render_template_string(HTML, zonas_json=json.dumps(ZONAS, ensure_ascii=False))
+    raw = html.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    pages = {"identity": (raw, digest)}
+    pages["gzip"] = (gzip.compress(raw, 9), f"{digest}-gz")
+    if brotli is not None:
+        pages["br"] = (brotli.compress(raw, quality=11), f"{digest}-br")
+    _index_page.update(pages)
+    logger.info(f"[WEB] Index pre-rendered: {len(raw)} bytes, gzip {len(pages['gzip'][0])} bytes")
+    return _index_page
+
+
 @app.route("/")
 def index():
-    import json
-    zonas_json = json.dumps(ZONAS, ensure_ascii=False)
-    return render_template_string(HTML, zonas_json=zonas_json)
+    pages = preparar_index()
+    encoding = "identity"
+    if "br" in pages and "br" in request.accept_encodings:
+        encoding = "br"
+    elif "gzip" in request.accept_encodings:
+        encoding = "gzip"
+    body, etag = pages[encoding]
+
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype="text/html")
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = _INDEX_CACHE_CONTROL
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
 
 
 @app.route("/api/bolsa")
 def api_bolsa():
-    price = get_coffee_bolsa()
+    price, meta = _bolsa_cache.get_with_meta()
     if price:
-        return jsonify({"price": price, "ticker": "KC=F", "unit": "USD/quintal", "source": "Yahoo Finance"})
+        return jsonify({"price": price, "ticker": "KC=F", "unit": "USD/quintal", "source": "Yahoo Finance", **meta})
     return jsonify({"error": "No se pudo obtener el precio de bolsa"}), 503
 
 
 @app.route("/api/historico")
 def api_historico():
+    """Historico series. Optional: range (30, 30d, 6m, 1y, all), since (YYYY-MM-DD),
+    max_points (LTTB downsampling) and field (series that drives downsampling)."""
     data = get_historico_data()
-    return jsonify(data)
+    hoy = datetime.datetime.now(_LIMA).date()
+    # range is relative to today, so the ETag changes with the date too
+    etag = hashlib.sha1(f"{_historico_cache['version']}|{hoy}|{request.query_string.decode()}".encode()).hexdigest()[:24]
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        try:
+            days       = _parse_days(request.args.get("range"))
+            since      = request.args.get("since", "")
+            max_points = int(request.args.get("max_points", 0))
+        except ValueError:
+            return jsonify({"error": "Parametros invalidos"}), 400
+        field = request.args.get("field", "pergamino_seco")
+        if field not in _HISTORICO_FIELDS:
+            return jsonify({"error": f"field debe ser uno de {list(_HISTORICO_FIELDS)}"}), 400
+
+        rows = data
+        if since:
+            rows = [r for r in rows if r["fecha"] >= since]
+        if days > 0:
+            # Calendar days, not rows: the sheet has no rows for weekends or missed days
+            desde = (hoy - datetime.timedelta(days=days)).isoformat()
+            rows = [r for r in rows if r["fecha"] >= desde]
+        if max_points > 0:
+            rows = _lttb(rows, max_points, field)
+        resp = jsonify(rows)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "public, max-age=60"
+    return resp
 
 
 @app.route("/api/tipo-cambio")
 def api_tipo_cambio():
-    rate = get_usd_pen_rate()
+    rate, meta = _fx_cache.get_with_meta()
     if rate:
-        return jsonify({"rate": rate, "source": "open.er-api.com"})
+        return jsonify({"rate": rate, "source": "open.er-api.com", **meta})
     return jsonify({"error": "No se pudo obtener el tipo de cambio"}), 503
 
 
@@ -968,7 +1257,48 @@ def api_precios():
     return jsonify(calcular_precios(bolsa, dolar))
 
 
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of the Sheets/Drive/AI/apartalo call metrics.
+    Only served when METRICS_TOKEN is set, and only to requests that carry it."""
+    if not METRICS_TOKEN:
+        return jsonify({"error": "not found"}), 404
+    auth = request.headers.get("Authorization", "")
+    token = auth[len("Bearer "):] if auth.startswith("Bearer ") else request.args.get("token", "")
+    if not hmac.compare_digest(token, METRICS_TOKEN):
+        return jsonify({"error": "unauthorized"}), 401
+    return Response(exportar_prometheus(), mimetype="text/plain; version=0.0.4; charset=utf-8",
+                    headers={"Cache-Control": "no-store"})
+
+
+# ── Telegram webhook (BOT_MODE=webhook) ───────────────────────────────────────
+# main.py registers a sink that hands the raw update JSON to the bot's event loop.
+_telegram_webhook = {"sink": None, "secret": None}
+
+def set_telegram_sink(sink, secret):
+    """Enable /telegram/webhook: sink(update_json) is called for every verified update."""
+    _telegram_webhook["secret"] = secret
+    _telegram_webhook["sink"]   = sink
+
+
+@app.route("/telegram/webhook", methods=["POST"])
+def telegram_webhook():
+    sink, secret = _telegram_webhook["sink"], _telegram_webhook["secret"]
+    if sink is None:
+        # Bot not ready yet (or polling mode): Telegram retries on non-2xx
+        return jsonify({"error": "bot no disponible"}), 503
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not secret or not hmac.compare_digest(token, secret):
+        return jsonify({"error": "forbidden"}), 403
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "update invalido"}), 400
+    sink(data)
+    return "", 200
+
+
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 5000))
+    ensure_dirs()
+    preparar_index()
     app.run(host="0.0.0.0", port=port)